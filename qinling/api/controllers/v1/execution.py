@@ -12,10 +12,11 @@
 #    See the License for the specific language governing permissions and
 #    limitations under the License.
 
+from oslo_config import cfg
 from oslo_log import log as logging
+from oslo_utils import strutils
 import pecan
 from pecan import rest
-from wsme import types as wtypes
 import wsmeext.pecan as wsme_pecan
 
 from qinling.api import access_control as acl
@@ -29,21 +30,47 @@ from qinling.utils import executions
 from qinling.utils import rest_utils
 
 LOG = logging.getLogger(__name__)
+CONF = cfg.CONF
 
 
 class ExecutionLogController(rest.RestController):
     @rest_utils.wrap_pecan_controller_exception
     @pecan.expose(content_type='text/plain')
-    def get_all(self, execution_id):
+    def get_all(self, execution_id, **params):
+        """Return the execution logs.
+
+        :param offset: Optional. Offset in bytes of the logs returned.
+        :param length: Optional. Maximum number of bytes returned, a shorter
+            response means the end of the logs is reached.
+        """
+        offset = params.get('offset', 0)
+        length = params.get('length')
+        for name, value in (('offset', offset), ('length', length)):
+            if value is not None and (not strutils.is_int_like(value) or
+                                      int(value) < 0):
+                raise exc.InputException(
+                    '%s must be a non-negative integer [actual=%s]' %
+                    (name.capitalize(), value)
+                )
+
         LOG.info("Get logs for execution %s.", execution_id)
-        execution_db = db_api.get_execution(execution_id)
+        logs = db_api.get_execution_logs(
+            execution_id,
+            offset=int(offset),
+            length=int(length) if length is not None else None
+        )
 
-        return execution_db.logs
+        pecan.response.charset = 'utf-8'
+        return logs
 
 
 class ExecutionsController(rest.RestController):
     log = ExecutionLogController()
 
+    _custom_actions = {
+        'batch': ['POST'],
+    }
+
     def __init__(self, *args, **kwargs):
         self.engine_client = rpc.get_engine_client()
         self.type = 'execution'
@@ -73,25 +100,101 @@ class ExecutionsController(rest.RestController):
         return resources.Execution.from_db_obj(db_model)
 
     @rest_utils.wrap_wsme_controller_exception
-    @wsme_pecan.wsexpose(resources.Executions, wtypes.text, bool, wtypes.text,
-                         wtypes.text, wtypes.text)
-    def get_all(self, function_id=None, all_projects=False, project_id=None,
-                status=None, description=None):
+    @wsme_pecan.wsexpose(
+        resources.ExecutionBatch,
+        body=resources.ExecutionBatch,
+        status_code=201
+    )
+    def batch(self, body):
+        """Create asynchronous executions of a function for many inputs.
+
+        The executions are created in one database statement and sent to the
+        engine in one message. The batch id is included in the description of
+        the executions if no description is specified.
+        """
+        ctx = context.get_ctx()
+        acl.enforce('execution:create', ctx)
+
+        params = body.to_dict()
+        if not (params.get("function_id") or params.get("function_alias")):
+            raise exc.InputException(
+                'Either function_alias or function_id must be provided.'
+            )
+
+        inputs = params.pop('inputs')
+        if not inputs or len(inputs) > CONF.api.max_batch_executions:
+            raise exc.InputException(
+                'Number of inputs must be between 1 and %s.' %
+                CONF.api.max_batch_executions
+            )
+
+        LOG.info("Creating %s %ss in batch. [params=%s]", len(inputs),
+                 self.type, params)
+
+        batch_id, execution_ids = executions.create_executions(
+            self.engine_client, params, inputs
+        )
+
+        return resources.ExecutionBatch.from_dict(
+            dict(params, id=batch_id, executions=execution_ids)
+        )
+
+    @rest_utils.wrap_pecan_controller_exception
+    @pecan.expose()
+    def get_all(self, **params):
         """Return a list of executions.
 
+        The list is serialized while reading the executions from the
+        database, sorted by the creation time. The query params are not
+        declared in the signature because pecan routes the positional
+        arguments of the REST controllers as the resource ids.
+
         :param function_id: Optional. Filtering executions by function_id.
         :param project_id: Optional. Admin user can query other projects
             resources, the param is ignored for normal user.
         :param all_projects: Optional. Get resources of all projects.
         :param status: Optional. Filter by execution status.
         :param description: Optional. Filter by description.
+        :param limit: Optional. Maximum number of executions returned, a
+            link to the next page is included if there are more.
+        :param marker: Optional. Id of the last execution of the previous
+            page.
+        :param fields: Optional. Comma separated list of the execution
+            fields returned, the id is always included.
         """
+        function_id = params.get('function_id')
+        project_id = params.get('project_id')
+        status = params.get('status')
+        description = params.get('description')
+        limit = params.get('limit')
+        marker = params.get('marker')
+        requested_fields = params.get('fields')
+
+        all_projects = strutils.bool_from_string(params.get('all_projects'))
         project_id, all_projects = rest_utils.get_project_params(
             project_id, all_projects
         )
         if all_projects:
             acl.enforce('execution:get_all:all_projects', context.get_ctx())
 
+        if limit is not None:
+            if not strutils.is_int_like(limit) or int(limit) <= 0:
+                raise exc.InputException(
+                    'Limit must be a positive integer [actual=%s]' % limit
+                )
+            limit = int(limit)
+
+        fields = rest_utils.get_fields(
+            resources.Execution,
+            types.uniquelist.frombasetype(requested_fields)
+        )
+
+        if marker:
+            marker = db_api.get_execution(types.uuid.validate(marker))
+
+        params = dict(function_id=function_id, all_projects=all_projects,
+                      project_id=project_id, status=status,
+                      description=description, fields=requested_fields)
         filters = rest_utils.get_filters(
             function_id=function_id,
             project_id=project_id,
@@ -100,11 +203,20 @@ class ExecutionsController(rest.RestController):
         )
         LOG.info("Get all %ss. filters=%s", self.type, filters)
 
-        db_execs = db_api.get_executions(insecure=all_projects, **filters)
-        executions = [resources.Execution.from_db_obj(db_model)
-                      for db_model in db_execs]
+        pecan.response.content_type = 'application/json'
+        pecan.response.app_iter = rest_utils.stream_resources(
+            resources.Execution,
+            'executions',
+            db_api.get_executions,
+            fields,
+            limit=limit,
+            marker=marker,
+            next_args=dict((k, v) for k, v in params.items() if v),
+            insecure=all_projects,
+            **filters
+        )
 
-        return resources.Executions(executions=executions)
+        return pecan.response
 
     @rest_utils.wrap_wsme_controller_exception
     @wsme_pecan.wsexpose(resources.Execution, types.uuid)
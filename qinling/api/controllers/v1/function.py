@@ -204,7 +204,8 @@ class FunctionsController(rest.RestController):
         if source == constants.PACKAGE_FUNCTION:
             store = True
             md5sum = values['code'].get('md5sum')
-            data = kwargs['package'].file.read()
+            # Read by the storage provider in chunks.
+            data = kwargs['package'].file
         elif source == constants.SWIFT_FUNCTION:
             swift_info = values['code'].get('swift', {})
 
@@ -427,7 +428,7 @@ class FunctionsController(rest.RestController):
                         )
 
                     # Update the package data.
-                    data = values['package'].file.read()
+                    data = values['package'].file
                     package_updated, md5sum = self.storage_provider.store(
                         ctx.projectid,
                         id,
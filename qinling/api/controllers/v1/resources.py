@@ -271,6 +271,16 @@ class Executions(ResourceList):
         super(Executions, self).__init__(**kwargs)
 
 
+class ExecutionBatch(Resource):
+    id = wsme.wsattr(types.uuid, readonly=True)
+    function_id = wsme.wsattr(types.uuid)
+    function_version = wsme.wsattr(int, default=0)
+    function_alias = wtypes.text
+    description = wtypes.text
+    inputs = wsme.wsattr([wtypes.text], mandatory=True)
+    executions = wsme.wsattr([types.uuid], readonly=True)
+
+
 class Job(Resource):
     id = types.uuid
     name = wtypes.text
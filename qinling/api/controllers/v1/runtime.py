@@ -21,6 +21,7 @@ from qinling.api.controllers.v1 import resources
 from qinling.api.controllers.v1 import types
 from qinling import context
 from qinling.db import api as db_api
+from qinling.db import cache as db_cache
 from qinling import exceptions as exc
 from qinling import rpc
 from qinling import status
@@ -107,6 +108,8 @@ class RuntimesController(rest.RestController):
 
             runtime_db.status = status.DELETING
 
+        db_cache.runtimes.invalidate(id)
+
         # Clean related resources asynchronously
         self.engine_client.delete_runtime(id)
 
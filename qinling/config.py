@@ -57,6 +57,30 @@ api_opts = [
         default=True,
         help='Enable job handler.'
     ),
+    cfg.StrOpt(
+        'execution_count_mode',
+        default='atomic',
+        choices=['atomic', 'buffered'],
+        help='How the invocation count of the function is increased when an '
+             'execution is created. "atomic" increases the count in the '
+             'database for every execution, "buffered" aggregates the '
+             'increments in memory and writes them to the database every '
+             'execution_count_flush_interval seconds.'
+    ),
+    cfg.IntOpt(
+        'execution_count_flush_interval',
+        default=5,
+        min=1,
+        help='Interval in seconds of writing the buffered invocation counts '
+             'to the database.'
+    ),
+    cfg.IntOpt(
+        'max_batch_executions',
+        default=1000,
+        min=1,
+        help='Maximum number of executions created by a batch execution '
+             'request.'
+    ),
 ]
 
 PECAN_GROUP = 'pecan'
@@ -119,6 +143,142 @@ engine_opts = [
         default='openstackqinling/sidecar:0.0.2',
         help='The sidecar image being used together with the worker.'
     ),
+    cfg.BoolOpt(
+        'reuse_function_module',
+        default=False,
+        help='Ask the runtime to keep the imported function module in the '
+             'worker process and reuse it for the following executions until '
+             'the function package is changed, so that the module level '
+             'initialization of the function only happens once. Only '
+             'supported by the python3 runtime.'
+    ),
+    cfg.BoolOpt(
+        'prefetch_function_package',
+        default=False,
+        help='Ask the sidecar of the worker to download the function package '
+             'to its package cache when the worker is chosen for the '
+             'function, before the first execution. The request is '
+             'forwarded to the sidecar by the runtime, requires a runtime '
+             'image supporting the prefetch API.'
+    ),
+    cfg.IntOpt(
+        'service_health_ttl',
+        default=30,
+        min=0,
+        help='Number of seconds a function service is considered healthy '
+             'after it is contacted successfully, the ping request before '
+             'the execution is skipped during this period. Set to 0 to '
+             'always send the ping request.'
+    ),
+    cfg.BoolOpt(
+        'async_dispatch',
+        default=False,
+        help='Send the asynchronous executions to the function service from '
+             'an event loop instead of blocking an RPC executor thread until '
+             'the execution finishes. Requires Python 3 and aiohttp.'
+    ),
+    cfg.IntOpt(
+        'max_async_executions',
+        default=1000,
+        min=1,
+        help='Maximum number of asynchronous executions being sent to the '
+             'function services at the same time, the others are queued in '
+             'the event loop.'
+    ),
+    cfg.IntOpt(
+        'async_db_workers',
+        default=10,
+        min=1,
+        help='Number of threads used to update the database when the '
+             'asynchronous executions finish.'
+    ),
+    cfg.FloatOpt(
+        'execution_result_flush_interval',
+        default=0,
+        min=0,
+        help='Buffer the results of the finished asynchronous executions in '
+             'memory and write them to the database in one transaction '
+             'every this number of seconds. The executions are still '
+             'running in the database until their results are written. Set '
+             'to 0 to write the result of every execution immediately.'
+    ),
+    cfg.IntOpt(
+        'execution_result_batch_size',
+        default=500,
+        min=1,
+        help='The buffered execution results are written before the flush '
+             'interval elapses when this number of results are buffered.'
+    ),
+    cfg.StrOpt(
+        'worker_balance_policy',
+        default='power_of_two',
+        choices=[
+            ('random', 'Choose a worker randomly.'),
+            ('least_outstanding', 'Choose the worker with the least '
+                                  'requests in progress.'),
+            ('power_of_two', 'Choose the worker with less requests in '
+                             'progress out of two random workers.'),
+        ],
+        help='How qinling-engine chooses the function worker for an '
+             'execution when the requests are sent to the workers directly, '
+             'i.e. [kubernetes]service_address_type is pod_ip. The requests '
+             'in progress are counted per qinling-engine process.'
+    ),
+    cfg.FloatOpt(
+        'load_check_cache_ttl',
+        default=1,
+        min=0,
+        help='Number of seconds the number of the running executions of a '
+             'function is cached for the load check of the executions. The '
+             'executions are counted again before scaling up the function. '
+             'Set to 0 to count the running executions for every '
+             'execution.'
+    ),
+    cfg.BoolOpt(
+        'autoscale',
+        default=False,
+        help='Scale the function workers from a periodic task based on the '
+             'arrival rate and the duration of the executions, instead of '
+             'checking the running executions in the database for every '
+             'execution. The executions are counted per qinling-engine '
+             'process.'
+    ),
+    cfg.IntOpt(
+        'autoscale_interval',
+        default=2,
+        min=1,
+        help='Interval in seconds of the autoscaling periodic task.'
+    ),
+    cfg.IntOpt(
+        'autoscale_max_step',
+        default=5,
+        min=1,
+        help='Maximum number of workers added or removed for a function '
+             'version at a time by the autoscaling periodic task.'
+    ),
+    cfg.IntOpt(
+        'autoscale_idle_time',
+        default=120,
+        min=1,
+        help='Number of seconds without executions after which the workers '
+             'of a function version are scaled down to one.'
+    ),
+    cfg.IntOpt(
+        'batch_execution_concurrency',
+        default=10,
+        min=1,
+        help='Maximum number of executions of a batch execution request '
+             'being sent to the function workers at the same time by a '
+             'qinling-engine process.'
+    ),
+    cfg.IntOpt(
+        'execution_log_chunk_size',
+        default=65536,
+        min=1024,
+        help='The execution logs are stored compressed in chunks of this '
+             'number of bytes, so that a range of the logs can be read '
+             'without reading all of them.'
+    ),
 ]
 
 STORAGE_GROUP = 'storage'
@@ -177,6 +337,46 @@ kubernetes_opts = [
         help='Path to the client certificate key file for qinling to use to '
              'connect to the Kubernetes API server.'
     ),
+    cfg.BoolOpt(
+        'enable_pod_cache',
+        default=False,
+        help='Keep a local cache of the pods in the namespace updated by the '
+             'Kubernetes watch API, so that the pods are not listed from the '
+             'Kubernetes API server when choosing workers for functions.'
+    ),
+    cfg.IntOpt(
+        'pod_cache_watch_timeout',
+        default=300,
+        min=1,
+        help='Timeout in seconds of a single watch request of the pod cache, '
+             'the watch is restarted from the last seen resource version.'
+    ),
+    cfg.IntOpt(
+        'node_address_cache_ttl',
+        default=300,
+        min=0,
+        help='Time in seconds the node addresses are cached before listing '
+             'the nodes from the Kubernetes API server again.'
+    ),
+    cfg.StrOpt(
+        'service_address_type',
+        default='node',
+        choices=[
+            ('node', 'The NodePort of an arbitrary node.'),
+            ('pod_node', 'The NodePort of the node the pod is running on, '
+                         'the service is created with the Local external '
+                         'traffic policy to avoid the extra hop between '
+                         'nodes.'),
+            ('cluster_ip', 'The cluster IP of the service, qinling-engine '
+                           'must be able to reach the cluster network.'),
+            ('pod_ip', 'The IP addresses of the pods, no service is created '
+                       'for the function and qinling-engine distributes the '
+                       'requests among the pods itself. qinling-engine must '
+                       'be able to reach the pod network.'),
+        ],
+        help='The address qinling-engine uses to send requests to the '
+             'service of the function.'
+    ),
     cfg.StrOpt(
         'log_devel',
         default='INFO',
@@ -231,6 +431,21 @@ etcd_opts = [
         help='Path to client certificate key file to use to securely '
              'connect to etcd server.'
     ),
+    cfg.IntOpt(
+        'connection_pool_size',
+        default=64,
+        min=1,
+        help='Maximum number of connections to etcd kept open by each '
+             'process for reuse, should not be less than the number of '
+             'threads using etcd concurrently.'
+    ),
+    cfg.BoolOpt(
+        'local_mirror',
+        default=False,
+        help='Whether the engine keeps a copy of the function workers and '
+             'service urls of etcd in memory, updated by an etcd watch, '
+             'instead of reading them from etcd for every execution.'
+    ),
 ]
 
 RLIMITS_GROUP = 'resource_limits'
@@ -282,6 +497,72 @@ rlimits_opts = [
     ),
 ]
 
+METADATA_CACHE_GROUP = 'metadata_cache'
+metadata_cache_opts = [
+    cfg.BoolOpt(
+        'enabled',
+        default=False,
+        help='Cache the function, function version, function alias and '
+             'runtime records used when creating executions in the memory of '
+             'the API and engine processes. The records changed by other '
+             'processes may be used until the cache entries expire.'
+    ),
+    cfg.IntOpt(
+        'ttl',
+        default=10,
+        min=1,
+        help='Number of seconds the records are cached.'
+    ),
+    cfg.IntOpt(
+        'size',
+        default=1000,
+        min=1,
+        help='Maximum number of records of each type in the cache, the least '
+             'recently used records are evicted first.'
+    ),
+]
+
+EXECUTION_RETENTION_GROUP = 'execution_retention'
+execution_retention_opts = [
+    cfg.BoolOpt(
+        'enabled',
+        default=False,
+        help='Delete the finished executions older than the retention '
+             'period from a periodic task of qinling-engine.'
+    ),
+    cfg.IntOpt(
+        'days',
+        default=30,
+        min=1,
+        help='Number of days the finished executions are kept.'
+    ),
+    cfg.DictOpt(
+        'project_days',
+        default={},
+        help='Number of days the finished executions are kept for the '
+             'specific projects, e.g. project_id_1:7,project_id_2:90.'
+    ),
+    cfg.IntOpt(
+        'interval',
+        default=3600,
+        min=1,
+        help='Interval in seconds of deleting the expired executions.'
+    ),
+    cfg.IntOpt(
+        'batch_size',
+        default=1000,
+        min=1,
+        help='Maximum number of executions deleted in a database '
+             'transaction.'
+    ),
+    cfg.StrOpt(
+        'archive_dir',
+        help='Directory to export the expired executions to before deleting '
+             'them, as gzip compressed JSON lines files. The executions are '
+             'not exported if not set.'
+    ),
+]
+
 
 def list_opts():
     keystone_middleware_opts = auth_token.list_opts()
@@ -297,6 +578,8 @@ def list_opts():
         (KUBERNETES_GROUP, kubernetes_opts),
         (ETCD_GROUP, etcd_opts),
         (RLIMITS_GROUP, rlimits_opts),
+        (METADATA_CACHE_GROUP, metadata_cache_opts),
+        (EXECUTION_RETENTION_GROUP, execution_retention_opts),
         (None, [launch_opt]),
         (None, default_opts),
     ]
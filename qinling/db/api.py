@@ -16,6 +16,9 @@ import contextlib
 
 from oslo_db import api as db_api
 
+from qinling import context
+from qinling.db import cache
+
 
 _BACKEND_MAPPING = {
     'sqlalchemy': 'qinling.db.sqlalchemy.api',
@@ -68,11 +71,20 @@ def conditional_update(model, values, expected_values, **kwargs):
     return IMPL.conditional_update(model, values, expected_values, **kwargs)
 
 
-def get_function(id, insecure=None):
+def get_function(id, insecure=None, cached=False):
     """Get function from db.
 
     'insecure' param is needed for job handler and webhook.
+    'cached' param allows to get the function from the metadata cache, the
+    returned object is not bound to the db session.
     """
+    if cached:
+        return cache.functions.get(
+            id,
+            lambda: IMPL.get_function(id, insecure=insecure),
+            visible=None if insecure else cache.is_visible
+        )
+
     return IMPL.get_function(id, insecure=insecure)
 
 
@@ -93,14 +105,21 @@ def create_function(values):
 
 
 def update_function(id, values):
+    cache.functions.invalidate(id)
     return IMPL.update_function(id, values)
 
 
 def delete_function(id):
+    cache.functions.invalidate(id)
+    cache.function_versions.invalidate()
+    cache.function_aliases.invalidate()
     return IMPL.delete_function(id)
 
 
 def delete_functions(**kwargs):
+    cache.functions.invalidate()
+    cache.function_versions.invalidate()
+    cache.function_aliases.invalidate()
     return IMPL.delete_functions(**kwargs)
 
 
@@ -108,7 +127,14 @@ def create_runtime(values):
     return IMPL.create_runtime(values)
 
 
-def get_runtime(id):
+def get_runtime(id, cached=False):
+    if cached:
+        return cache.runtimes.get(
+            id,
+            lambda: IMPL.get_runtime(id),
+            visible=cache.is_runtime_visible
+        )
+
     return IMPL.get_runtime(id)
 
 
@@ -117,14 +143,17 @@ def get_runtimes():
 
 
 def delete_runtime(id):
+    cache.runtimes.invalidate(id)
     return IMPL.delete_runtime(id)
 
 
 def update_runtime(id, values):
+    cache.runtimes.invalidate(id)
     return IMPL.update_runtime(id, values)
 
 
 def delete_runtimes(**kwargs):
+    cache.runtimes.invalidate()
     return IMPL.delete_runtimes(**kwargs)
 
 
@@ -132,6 +161,14 @@ def create_execution(values):
     return IMPL.create_execution(values)
 
 
+def create_executions(values_list):
+    """Insert the executions with one executemany statement.
+
+    The ORM events are not triggered, the ids should be set by the caller.
+    """
+    return IMPL.create_executions(values_list)
+
+
 def get_execution(id):
     return IMPL.get_execution(id)
 
@@ -140,14 +177,77 @@ def get_executions(**filters):
     return IMPL.get_executions(**filters)
 
 
+def count_executions(**filters):
+    """Get the number of the executions matching the filters."""
+    return IMPL.count_executions(**filters)
+
+
+def count_executions_by_function(**filters):
+    """Get the number of the executions of every function version.
+
+    :return: A dict mapping (function_id, function_version) to the number of
+        the executions matching the filters.
+    """
+    return IMPL.count_executions_by_function(**filters)
+
+
 def delete_execution(id):
     return IMPL.delete_execution(id)
 
 
+def create_execution_logs(execution_id, logs):
+    """Store the execution logs in compressed chunks."""
+    return IMPL.create_execution_logs(execution_id, logs)
+
+
+def get_execution_logs(execution_id, offset=0, length=None, insecure=None):
+    """Get the execution logs.
+
+    Only the chunks including the requested range are read.
+
+    :param offset: Optional. Offset in bytes of the range.
+    :param length: Optional. Length in bytes of the range, until the end of
+        the logs if not specified.
+    :return: The UTF-8 encoded logs in the range.
+    """
+    return IMPL.get_execution_logs(execution_id, offset=offset,
+                                   length=length, insecure=insecure)
+
+
+def get_execution_logs_by_id(ids):
+    """Get the logs of the executions of any project in one query.
+
+    :return: A dict mapping the execution id to the logs, the executions
+        without log chunks are not included.
+    """
+    return IMPL.get_execution_logs_by_id(ids)
+
+
+def delete_executions_by_id(ids):
+    """Delete the executions of any project and their logs.
+
+    :return: Number of the executions deleted.
+    """
+    return IMPL.delete_executions_by_id(ids)
+
+
 def update_execution(id, values):
     return IMPL.update_execution(id, values)
 
 
+def update_executions_status(values, logs=None):
+    """Update the executions with one executemany statement.
+
+    The executions are updated by id regardless of the project.
+
+    :param values: A dict of the execution id and the values to update, e.g.
+        the status and the result.
+    :param logs: Optional. A dict of the execution id and the execution logs
+        to store.
+    """
+    return IMPL.update_executions_status(values, logs=logs)
+
+
 def delete_executions(**kwargs):
     return IMPL.delete_executions(**kwargs)
 
@@ -204,21 +304,37 @@ def delete_webhooks(**kwargs):
     return IMPL.delete_webhooks(**kwargs)
 
 
+def increase_function_count(function_id, version=0, count=1):
+    return IMPL.increase_function_count(function_id, version=version,
+                                        count=count)
+
+
 def increase_function_version(function_id, old_version, **kwargs):
     """This function is meant to be invoked within locking section."""
+    cache.functions.invalidate(function_id)
     return IMPL.increase_function_version(function_id, old_version, **kwargs)
 
 
-def get_function_version(function_id, version, **kwargs):
+def get_function_version(function_id, version, cached=False, **kwargs):
+    if cached:
+        return cache.function_versions.get(
+            (function_id, version),
+            lambda: IMPL.get_function_version(function_id, version, **kwargs),
+            visible=None if kwargs.get('insecure') else cache.is_visible
+        )
+
     return IMPL.get_function_version(function_id, version, **kwargs)
 
 
 # This function is only used in unit test.
 def update_function_version(function_id, version, **kwargs):
+    cache.function_versions.invalidate((function_id, version))
     return IMPL.update_function_version(function_id, version, **kwargs)
 
 
 def delete_function_version(function_id, version):
+    cache.functions.invalidate(function_id)
+    cache.function_versions.invalidate((function_id, version))
     return IMPL.delete_function_version(function_id, version)
 
 
@@ -230,7 +346,14 @@ def create_function_alias(**kwargs):
     return IMPL.create_function_alias(**kwargs)
 
 
-def get_function_alias(name, **kwargs):
+def get_function_alias(name, cached=False, **kwargs):
+    # Alias names are only unique in the project.
+    if cached and not kwargs.get('insecure'):
+        return cache.function_aliases.get(
+            (context.get_ctx().projectid, name),
+            lambda: IMPL.get_function_alias(name, **kwargs)
+        )
+
     return IMPL.get_function_alias(name, **kwargs)
 
 
@@ -239,13 +362,16 @@ def get_function_aliases(**kwargs):
 
 
 def update_function_alias(name, **kwargs):
+    cache.function_aliases.invalidate((context.get_ctx().projectid, name))
     return IMPL.update_function_alias(name, **kwargs)
 
 
 def delete_function_alias(name, **kwargs):
+    cache.function_aliases.invalidate((context.get_ctx().projectid, name))
     return IMPL.delete_function_alias(name, **kwargs)
 
 
 # For unit test
 def delete_function_aliases(**kwargs):
+    cache.function_aliases.invalidate()
     return IMPL.delete_function_aliases(**kwargs)
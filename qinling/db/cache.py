@@ -0,0 +1,132 @@
+# Copyright 2018 Catalyst IT Limited
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+"""In-process TTL/LRU cache of the records used to create executions.
+
+The records are changed rarely but read several times for every execution.
+The cache entries are invalidated by the db api when the records are changed
+in the current process, the changes made by other processes are visible after
+the entries expire.
+"""
+import collections
+import copy
+import threading
+import time
+
+from oslo_config import cfg
+
+from qinling import context
+
+CONF = cfg.CONF
+
+
+def _detach(db_obj):
+    """Copy the column values into an object not bound to a db session."""
+    obj = db_obj.__class__()
+
+    for col in db_obj.__table__.columns:
+        setattr(obj, col.name, copy.deepcopy(getattr(db_obj, col.name)))
+
+    return obj
+
+
+class MetadataCache(object):
+    def __init__(self, name):
+        self.name = name
+        self._lock = threading.Lock()
+        self._entries = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, loader, visible=None):
+        """Get the record from the cache or load it from the database.
+
+        :param loader: The function loading the record from the database.
+        :param visible: Optional. The function to check if the cached record
+            is visible in the current context, the record is loaded again if
+            it's not.
+        """
+        if not CONF.metadata_cache.enabled:
+            return loader()
+
+        with self._lock:
+            entry = self._entries.get(key)
+
+            if entry and entry[0] > time.time():
+                self._entries.pop(key)
+                self._entries[key] = entry
+
+                if not visible or visible(entry[1]):
+                    self.hits += 1
+                    return _detach(entry[1])
+
+            self.misses += 1
+
+        db_obj = loader()
+        expires_at = time.time() + CONF.metadata_cache.ttl
+
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (expires_at, _detach(db_obj))
+
+            while len(self._entries) > CONF.metadata_cache.size:
+                self._entries.popitem(last=False)
+
+        return db_obj
+
+    def invalidate(self, key=None):
+        """Remove the record from the cache, or all records if no key."""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(float(self.hits) / total, 4) if total else 0,
+                'size': len(self._entries)
+            }
+
+
+functions = MetadataCache('function')
+function_versions = MetadataCache('function_version')
+function_aliases = MetadataCache('function_alias')
+runtimes = MetadataCache('runtime')
+
+
+def is_visible(db_obj):
+    """The same project check as the secure query of the db api."""
+    return db_obj.project_id == context.get_ctx().projectid
+
+
+def is_runtime_visible(db_obj):
+    return db_obj.is_public or is_visible(db_obj)
+
+
+def invalidate_all():
+    for cache in (functions, function_versions, function_aliases, runtimes):
+        cache.invalidate()
+
+
+def get_stats():
+    return dict(
+        (cache.name, cache.stats())
+        for cache in (functions, function_versions, function_aliases,
+                      runtimes)
+    )
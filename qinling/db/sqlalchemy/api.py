@@ -12,14 +12,17 @@
 #    See the License for the specific language governing permissions and
 #    limitations under the License.
 
+import collections
 import contextlib
 import sys
 import threading
+import zlib
 
 from oslo_config import cfg
 from oslo_db import exception as oslo_db_exc
 from oslo_db.sqlalchemy import utils as db_utils
 from oslo_log import log as logging
+import six
 import sqlalchemy as sa
 
 from qinling import context
@@ -173,6 +176,33 @@ def _get_collection(model, insecure=False, limit=None, marker=None,
         )
 
 
+def _count_collection(model, insecure=False, group_by=None, **filters):
+    """Count the matching records with SELECT COUNT(*).
+
+    :param group_by: Optional. List of the column names to group the records
+        by, a dict mapping the tuple of the column values to the count is
+        returned if specified.
+    """
+    group_columns = [getattr(model, c) for c in group_by or []]
+    columns = tuple(group_columns) + (sa.func.count(model.id),)
+
+    query = (db_base.model_query(model, columns) if insecure
+             else _secure_query(model, *columns))
+    query = db_filters.apply_filters(query, model, **filters)
+
+    try:
+        if not group_columns:
+            return query.scalar()
+
+        query = query.group_by(*group_columns)
+        return dict((tuple(row[:-1]), row[-1]) for row in query.all())
+    except Exception as e:
+        raise exc.DBError(
+            "Failed when querying database, error type: %s, "
+            "error message: %s" % (e.__class__.__name__, str(e))
+        )
+
+
 def _get_collection_sorted_by_time(model, insecure=False, fields=None,
                                    sort_keys=['created_at'], **kwargs):
     return _get_collection(
@@ -349,6 +379,16 @@ def create_execution(values, session=None):
     return execution
 
 
+@db_base.session_aware()
+def create_executions(values_list, session=None):
+    try:
+        session.bulk_insert_mappings(models.Execution, values_list)
+    except oslo_db_exc.DBDuplicateEntry as e:
+        raise exc.DBError(
+            "Duplicate entry for Execution: %s" % e.columns
+        )
+
+
 @db_base.insecure_aware()
 @db_base.session_aware()
 def get_execution(id, insecure=None, session=None):
@@ -368,24 +408,143 @@ def update_execution(id, values, session=None):
     return execution
 
 
+@db_base.session_aware()
+def update_executions_status(values, logs=None, session=None):
+    session.bulk_update_mappings(
+        models.Execution,
+        [dict(v, id=execution_id) for execution_id, v in values.items()]
+    )
+
+    if logs:
+        session.bulk_insert_mappings(
+            models.ExecutionLog,
+            [chunk for execution_id, execution_logs in logs.items()
+             for chunk in _get_execution_log_chunks(execution_id,
+                                                    execution_logs)]
+        )
+
+
 @db_base.session_aware()
 def get_executions(session=None, **kwargs):
     return _get_collection_sorted_by_time(models.Execution, **kwargs)
 
 
+@db_base.session_aware()
+def count_executions(session=None, **kwargs):
+    return _count_collection(models.Execution, **kwargs)
+
+
+@db_base.session_aware()
+def count_executions_by_function(session=None, **kwargs):
+    return _count_collection(
+        models.Execution,
+        group_by=['function_id', 'function_version'],
+        **kwargs
+    )
+
+
 @db_base.session_aware()
 def delete_execution(id, session=None):
     execution = get_execution(id)
 
+    _delete_execution_logs([id])
     session.delete(execution)
 
 
 @db_base.insecure_aware()
 @db_base.session_aware()
 def delete_executions(session=None, insecure=None, **kwargs):
+    query = (db_base.model_query(models.Execution, (models.Execution.id,))
+             if insecure
+             else _secure_query(models.Execution, models.Execution.id))
+    _delete_execution_logs(query.filter_by(**kwargs).subquery())
+
     return _delete_all(models.Execution, insecure=insecure, **kwargs)
 
 
+@db_base.session_aware()
+def delete_executions_by_id(ids, session=None):
+    _delete_execution_logs(ids)
+
+    return db_base.model_query(models.Execution).filter(
+        models.Execution.id.in_(ids)
+    ).delete(synchronize_session=False)
+
+
+def _delete_execution_logs(execution_ids):
+    # NOTE: Not relying on the foreign key cascade which is not enabled for
+    # sqlite.
+    db_base.model_query(models.ExecutionLog).filter(
+        models.ExecutionLog.execution_id.in_(execution_ids)
+    ).delete(synchronize_session=False)
+
+
+def _get_execution_log_chunks(execution_id, logs):
+    if isinstance(logs, six.text_type):
+        logs = logs.encode('utf-8')
+
+    chunk_size = CONF.engine.execution_log_chunk_size
+    for position in range(0, len(logs), chunk_size):
+        chunk = logs[position:position + chunk_size]
+        yield {
+            'execution_id': execution_id,
+            'position': position,
+            'size': len(chunk),
+            'data': zlib.compress(chunk)
+        }
+
+
+@db_base.session_aware()
+def create_execution_logs(execution_id, logs, session=None):
+    session.bulk_insert_mappings(
+        models.ExecutionLog,
+        list(_get_execution_log_chunks(execution_id, logs))
+    )
+
+
+@db_base.insecure_aware()
+@db_base.session_aware()
+def get_execution_logs(execution_id, offset=0, length=None, insecure=None,
+                       session=None):
+    execution = get_execution(execution_id, insecure=insecure)
+    end = offset + length if length is not None else None
+
+    query = db_base.model_query(models.ExecutionLog).filter(
+        models.ExecutionLog.execution_id == execution_id,
+        models.ExecutionLog.position + models.ExecutionLog.size > offset
+    )
+    if end is not None:
+        query = query.filter(models.ExecutionLog.position < end)
+    chunks = query.order_by(models.ExecutionLog.position).all()
+
+    if not chunks:
+        # Logs of the executions finished before the execution_logs table
+        # was added.
+        logs = (execution.logs or '').encode('utf-8')
+        return logs[offset:end]
+
+    start = chunks[0].position
+    logs = b''.join(zlib.decompress(c.data) for c in chunks)
+
+    return logs[offset - start:end - start if end is not None else None]
+
+
+@db_base.session_aware()
+def get_execution_logs_by_id(ids, session=None):
+    chunks = db_base.model_query(models.ExecutionLog).filter(
+        models.ExecutionLog.execution_id.in_(ids)
+    ).order_by(
+        models.ExecutionLog.execution_id, models.ExecutionLog.position
+    ).all()
+
+    logs = collections.defaultdict(list)
+    for chunk in chunks:
+        logs[chunk.execution_id].append(zlib.decompress(chunk.data))
+
+    return dict((execution_id, b''.join(data))
+                for execution_id, data in logs.items())
+
+
 @db_base.session_aware()
 def create_job(values, session=None):
     job = models.Job()
@@ -500,6 +659,27 @@ def delete_webhooks(session=None, insecure=None, **kwargs):
     return _delete_all(models.Webhook, insecure=insecure, **kwargs)
 
 
+@db_base.session_aware()
+def increase_function_count(function_id, version=0, count=1, session=None):
+    """Increase the invocation count using a single UPDATE statement.
+
+    The count of the function version is increased if version is not 0.
+    """
+    if version == 0:
+        model = models.Function
+        query = db_base.model_query(model).filter_by(id=function_id)
+    else:
+        model = models.FunctionVersion
+        query = db_base.model_query(model).filter_by(
+            function_id=function_id, version_number=version
+        )
+
+    result = query.update({'count': model.count + count},
+                          synchronize_session=False)
+
+    return 0 != result
+
+
 @db_base.session_aware()
 def increase_function_version(function_id, old_version, session=None,
                               **kwargs):
@@ -39,7 +39,7 @@ def _add_if_not_exists(element, compiler, **kw):
     output = compiler.visit_create_table(element, **kw)
     if element.element.info.get("check_ifexists"):
         output = re.sub(
-            "^\s*CREATE TABLE", "CREATE TABLE IF NOT EXISTS", output, re.S)
+            r"^\s*CREATE TABLE", "CREATE TABLE IF NOT EXISTS", output, re.S)
     return output
 
 
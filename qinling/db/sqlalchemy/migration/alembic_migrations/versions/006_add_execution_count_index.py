@@ -0,0 +1,35 @@
+# Copyright 2018 OpenStack Foundation.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+
+"""add function version status index for executions table
+
+Revision ID: 006
+Revises: 005
+Create Date: 2018-08-20 10:00:00.114538
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '006'
+down_revision = '005'
+
+from alembic import op
+
+
+def upgrade():
+    op.create_index(
+        'executions_function_id_function_version_status',
+        'executions',
+        ['function_id', 'function_version', 'status']
+    )
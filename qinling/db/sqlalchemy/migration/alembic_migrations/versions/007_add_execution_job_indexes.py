@@ -0,0 +1,50 @@
+# Copyright 2018 OpenStack Foundation.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+
+"""add indexes for executions and jobs listing
+
+Revision ID: 007
+Revises: 006
+Create Date: 2018-08-27 15:00:00.532716
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '007'
+down_revision = '006'
+
+from alembic import op
+
+
+def upgrade():
+    op.create_index(
+        'executions_project_id_created_at',
+        'executions',
+        ['project_id', 'created_at']
+    )
+    op.create_index(
+        'executions_project_id_function_id_created_at',
+        'executions',
+        ['project_id', 'function_id', 'created_at']
+    )
+    op.create_index(
+        'executions_project_id_status_created_at',
+        'executions',
+        ['project_id', 'status', 'created_at']
+    )
+    op.create_index(
+        'jobs_status_next_execution_time',
+        'jobs',
+        ['status', 'next_execution_time']
+    )
@@ -0,0 +1,49 @@
+# Copyright 2018 OpenStack Foundation.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+
+"""add execution_logs table
+
+Revision ID: 008
+Revises: 007
+Create Date: 2018-09-03 11:00:00.226104
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '008'
+down_revision = '007'
+
+from alembic import op
+import sqlalchemy as sa
+
+from qinling.db.sqlalchemy import types as st
+
+
+def upgrade():
+    op.create_table(
+        'execution_logs',
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.Column('id', sa.String(length=36), nullable=False),
+        sa.Column('execution_id', sa.String(length=36), nullable=False),
+        sa.Column('position', sa.Integer(), nullable=False),
+        sa.Column('size', sa.Integer(), nullable=False),
+        sa.Column('data', st.MediumBlob(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('execution_id', 'position'),
+        sa.ForeignKeyConstraint(
+            ['execution_id'], [u'executions.id'], ondelete='CASCADE'
+        ),
+        info={"check_ifexists": True}
+    )
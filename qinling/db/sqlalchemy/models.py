@@ -52,6 +52,32 @@ class Function(model_base.QinlingSecureModelBase):
 class Execution(model_base.QinlingSecureModelBase):
     __tablename__ = 'executions'
 
+    __table_args__ = (
+        sa.Index(
+            '%s_function_id_function_version_status' % __tablename__,
+            'function_id',
+            'function_version',
+            'status'
+        ),
+        sa.Index(
+            '%s_project_id_created_at' % __tablename__,
+            'project_id',
+            'created_at'
+        ),
+        sa.Index(
+            '%s_project_id_function_id_created_at' % __tablename__,
+            'project_id',
+            'function_id',
+            'created_at'
+        ),
+        sa.Index(
+            '%s_project_id_status_created_at' % __tablename__,
+            'project_id',
+            'status',
+            'created_at'
+        ),
+    )
+
     function_id = sa.Column(sa.String(36), nullable=False)
     function_version = sa.Column(sa.Integer, default=0)
     status = sa.Column(sa.String(32), nullable=False)
@@ -59,12 +85,43 @@ class Execution(model_base.QinlingSecureModelBase):
     input = sa.Column(st.JsonLongDictType())
     result = sa.Column(st.JsonLongDictType())
     description = sa.Column(sa.String(255))
+    # Only the logs of the executions finished before the execution_logs
+    # table was added are stored here.
     logs = sa.Column(sa.Text(), nullable=True)
 
 
+class ExecutionLog(model_base.QinlingModelBase):
+    """A compressed chunk of the execution logs."""
+
+    __tablename__ = 'execution_logs'
+
+    __table_args__ = (
+        sa.UniqueConstraint('execution_id', 'position'),
+    )
+
+    id = model_base.id_column()
+    execution_id = sa.Column(
+        sa.String(36),
+        sa.ForeignKey(Execution.id, ondelete='CASCADE'),
+        nullable=False
+    )
+    # Offset and size in bytes of the uncompressed chunk in the logs.
+    position = sa.Column(sa.Integer, nullable=False)
+    size = sa.Column(sa.Integer, nullable=False)
+    data = sa.Column(st.MediumBlob(), nullable=False)
+
+
 class Job(model_base.QinlingSecureModelBase):
     __tablename__ = 'jobs'
 
+    __table_args__ = (
+        sa.Index(
+            '%s_status_next_execution_time' % __tablename__,
+            'status',
+            'next_execution_time'
+        ),
+    )
+
     name = sa.Column(sa.String(255), nullable=True)
     pattern = sa.Column(sa.String(32), nullable=True)
     status = sa.Column(sa.String(32), nullable=False)
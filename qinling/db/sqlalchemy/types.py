@@ -86,6 +86,10 @@ def LongText():
     return sa.Text().with_variant(mysql.LONGTEXT(), 'mysql')
 
 
+def MediumBlob():
+    return sa.LargeBinary().with_variant(mysql.MEDIUMBLOB(), 'mysql')
+
+
 class JsonEncodedLongText(JsonEncoded):
     impl = LongText()
 
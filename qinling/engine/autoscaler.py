@@ -0,0 +1,228 @@
+# Copyright 2018 Catalyst IT Limited
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+import math
+import threading
+import time
+
+from oslo_log import log as logging
+
+from qinling.db import api as db_api
+from qinling import status
+from qinling.utils import etcd_util
+
+LOG = logging.getLogger(__name__)
+
+# Weight of the latest interval in the smoothed arrival rate.
+RATE_SMOOTHING = 0.5
+# Weight of the latest interval in the smoothed execution duration.
+DURATION_SMOOTHING = 0.5
+
+
+class FunctionLoad(object):
+    """Load statistics of a function version in this engine."""
+
+    def __init__(self, runtime_id, now):
+        self.runtime_id = runtime_id
+        # Number of executions sent since the last tick.
+        self.arrivals = 0
+        # Number and total duration of the executions finished since the
+        # last tick.
+        self.finishes = 0
+        self.durations = 0.0
+        self.inflight = 0
+        # Smoothed number of executions per second.
+        self.rate = 0.0
+        # Smoothed execution duration in seconds.
+        self.duration = 0.0
+        self.last_arrival = now
+        self.last_tick = now
+
+
+class Autoscaler(object):
+    """Scale the function workers ahead of the demand.
+
+    The executions sent by the engine are counted in memory, the periodic
+    tick estimates the concurrency of every function version from the
+    arrival rate and the execution duration (Little's law) and scales the
+    workers up by as many workers as needed, at most max_step at a time. The
+    workers are scaled down to twice the needed number when less than a
+    third of them are needed, and to one after the function version has been
+    idle for idle_time seconds.
+
+    Deleting a worker kills the executions running in it and every engine
+    only sees its own share of the load, so the workers are only scaled
+    down when no execution of the function version is running, counted in
+    the database for all the engines.
+
+    The first worker of a function version is still created by the first
+    execution.
+    """
+
+    def __init__(self, engine, concurrency=3, max_step=5, idle_time=120,
+                 expiration=3600):
+        self.engine = engine
+        self.concurrency = concurrency
+        self.max_step = max_step
+        self.idle_time = idle_time
+        self.expiration = expiration
+        self._lock = threading.Lock()
+        self._loads = {}
+
+    def record_arrival(self, function_id, version, runtime_id, now=None):
+        now = now or time.time()
+
+        with self._lock:
+            load = self._loads.get((function_id, version))
+            if not load:
+                load = FunctionLoad(runtime_id, now)
+                self._loads[(function_id, version)] = load
+
+            load.arrivals += 1
+            load.inflight += 1
+            load.last_arrival = now
+
+    def record_finish(self, function_id, version, duration):
+        with self._lock:
+            load = self._loads.get((function_id, version))
+            if not load:
+                return
+
+            load.inflight = max(0, load.inflight - 1)
+            load.finishes += 1
+            load.durations += duration
+
+    def desired_workers(self, load, recent_rate):
+        # Follow a rising arrival rate immediately and extrapolate it to the
+        # next tick, follow a falling one slowly.
+        rate = max(load.rate, recent_rate + max(0, recent_rate - load.rate))
+        demand = max(load.inflight, rate * load.duration)
+
+        return max(1, int(math.ceil(demand / float(self.concurrency))))
+
+    def tick(self, now=None):
+        now = now or time.time()
+
+        with self._lock:
+            loads = list(self._loads.items())
+
+        if not loads:
+            return
+
+        try:
+            running = db_api.count_executions_by_function(
+                status=status.RUNNING, insecure=True
+            )
+        except Exception:
+            # Only scale up without knowing the load of the other engines.
+            LOG.exception('Failed to count the running executions.')
+            running = None
+
+        for (function_id, version), load in loads:
+            with self._lock:
+                if load.finishes:
+                    duration = load.durations / load.finishes
+                    if load.duration:
+                        load.duration = (
+                            DURATION_SMOOTHING * duration +
+                            (1 - DURATION_SMOOTHING) * load.duration
+                        )
+                    else:
+                        load.duration = duration
+                    load.finishes = 0
+                    load.durations = 0.0
+
+                elapsed = now - load.last_tick
+                recent_rate = load.arrivals / elapsed if elapsed > 0 else 0
+                desired = self.desired_workers(load, recent_rate)
+                load.rate = (RATE_SMOOTHING * recent_rate +
+                             (1 - RATE_SMOOTHING) * load.rate)
+                load.arrivals = 0
+                load.last_tick = now
+
+                idle_for = now - load.last_arrival
+                idle = load.inflight == 0 and idle_for >= self.idle_time
+                if idle and idle_for >= self.expiration:
+                    # The workers are deleted when the function expires.
+                    del self._loads[(function_id, version)]
+                    continue
+
+            try:
+                self._scale(
+                    function_id, version, load.runtime_id, desired, idle,
+                    None if running is None
+                    else max(running.get((function_id, version), 0),
+                             load.inflight)
+                )
+            except Exception:
+                LOG.exception('Failed to scale function %s(version %s).',
+                              function_id, version)
+
+    def _scale(self, function_id, version, runtime_id, desired, idle,
+               running=None):
+        with etcd_util.get_worker_lock(function_id, version) as lock:
+            if not lock.is_acquired():
+                # Being scaled by another engine or an execution.
+                return
+
+            workers = len(etcd_util.get_workers(function_id, version))
+            self._apply(function_id, version, runtime_id, workers, desired,
+                        idle, running)
+
+    def _apply(self, function_id, version, runtime_id, workers, desired,
+               idle, running=None):
+        """Scale the workers of the function version.
+
+        :param running: The number of the running executions of the function
+            version sent by all the engines, the workers are only scaled
+            down if it's known to be 0.
+        """
+        if workers == 0:
+            # Not started or expired, the next execution creates the worker.
+            return
+
+        if desired > workers:
+            count = min(desired - workers, self.max_step)
+            LOG.info(
+                'Autoscaling up function %s(version %s) by %s worker(s), '
+                'current workers: %s, desired workers: %s',
+                function_id, version, count, workers, desired
+            )
+            self.engine.scaleup_function(None, function_id, version,
+                                         runtime_id, count)
+            return
+
+        # The workers to delete are not chosen by their load, so none is
+        # deleted while an execution may be running in it.
+        if running is None or running > 0:
+            return
+
+        if (idle and workers > 1) or desired * 3 <= workers:
+            # Keep spare workers for the bursts unless the function is idle.
+            target = 1 if idle else desired * 2
+            count = min(workers - target, self.max_step)
+            LOG.info(
+                'Autoscaling down function %s(version %s) by %s worker(s), '
+                'current workers: %s, desired workers: %s',
+                function_id, version, count, workers, target
+            )
+            self.engine.scaledown_function(None, function_id, version, count)
+
+    def stats(self):
+        with self._lock:
+            return dict(
+                ('%s_%s' % key, {'inflight': load.inflight,
+                                 'rate': round(load.rate, 2),
+                                 'duration': round(load.duration, 2)})
+                for key, load in self._loads.items()
+            )
@@ -0,0 +1,77 @@
+# Copyright 2018 Catalyst IT Limited
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+import collections
+import random
+import threading
+
+RANDOM = 'random'
+LEAST_OUTSTANDING = 'least_outstanding'
+POWER_OF_TWO = 'power_of_two'
+POLICIES = (RANDOM, LEAST_OUTSTANDING, POWER_OF_TWO)
+
+
+class WorkerBalancer(object):
+    """Choose the function worker to send the execution request to.
+
+    The number of outstanding requests sent by this engine is tracked for
+    every worker url, a worker stuck on a slow execution is avoided by the
+    least_outstanding and power_of_two policies.
+    """
+
+    def __init__(self, policy=POWER_OF_TWO):
+        if policy not in POLICIES:
+            raise ValueError('Unknown balance policy %s' % policy)
+
+        self.policy = policy
+        self._lock = threading.Lock()
+        self._outstanding = collections.defaultdict(int)
+
+    def _choose(self, urls):
+        if len(urls) == 1 or self.policy == RANDOM:
+            return random.choice(urls)
+
+        if self.policy == POWER_OF_TWO:
+            candidates = random.sample(urls, 2)
+        else:
+            # Shuffle to break the ties randomly.
+            candidates = random.sample(urls, len(urls))
+
+        return min(candidates, key=lambda u: self._outstanding.get(u, 0))
+
+    def acquire(self, urls):
+        """Choose a worker url and count the request as outstanding.
+
+        The caller must call release() with the returned url when the request
+        finishes.
+        """
+        if not urls:
+            return None
+
+        with self._lock:
+            url = self._choose(urls)
+            self._outstanding[url] += 1
+
+        return url
+
+    def release(self, url):
+        with self._lock:
+            count = self._outstanding.get(url, 0)
+            if count <= 1:
+                self._outstanding.pop(url, None)
+            else:
+                self._outstanding[url] = count - 1
+
+    def outstanding(self, url):
+        with self._lock:
+            return self._outstanding.get(url, 0)
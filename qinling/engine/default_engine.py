@@ -11,12 +11,21 @@
 #    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
 #    License for the specific language governing permissions and limitations
 #    under the License.
+import functools
+import threading
+import time
+
+import futurist
 from oslo_config import cfg
 from oslo_log import log as logging
 import requests
 import tenacity
 
+from qinling import context
 from qinling.db import api as db_api
+from qinling.db import cache as db_cache
+from qinling.engine import autoscaler
+from qinling.engine import balancer
 from qinling.engine import utils
 from qinling import exceptions as exc
 from qinling import status
@@ -27,11 +36,40 @@ LOG = logging.getLogger(__name__)
 CONF = cfg.CONF
 
 
+def _chain_callbacks(first, second):
+    """Get a callback calling both callbacks, either may be None."""
+    if not first or not second:
+        return first or second
+
+    def callback():
+        try:
+            first()
+        finally:
+            second()
+
+    return callback
+
+
 class DefaultEngine(object):
-    def __init__(self, orchestrator, qinling_endpoint):
+    def __init__(self, orchestrator, qinling_endpoint, dispatcher=None):
         self.orchestrator = orchestrator
         self.qinling_endpoint = qinling_endpoint
         self.session = requests.Session()
+        self.dispatcher = dispatcher
+        self.balancer = balancer.WorkerBalancer(
+            CONF.engine.worker_balance_policy
+        )
+        # The running executions counted by the load check.
+        self._running_executions = {}
+        self.autoscaler = None
+        if CONF.engine.autoscale:
+            self.autoscaler = autoscaler.Autoscaler(
+                self,
+                concurrency=CONF.engine.function_concurrency,
+                max_step=CONF.engine.autoscale_max_step,
+                idle_time=CONF.engine.autoscale_idle_time,
+                expiration=CONF.engine.function_service_expiration
+            )
 
     def create_runtime(self, ctx, runtime_id):
         LOG.info('Start to create runtime %s.', runtime_id)
@@ -55,6 +93,8 @@ class DefaultEngine(object):
                 )
                 runtime.status = status.ERROR
 
+        db_cache.runtimes.invalidate(runtime_id)
+
     def delete_runtime(self, ctx, runtime_id):
         LOG.info('Start to delete runtime %s.', runtime_id)
 
@@ -87,6 +127,34 @@ class DefaultEngine(object):
 
         return self.orchestrator.get_pool(runtime_id)
 
+    def _count_running_executions(self, function_id, version, cached=False):
+        """Count the running executions of the function version.
+
+        :param cached: Optional. Use the count of the last
+            [engine]load_check_cache_ttl seconds if any.
+        """
+        key = (function_id, version)
+        now = time.time()
+
+        if cached:
+            counted_at, count = self._running_executions.get(key, (0, 0))
+            if now - counted_at < CONF.engine.load_check_cache_ttl:
+                return count
+
+        count = db_api.count_executions(
+            function_id=function_id,
+            function_version=version,
+            status=status.RUNNING
+        )
+        self._running_executions[key] = (now, count)
+
+        return count
+
+    def _needs_scaleup(self, workers, running_execs):
+        concurrency = (running_execs or 1) / (len(workers) or 1)
+        return (len(workers) == 0 or
+                concurrency > CONF.engine.function_concurrency)
+
     @tenacity.retry(
         wait=tenacity.wait_fixed(1),
         stop=tenacity.stop_after_attempt(30),
@@ -96,49 +164,124 @@ class DefaultEngine(object):
     def function_load_check(self, function_id, version, runtime_id):
         """Check function load and scale the workers if needed.
 
+        The worker lock is only taken when the workers seem to need scaling
+        up, the check is done again with the lock held since the workers may
+        have been scaled by another execution in the meantime. The lock is
+        only waited for when there is no worker yet.
+
         :return: None if no need to scale up otherwise return the service url
         """
+        workers = etcd_util.get_workers(function_id, version, cached=True)
+        if workers and (
+            self.autoscaler or
+            not self._needs_scaleup(
+                workers,
+                self._count_running_executions(function_id, version,
+                                               cached=True)
+            )
+        ):
+            return
+
         with etcd_util.get_worker_lock(function_id, version) as lock:
             if not lock.is_acquired():
+                # Being scaled up by another execution, don't wait for it if
+                # the execution can be sent to the existing workers.
+                if workers:
+                    return
+
                 raise exc.EtcdLockException(
                     'Etcd: failed to get worker lock for function %s'
                     '(version %s).' % (function_id, version)
                 )
 
             workers = etcd_util.get_workers(function_id, version)
-            running_execs = db_api.get_executions(
-                function_id=function_id,
-                function_version=version,
-                status=status.RUNNING
-            )
-            concurrency = (len(running_execs) or 1) / (len(workers) or 1)
-            if (len(workers) == 0 or
-                    concurrency > CONF.engine.function_concurrency):
+
+            # Only the first worker is created here, the others are created
+            # by the autoscaler periodic task.
+            if self.autoscaler:
+                if not workers:
+                    LOG.info('Scale up function %s(version %s) to the first '
+                             'worker.', function_id, version)
+                    return self.scaleup_function(None, function_id, version,
+                                                 runtime_id, 1)
+                return
+
+            running_execs = self._count_running_executions(function_id,
+                                                           version)
+            if self._needs_scaleup(workers, running_execs):
                 LOG.info(
                     'Scale up function %s(version %s). Current concurrency: '
                     '%s, execution number %s, worker number %s',
-                    function_id, version, concurrency, len(running_execs),
-                    len(workers)
+                    function_id, version,
+                    (running_execs or 1) / (len(workers) or 1),
+                    running_execs, len(workers)
                 )
 
                 # NOTE(kong): The increase step could be configurable
                 return self.scaleup_function(None, function_id, version,
                                              runtime_id, 1)
 
+    def _get_worker_urls(self, function_id, function_version):
+        """Get the worker urls to choose from for the execution request.
+
+        Only when the workers are reached directly instead of through the
+        service of the function. The url chosen by the balancer must be
+        released when the request finishes.
+        """
+        if CONF.kubernetes.service_address_type != 'pod_ip':
+            return []
+
+        return etcd_util.get_worker_urls(function_id, function_version,
+                                         cached=True)
+
+    def _request_finished(self, function_id, function_version, worker_url,
+                          started_at):
+        """Release the worker and record the execution duration."""
+        if worker_url:
+            self.balancer.release(worker_url)
+        if self.autoscaler:
+            self.autoscaler.record_finish(function_id, function_version,
+                                          time.time() - started_at)
+
     def create_execution(self, ctx, execution_id, function_id,
-                         function_version, runtime_id, input=None):
+                         function_version, runtime_id, input=None,
+                         is_sync=True, finished=None):
+        """Run the execution.
+
+        :param finished: Optional. Called once the execution is finished or
+            failed, also when it's finished later by the dispatcher.
+        """
+        dispatched = False
+        try:
+            dispatched = self._create_execution(
+                execution_id, function_id, function_version, runtime_id,
+                input=input, is_sync=is_sync, finished=finished
+            )
+        finally:
+            if finished and not dispatched:
+                finished()
+
+    def _create_execution(self, execution_id, function_id, function_version,
+                          runtime_id, input=None, is_sync=True,
+                          finished=None):
+        """Return True if the execution is left to the dispatcher."""
         LOG.info(
             'Creating execution. execution_id=%s, function_id=%s, '
-            'function_version=%s, runtime_id=%s, input=%s',
-            execution_id, function_id, function_version, runtime_id, input
+            'function_version=%s, runtime_id=%s, input=%s, is_sync=%s',
+            execution_id, function_id, function_version, runtime_id, input,
+            is_sync
         )
 
-        function = db_api.get_function(function_id)
+        function = db_api.get_function(function_id, cached=True)
         source = function.code['source']
         rlimit = {
             'cpu': function.cpu,
             'memory_size': function.memory_size
         }
+        # Packages of function versions never change.
+        md5sum = None
+        if function_version == 0:
+            md5sum = function.code.get('md5sum')
         image = None
         identifier = None
         labels = None
@@ -158,27 +301,64 @@ class DefaultEngine(object):
                 utils.handle_execution_exception(execution_id, str(e))
                 return
 
-        temp_url = etcd_util.get_service_url(function_id, function_version)
-        svc_url = svc_url or temp_url
-        if svc_url:
-            func_url = '%s/execute' % svc_url
-            LOG.debug(
-                'Found service url for function: %s(version %s), execution: '
-                '%s, url: %s',
-                function_id, function_version, execution_id, func_url
+        worker_urls = self._get_worker_urls(function_id, function_version)
+        if not worker_urls:
+            svc_url = svc_url or etcd_util.get_service_url(
+                function_id, function_version, cached=True
             )
-
+        if worker_urls or svc_url:
             data = utils.get_request_data(
                 CONF, function_id, function_version, execution_id,
                 rlimit, input, function.entry, function.trust_id,
-                self.qinling_endpoint, function.timeout
-            )
-            success, res = utils.url_request(
-                self.session, func_url, body=data
+                self.qinling_endpoint, function.timeout, md5sum=md5sum
             )
 
+            track = bool(worker_urls) or (self.autoscaler and
+                                          not is_image_source)
+            if track and self.autoscaler:
+                self.autoscaler.record_arrival(
+                    function_id, function_version, runtime_id
+                )
+
+            # The worker is chosen right before the request is sent so that
+            # it's always released in the balancer.
+            callback = None
+            try:
+                worker_url = self.balancer.acquire(worker_urls)
+                if track:
+                    callback = functools.partial(
+                        self._request_finished, function_id,
+                        function_version, worker_url, time.time()
+                    )
+
+                func_url = '%s/execute' % (worker_url or svc_url)
+                LOG.debug(
+                    'Found service url for function: %s(version %s), '
+                    'execution: %s, url: %s',
+                    function_id, function_version, execution_id, func_url
+                )
+
+                # Nobody is waiting for the asynchronous execution, don't
+                # occupy the RPC executor thread until it finishes.
+                if not is_sync and self.dispatcher:
+                    self.dispatcher.dispatch(
+                        execution_id, func_url, data,
+                        callback=_chain_callbacks(callback, finished)
+                    )
+                    # The callback is called by the dispatcher.
+                    callback = None
+                    return True
+
+                success, res = utils.url_request(
+                    self.session, func_url, body=data
+                )
+            finally:
+                if callback:
+                    callback()
+
             utils.finish_execution(execution_id, success, res,
-                                   is_image_source=is_image_source)
+                                   is_image_source=is_image_source,
+                                   is_sync=is_sync)
             return
 
         if is_image_source:
@@ -201,6 +381,7 @@ class DefaultEngine(object):
                 identifier=identifier,
                 labels=labels,
                 input=input,
+                md5sum=md5sum
             )
         except exc.OrchestratorException as e:
             utils.handle_execution_exception(execution_id, str(e))
@@ -219,11 +400,54 @@ class DefaultEngine(object):
             service_url=svc_url,
             entry=function.entry,
             trust_id=function.trust_id,
-            timeout=function.timeout
+            timeout=function.timeout,
+            md5sum=md5sum
         )
 
         utils.finish_execution(execution_id, success, res,
-                               is_image_source=is_image_source)
+                               is_image_source=is_image_source,
+                               is_sync=is_sync)
+
+    def create_executions(self, ctx, execution_ids, function_id,
+                          function_version, runtime_id, inputs=None):
+        """Run a batch of asynchronous executions of a function.
+
+        At most [engine]batch_execution_concurrency executions are sent to
+        the function workers at the same time, including the ones sent by
+        the asynchronous dispatcher, the workers are scaled by the load
+        check of every execution as usual.
+        """
+        LOG.info(
+            'Creating %s executions of batch. function_id=%s, '
+            'function_version=%s, runtime_id=%s',
+            len(execution_ids), function_id, function_version, runtime_id
+        )
+        if not execution_ids:
+            return
+        inputs = inputs or [None] * len(execution_ids)
+
+        def _create_execution(execution_id, input):
+            context.set_ctx(ctx)
+            try:
+                self.create_execution(
+                    ctx, execution_id, function_id, function_version,
+                    runtime_id, input=input, is_sync=False,
+                    finished=semaphore.release
+                )
+            except Exception as e:
+                utils.handle_execution_exception(execution_id, str(e))
+            finally:
+                context.set_ctx(None)
+
+        concurrency = min(CONF.engine.batch_execution_concurrency,
+                          len(execution_ids))
+        # The dispatched executions are still running when create_execution
+        # returns, they are counted until finished.
+        semaphore = threading.BoundedSemaphore(concurrency)
+        with futurist.ThreadPoolExecutor(max_workers=concurrency) as executor:
+            for execution_id, input in zip(execution_ids, inputs):
+                semaphore.acquire()
+                executor.submit(_create_execution, execution_id, input)
 
     def delete_function(self, ctx, function_id, function_version=0):
         """Deletes underlying resources allocated for function."""
@@ -231,23 +455,46 @@ class DefaultEngine(object):
                  function_version)
 
         self.orchestrator.delete_function(function_id, function_version)
+        self._running_executions.pop((function_id, function_version), None)
+
+        # The function resources are also deleted when the function package
+        # is updated, the cached function record is out of date then.
+        db_cache.functions.invalidate(function_id)
+        if function_version:
+            db_cache.function_versions.invalidate(
+                (function_id, function_version)
+            )
 
         LOG.info('Deleted function %s(version %s).', function_id,
                  function_version)
 
     def scaleup_function(self, ctx, function_id, function_version, runtime_id,
                          count=1):
+        # The package is prefetched by the new workers, only the md5 of the
+        # latest package is known.
+        md5sum = None
+        if CONF.engine.prefetch_function_package and function_version == 0:
+            function = db_api.get_function(function_id, cached=True)
+            md5sum = function.code.get('md5sum')
+
         worker_names, service_url = self.orchestrator.scaleup_function(
             function_id,
             function_version,
             identifier=runtime_id,
-            count=count
+            count=count,
+            md5sum=md5sum
         )
 
         for name in worker_names:
             etcd_util.create_worker(function_id, name,
                                     version=function_version)
 
+            if CONF.kubernetes.service_address_type == 'pod_ip':
+                etcd_util.create_worker_url(
+                    function_id, name, self.orchestrator.get_worker_url(name),
+                    version=function_version
+                )
+
         etcd_util.create_service_url(function_id, service_url,
                                      version=function_version)
 
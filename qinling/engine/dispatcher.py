@@ -0,0 +1,219 @@
+# Copyright 2018 Catalyst IT Limited
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""Send executions to the function services from an asyncio event loop.
+
+This module is only available on Python 3.
+"""
+import asyncio
+from concurrent import futures
+import threading
+
+import aiohttp
+from oslo_log import log as logging
+
+from qinling import context
+from qinling.engine import utils
+
+LOG = logging.getLogger(__name__)
+
+PING_ATTEMPTS = 30
+EXECUTE_ATTEMPTS = 10
+RETRY_INTERVAL = 1
+
+
+class AsyncDispatcher(object):
+    """Run the HTTP requests of the executions in an event loop thread.
+
+    The requests are sent concurrently without occupying a thread per
+    execution, the execution records are updated in a small thread pool when
+    the requests finish.
+    """
+
+    def __init__(self, max_executions=1000, db_workers=10):
+        self.max_executions = max_executions
+        self._loop = asyncio.new_event_loop()
+        self._thread = None
+        self._session = None
+        self._semaphore = None
+        self._tasks = set()
+        self._executor = futures.ThreadPoolExecutor(db_workers)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run,
+                                        name='qinling-dispatcher')
+        self._thread.daemon = True
+        self._thread.start()
+
+        asyncio.run_coroutine_threadsafe(self._setup(), self._loop).result()
+
+        LOG.info('Started asynchronous execution dispatcher, max concurrent '
+                 'executions: %s', self.max_executions)
+
+    def stop(self):
+        """Wait for the dispatched executions and stop the event loop."""
+        if not self._thread:
+            return
+
+        asyncio.run_coroutine_threadsafe(
+            self._shutdown(), self._loop
+        ).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._thread = None
+        self._executor.shutdown()
+
+        LOG.info('Stopped asynchronous execution dispatcher.')
+
+    def dispatch(self, execution_id, url, body, callback=None):
+        """Send the execution request to the function service url.
+
+        Returns immediately, the execution is finished in the database when
+        the response is received.
+
+        :param callback: Optional. Called without arguments in the event loop
+            thread once the request finishes.
+        """
+        ctx = context.get_ctx()
+        self._loop.call_soon_threadsafe(self._submit, ctx, execution_id, url,
+                                        body, callback)
+
+    def _run(self):
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_forever()
+        self._loop.close()
+
+    async def _setup(self):
+        self._semaphore = asyncio.Semaphore(self.max_executions)
+
+        # Tell the connect timeouts from the read timeouts, the request is
+        # only sent again if the connection was never established.
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_connection_create_end.append(self._on_connected)
+        trace_config.on_connection_reuseconn.append(self._on_connected)
+
+        self._session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=self.max_executions,
+                                           ssl=False),
+            trace_configs=[trace_config]
+        )
+
+    async def _on_connected(self, session, trace_config_ctx, params):
+        state = trace_config_ctx.trace_request_ctx
+        if state is not None:
+            state['connected'] = True
+
+    async def _shutdown(self):
+        if self._tasks:
+            LOG.info('Waiting for %s dispatched executions.', len(self._tasks))
+            await asyncio.wait(list(self._tasks))
+        await self._session.close()
+
+    def _submit(self, ctx, execution_id, url, body, callback=None):
+        task = self._loop.create_task(
+            self._execute(ctx, execution_id, url, body, callback)
+        )
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _execute(self, ctx, execution_id, url, body, callback=None):
+        success, res = False, {'output': 'Internal service error.'}
+        try:
+            async with self._semaphore:
+                success, res = await self._request(url, body)
+        except Exception:
+            LOG.exception('Failed to dispatch execution %s', execution_id)
+        finally:
+            # The execution is always finished so that it never stays in
+            # running status, even if the callback fails.
+            try:
+                if callback:
+                    callback()
+            finally:
+                await self._loop.run_in_executor(
+                    self._executor, self._finish, ctx, execution_id,
+                    success, res
+                )
+
+    async def _request(self, url, body):
+        """The coroutine version of qinling.engine.utils.url_request."""
+        service_url = utils.get_service_base_url(url)
+
+        # Send ping request first to make sure the url works, unless the
+        # service has been contacted successfully recently.
+        if not utils.SERVICE_HEALTH.is_healthy(service_url):
+            ping_url = '%s/ping' % service_url
+            timeout = aiohttp.ClientTimeout(sock_connect=3, sock_read=3)
+            for a in range(PING_ATTEMPTS):
+                try:
+                    async with self._session.get(ping_url, timeout=timeout):
+                        break
+                except (aiohttp.ClientError, asyncio.TimeoutError,
+                        OSError) as e:
+                    if a == PING_ATTEMPTS - 1:
+                        LOG.error("Failed to request url %s, error: %s",
+                                  ping_url, str(e))
+                        return False, {'output': 'Function execution failed.'}
+                    await asyncio.sleep(RETRY_INTERVAL)
+
+            utils.SERVICE_HEALTH.mark_healthy(service_url)
+
+        exception = None
+        # Default execution max duration is 3min, could be configurable
+        timeout = aiohttp.ClientTimeout(sock_connect=3, sock_read=180)
+        for a in range(EXECUTE_ATTEMPTS):
+            state = {'connected': False}
+            try:
+                async with self._session.post(url, json=body, timeout=timeout,
+                                              trace_request_ctx=state) as res:
+                    utils.SERVICE_HEALTH.mark_healthy(service_url)
+                    try:
+                        return True, await res.json(content_type=None)
+                    except Exception as e:
+                        LOG.error("Failed to request url %s, error: %s",
+                                  url, str(e))
+                        LOG.error("Response status: %s, content: %s",
+                                  res.status, await res.read())
+                        return False, {'output': 'Function execution timeout.'}
+            except asyncio.TimeoutError as e:
+                if state['connected']:
+                    LOG.error("Failed to request url %s, error: %s", url,
+                              str(e))
+                    return False, {'output': 'Function execution timeout.'}
+
+                # Connect timeout, retried like the connection errors.
+                exception = e
+                utils.SERVICE_HEALTH.invalidate(service_url)
+                await asyncio.sleep(RETRY_INTERVAL)
+            except aiohttp.ClientConnectionError as e:
+                exception = e
+                utils.SERVICE_HEALTH.invalidate(service_url)
+                await asyncio.sleep(RETRY_INTERVAL)
+            except Exception as e:
+                LOG.error("Failed to request url %s, error: %s", url, str(e))
+                return False, {'output': 'Function execution timeout.'}
+
+        LOG.error("Could not connect to function service. Reason: %s",
+                  exception)
+
+        return False, {'output': 'Internal service error.'}
+
+    def _finish(self, ctx, execution_id, success, res):
+        context.set_ctx(ctx)
+        try:
+            utils.finish_execution(execution_id, success, res,
+                                   is_sync=False)
+        except Exception:
+            LOG.exception('Failed to finish execution %s', execution_id)
+        finally:
+            context.set_ctx(None)
@@ -0,0 +1,146 @@
+# Copyright 2018 Catalyst IT Limited
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+from datetime import timedelta
+import gzip
+import os
+import threading
+import time
+
+from oslo_log import log as logging
+from oslo_serialization import jsonutils
+from oslo_utils import timeutils
+
+from qinling.db import api as db_api
+from qinling import status
+
+LOG = logging.getLogger(__name__)
+
+
+class ExecutionPurger(object):
+    """Delete the finished executions older than the retention period.
+
+    The executions are deleted in batches of batch_size, every batch in its
+    own transaction, so that the executions table isn't locked for long.
+    If archive_dir is set, the executions of every run are exported to a
+    gzip compressed JSON lines file before being deleted.
+    """
+
+    def __init__(self, days, project_days=None, batch_size=1000,
+                 archive_dir=None):
+        self.days = days
+        self.project_days = dict(
+            (project_id, int(d)) for project_id, d in
+            (project_days or {}).items()
+        )
+        self.batch_size = batch_size
+        self.archive_dir = archive_dir
+        self._lock = threading.Lock()
+        self._runs = 0
+        self._purged = 0
+        self._last_purged = 0
+        self._last_duration = 0.0
+
+    def _get_filters(self, now):
+        """Get the filters of the expired executions of every project."""
+        common = {'status': {'nin': [status.RUNNING]}}
+
+        default = dict(
+            common, created_at={'lt': now - timedelta(days=self.days)}
+        )
+        if self.project_days:
+            default['project_id'] = {'nin': list(self.project_days)}
+        yield default
+
+        for project_id, days in self.project_days.items():
+            yield dict(common, project_id=project_id,
+                       created_at={'lt': now - timedelta(days=days)})
+
+    def _open_archive(self, now):
+        path = os.path.join(
+            self.archive_dir,
+            'executions-%s.jsonl.gz' % now.strftime('%Y%m%d%H%M%S')
+        )
+        LOG.info('Exporting expired executions to %s', path)
+
+        return gzip.open(path, 'ab')
+
+    def _export(self, archive, executions):
+        logs = db_api.get_execution_logs_by_id([e.id for e in executions])
+
+        for execution in executions:
+            values = execution.to_dict()
+            # Logs of the executions finished before the execution_logs
+            # table was added are still in the executions table.
+            values['logs'] = (
+                logs[execution.id].decode('utf-8', 'replace')
+                if execution.id in logs else execution.logs or ''
+            )
+            archive.write((jsonutils.dumps(values) + '\n').encode('utf-8'))
+
+        # Make sure the executions are exported before deleting them.
+        archive.flush()
+
+    def purge(self, now=None):
+        now = now or timeutils.utcnow()
+        start = time.time()
+        purged = 0
+        archive = None
+
+        try:
+            for filters in self._get_filters(now):
+                while True:
+                    executions = db_api.get_executions(
+                        insecure=True,
+                        limit=self.batch_size,
+                        sort_keys=['created_at'],
+                        fields=None if self.archive_dir else ['id'],
+                        **filters
+                    )
+                    if not executions:
+                        break
+
+                    if self.archive_dir:
+                        archive = archive or self._open_archive(now)
+                        self._export(archive, executions)
+                    db_api.delete_executions_by_id(
+                        [e.id for e in executions]
+                    )
+                    purged += len(executions)
+
+                    if len(executions) < self.batch_size:
+                        break
+        finally:
+            if archive:
+                archive.close()
+
+            duration = time.time() - start
+            with self._lock:
+                self._runs += 1
+                self._purged += purged
+                self._last_purged = purged
+                self._last_duration = duration
+
+        LOG.info('Purged %s expired executions in %.2f seconds.', purged,
+                 duration)
+
+        return purged
+
+    def stats(self):
+        with self._lock:
+            return {
+                'runs': self._runs,
+                'purged': self._purged,
+                'last_purged': self._last_purged,
+                'last_duration': round(self._last_duration, 2)
+            }
@@ -17,33 +17,70 @@ from oslo_config import cfg
 from oslo_log import log as logging
 import oslo_messaging as messaging
 from oslo_messaging.rpc import dispatcher
+import six
 
 from qinling.db import api as db_api
 from qinling.engine import default_engine as engine
+from qinling.engine import utils as engine_utils
 from qinling.orchestrator import base as orchestra_base
 from qinling import rpc
 from qinling.services import periodics
+from qinling.utils import etcd_util
 from qinling.utils.openstack import keystone as keystone_utils
 
 LOG = logging.getLogger(__name__)
 CONF = cfg.CONF
 
 
+def _get_execution_dispatcher():
+    if not CONF.engine.async_dispatch:
+        return None
+
+    if six.PY2:
+        LOG.warning('Asynchronous execution dispatch is not supported on '
+                    'Python 2, falling back to the synchronous mode.')
+        return None
+
+    try:
+        from qinling.engine import dispatcher as engine_dispatcher
+    except ImportError as e:
+        LOG.warning('Asynchronous execution dispatch is not available, '
+                    'falling back to the synchronous mode. Error: %s', e)
+        return None
+
+    return engine_dispatcher.AsyncDispatcher(
+        max_executions=CONF.engine.max_async_executions,
+        db_workers=CONF.engine.async_db_workers
+    )
+
+
 class EngineService(cotyledon.Service):
     def __init__(self, worker_id):
         super(EngineService, self).__init__(worker_id)
         self.server = None
+        self.execution_dispatcher = None
 
     def run(self):
         qinling_endpoint = keystone_utils.get_qinling_endpoint()
         orchestrator = orchestra_base.load_orchestrator(CONF, qinling_endpoint)
         db_api.setup_db()
 
+        if CONF.etcd.local_mirror:
+            LOG.info('Starting etcd local mirror...')
+            etcd_util.start_mirror()
+
         topic = CONF.engine.topic
         server = CONF.engine.host
         transport = messaging.get_rpc_transport(CONF)
         target = messaging.Target(topic=topic, server=server, fanout=False)
-        endpoint = engine.DefaultEngine(orchestrator, qinling_endpoint)
+        self.execution_dispatcher = _get_execution_dispatcher()
+        if self.execution_dispatcher:
+            self.execution_dispatcher.start()
+
+        endpoint = engine.DefaultEngine(
+            orchestrator, qinling_endpoint,
+            dispatcher=self.execution_dispatcher
+        )
         access_policy = dispatcher.DefaultRPCAccessPolicy
         self.server = messaging.get_rpc_server(
             transport,
@@ -58,6 +95,10 @@ class EngineService(cotyledon.Service):
         LOG.info('Starting function mapping periodic task...')
         periodics.start_function_mapping_handler(endpoint)
 
+        if CONF.execution_retention.enabled:
+            LOG.info('Starting execution purge periodic task...')
+            periodics.start_execution_purger()
+
         LOG.info('Starting engine...')
         self.server.start()
 
@@ -68,3 +109,9 @@ class EngineService(cotyledon.Service):
             LOG.info('Stopping engine...')
             self.server.stop()
             self.server.wait()
+
+        if self.execution_dispatcher:
+            self.execution_dispatcher.stop()
+
+        engine_utils.RESULT_BUFFER.stop()
+        etcd_util.stop_mirror()
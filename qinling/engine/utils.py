@@ -11,8 +11,12 @@
 #    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
 #    License for the specific language governing permissions and limitations
 #    under the License.
+import atexit
+import os
+import threading
 import time
 
+from oslo_config import cfg
 from oslo_log import log as logging
 import requests
 import six
@@ -24,29 +28,170 @@ from qinling import status
 from qinling.utils import constants
 
 LOG = logging.getLogger(__name__)
+CONF = cfg.CONF
+
+
+class ServiceHealthCache(object):
+    """Remember the function services that were contacted successfully.
+
+    The ping request before the execution is only needed for the services
+    that are newly created or failed recently.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._last_contact = {}
+        self.hits = 0
+        self.misses = 0
+
+    def is_healthy(self, service_url):
+        ttl = CONF.engine.service_health_ttl
+        last_contact = self._last_contact.get(service_url)
+
+        with self._lock:
+            if last_contact and time.time() - last_contact < ttl:
+                self.hits += 1
+                return True
+
+            self.misses += 1
+
+        if last_contact:
+            self.invalidate(service_url)
+        return False
+
+    def mark_healthy(self, service_url):
+        if CONF.engine.service_health_ttl > 0:
+            self._last_contact[service_url] = time.time()
+
+    def invalidate(self, service_url):
+        self._last_contact.pop(service_url, None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'services': len(self._last_contact)
+            }
+
+
+SERVICE_HEALTH = ServiceHealthCache()
+
+
+class ExecutionResultBuffer(object):
+    """Coalesce the results of the finished asynchronous executions.
+
+    The results are written to the database periodically by a background
+    thread, the status of all the buffered executions is updated with one
+    executemany statement and their logs are inserted with another one, in a
+    single transaction.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._values = {}
+        self._logs = {}
+        self._pid = None
+        self._stop = threading.Event()
+        self._full = threading.Event()
+
+    def add(self, execution_id, execution_status, logs, res):
+        with self._lock:
+            self._values[execution_id] = {
+                'status': execution_status,
+                'result': res
+            }
+            if logs:
+                self._logs[execution_id] = logs
+
+            if len(self._values) >= CONF.engine.execution_result_batch_size:
+                self._full.set()
+
+            # The engine workers are forked after the module is imported.
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._start()
+
+    def flush(self):
+        with self._lock:
+            values, self._values = self._values, {}
+            logs, self._logs = self._logs, {}
+
+        if not values:
+            return
+
+        try:
+            db_api.update_executions_status(values, logs=logs)
+        except Exception:
+            # Don't let one execution, e.g. deleted in the meantime, fail
+            # the others.
+            LOG.exception('Failed to update %s executions, updating them one '
+                          'by one.', len(values))
+            for execution_id, v in values.items():
+                try:
+                    db_api.update_executions_status(
+                        {execution_id: v},
+                        logs={execution_id: logs[execution_id]}
+                        if execution_id in logs else None
+                    )
+                except Exception:
+                    LOG.exception('Failed to update execution %s.',
+                                  execution_id)
+
+        LOG.debug('Updated %s finished executions.', len(values))
+
+    def stop(self):
+        self._stop.set()
+        self._full.set()
+        self.flush()
+
+    def _start(self):
+        self._stop.clear()
+        thread = threading.Thread(target=self._run)
+        thread.daemon = True
+        thread.start()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._full.wait(CONF.engine.execution_result_flush_interval)
+            self._full.clear()
+            self.flush()
+
+
+RESULT_BUFFER = ExecutionResultBuffer()
+atexit.register(RESULT_BUFFER.stop)
+
+
+def get_service_base_url(url):
+    """Get the service url from the url of an API of the function service."""
+    return url.rsplit('/', 1)[0]
 
 
 def url_request(request_session, url, body=None):
     """Send request to a service url."""
     exception = None
+    service_url = get_service_base_url(url)
 
-    # Send ping request first to make sure the url works
-    try:
-        temp = url.split('/')
-        temp[-1] = 'ping'
-        ping_url = '/'.join(temp)
-        r = tenacity.Retrying(
-            wait=tenacity.wait_fixed(1),
-            stop=tenacity.stop_after_attempt(30),
-            reraise=True,
-            retry=tenacity.retry_if_exception_type(IOError)
-        )
-        r.call(request_session.get, ping_url, timeout=(3, 3), verify=False)
-    except Exception as e:
-        LOG.exception(
-            "Failed to request url %s, error: %s", ping_url, str(e)
-        )
-        return False, {'output': 'Function execution failed.'}
+    # Send ping request first to make sure the url works, unless the service
+    # has been contacted successfully recently.
+    if not SERVICE_HEALTH.is_healthy(service_url):
+        try:
+            ping_url = '%s/ping' % service_url
+            r = tenacity.Retrying(
+                wait=tenacity.wait_fixed(1),
+                stop=tenacity.stop_after_attempt(30),
+                reraise=True,
+                retry=tenacity.retry_if_exception_type(IOError)
+            )
+            r.call(request_session.get, ping_url, timeout=(3, 3),
+                   verify=False)
+        except Exception as e:
+            LOG.exception(
+                "Failed to request url %s, error: %s", ping_url, str(e)
+            )
+            return False, {'output': 'Function execution failed.'}
+
+        SERVICE_HEALTH.mark_healthy(service_url)
 
     for a in six.moves.xrange(10):
         res = None
@@ -55,9 +200,11 @@ def url_request(request_session, url, body=None):
             res = request_session.post(
                 url, json=body, timeout=(3, 180), verify=False
             )
+            SERVICE_HEALTH.mark_healthy(service_url)
             return True, res.json()
         except requests.ConnectionError as e:
             exception = e
+            SERVICE_HEALTH.invalidate(service_url)
             time.sleep(1)
         except Exception as e:
             LOG.exception(
@@ -75,23 +222,32 @@ def url_request(request_session, url, body=None):
     return False, {'output': 'Internal service error.'}
 
 
-def get_request_data(conf, function_id, version, execution_id, rlimit, input,
-                     entry, trust_id, qinling_endpoint, timeout):
-    """Prepare the request body should send to the worker."""
-    ctx = context.get_ctx()
-
+def get_download_url(qinling_endpoint, function_id, version):
+    """Get the url to download the function package from."""
     if version == 0:
-        download_url = (
+        return (
             '%s/%s/functions/%s?download=true' %
             (qinling_endpoint.strip('/'), constants.CURRENT_VERSION,
              function_id)
         )
-    else:
-        download_url = (
-            '%s/%s/functions/%s/versions/%s?download=true' %
-            (qinling_endpoint.strip('/'), constants.CURRENT_VERSION,
-             function_id, version)
-        )
+
+    return (
+        '%s/%s/functions/%s/versions/%s?download=true' %
+        (qinling_endpoint.strip('/'), constants.CURRENT_VERSION,
+         function_id, version)
+    )
+
+
+def get_request_data(conf, function_id, version, execution_id, rlimit, input,
+                     entry, trust_id, qinling_endpoint, timeout, md5sum=None):
+    """Prepare the request body should send to the worker.
+
+    :param md5sum: Optional. The function package md5, used by the runtime to
+        decide if the cached function module is still valid, and by the
+        sidecar to store the package in its package cache.
+    """
+    ctx = context.get_ctx()
+    download_url = get_download_url(qinling_endpoint, function_id, version)
 
     data = {
         'execution_id': execution_id,
@@ -105,6 +261,10 @@ def get_request_data(conf, function_id, version, execution_id, rlimit, input,
         'request_id': ctx.request_id,
         'timeout': timeout,
     }
+    if md5sum:
+        data['package_md5'] = md5sum
+    if conf.engine.reuse_function_module:
+        data.update({'reuse_module': True, 'package_md5': md5sum})
     if conf.pecan.auth_enable:
         data.update(
             {
@@ -120,27 +280,33 @@ def get_request_data(conf, function_id, version, execution_id, rlimit, input,
 
 
 def db_set_execution_status(execution_id, execution_status, logs, res):
-    db_api.update_execution(
-        execution_id,
-        {
-            'status': execution_status,
-            'logs': logs,
-            'result': res
-        }
-    )
+    with db_api.transaction():
+        db_api.update_execution(
+            execution_id,
+            {
+                'status': execution_status,
+                'result': res
+            }
+        )
+        if logs:
+            db_api.create_execution_logs(execution_id, logs)
 
 
-def finish_execution(execution_id, success, res, is_image_source=False):
+def finish_execution(execution_id, success, res, is_image_source=False,
+                     is_sync=True):
     logs = res.pop('logs', '')
     success = success and res.pop('success', True)
+    execution_status = status.SUCCESS if success else status.FAILED
 
     LOG.debug(
         'Finished execution %s, success: %s', execution_id, success
     )
-    db_set_execution_status(
-        execution_id, status.SUCCESS if success else status.FAILED,
-        logs, res
-    )
+    # Nobody is waiting for the result of the asynchronous execution.
+    if not is_sync and CONF.engine.execution_result_flush_interval:
+        RESULT_BUFFER.add(execution_id, execution_status, logs, res)
+        return
+
+    db_set_execution_status(execution_id, execution_status, logs, res)
 
 
 def handle_execution_exception(execution_id, exc_str):
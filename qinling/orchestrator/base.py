@@ -63,6 +63,14 @@ class OrchestratorBase(object):
     def delete_worker(self, worker_name, **kwargs):
         raise NotImplementedError
 
+    def get_worker_url(self, worker_name, **kwargs):
+        """Get the url to send requests to the worker directly.
+
+        Return None if the requests should be sent to the service url of the
+        function.
+        """
+        return None
+
 
 def load_orchestrator(conf, qinling_endpoint):
     global ORCHESTRATOR
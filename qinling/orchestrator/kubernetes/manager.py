@@ -12,6 +12,7 @@
 #    See the License for the specific language governing permissions and
 #    limitations under the License.
 
+import collections
 import copy
 import json
 import os
@@ -24,9 +25,12 @@ import requests
 import tenacity
 import yaml
 
+from qinling import context
 from qinling.engine import utils
 from qinling import exceptions as exc
 from qinling.orchestrator import base
+from qinling.orchestrator.kubernetes import node_cache
+from qinling.orchestrator.kubernetes import pod_cache
 from qinling.orchestrator.kubernetes import utils as k8s_util
 from qinling.utils import common
 
@@ -34,6 +38,8 @@ from qinling.utils import common
 LOG = logging.getLogger(__name__)
 
 TEMPLATES_DIR = (os.path.dirname(os.path.realpath(__file__)) + '/templates/')
+# The port the runtime container listens on, see deployment.j2
+WORKER_PORT = 9090
 
 
 class KubernetesManager(base.OrchestratorBase):
@@ -65,6 +71,19 @@ class KubernetesManager(base.OrchestratorBase):
         # http://docs.python-requests.org/en/master/user/advanced/#session-objects
         self.session = requests.Session()
 
+        self.pod_cache = None
+        if self.conf.kubernetes.enable_pod_cache:
+            self.pod_cache = pod_cache.PodCache(
+                self.v1,
+                self.conf.kubernetes.namespace,
+                watch_timeout=self.conf.kubernetes.pod_cache_watch_timeout
+            )
+            self.pod_cache.start()
+
+        self.node_cache = node_cache.NodeAddressCache(
+            self.v1, ttl=self.conf.kubernetes.node_address_cache_ttl
+        )
+
     def _ensure_namespace(self):
         ret = self.v1.list_namespace()
         cur_names = [i.metadata.name for i in ret.items]
@@ -121,12 +140,7 @@ class KubernetesManager(base.OrchestratorBase):
         total = ret.status.replicas
 
         labels = {'runtime_id': name}
-        selector = common.convert_dict_to_string(labels)
-        ret = self.v1.list_namespaced_pod(
-            self.conf.kubernetes.namespace,
-            label_selector='!function_id,%s' % selector
-        )
-        available = len(ret.items)
+        available = len(self._list_pods(labels, bound=False))
 
         return {"total": total, "available": available}
 
@@ -257,40 +271,58 @@ class KubernetesManager(base.OrchestratorBase):
 
         return True
 
+    def _list_pods(self, labels, bound=None):
+        """List pods from the pod cache if enabled or the API server.
+
+        :param bound: Optional. If False, only return the pods that are not
+            bound to any function.
+        """
+        if self.pod_cache:
+            return self.pod_cache.get_pods(labels, bound=bound)
+
+        selector = common.convert_dict_to_string(labels)
+        if bound is False:
+            selector = '!function_id,%s' % selector
+
+        ret = self.v1.list_namespaced_pod(
+            self.conf.kubernetes.namespace,
+            label_selector=selector
+        )
+
+        return ret.items
+
     def _choose_available_pods(self, labels, count=1, function_id=None,
                                function_version=0):
         # If there is already a pod for function, reuse it.
         if function_id:
-            ret = self.v1.list_namespaced_pod(
-                self.conf.kubernetes.namespace,
-                label_selector='function_id=%s,function_version=%s' %
-                               (function_id, function_version)
+            pods = self._list_pods(
+                collections.OrderedDict(
+                    [('function_id', function_id),
+                     ('function_version', str(function_version))]
+                )
             )
-            if len(ret.items) >= count:
+            if len(pods) >= count:
                 LOG.debug(
                     "Function %s(version %s) already associates to a pod with "
                     "at least %d worker(s). ",
                     function_id, function_version, count
                 )
-                return ret.items[:count]
+                return pods[:count]
 
-        selector = common.convert_dict_to_string(labels)
-        ret = self.v1.list_namespaced_pod(
-            self.conf.kubernetes.namespace,
-            label_selector='!function_id,%s' % selector
-        )
+        pods = self._list_pods(labels, bound=False)
 
-        if len(ret.items) < count:
+        if len(pods) < count:
             return []
 
-        return ret.items[-count:]
+        return pods[-count:]
 
     def _prepare_pod(self, pod, deployment_name, function_id, version,
-                     labels=None):
+                     labels=None, md5sum=None):
         """Pod preparation.
 
         1. Update pod labels.
-        2. Expose service.
+        2. Ask the sidecar to prefetch the function package if enabled.
+        3. Expose service.
         """
         pod_name = pod.metadata.name
         labels = labels or {}
@@ -307,18 +339,33 @@ class KubernetesManager(base.OrchestratorBase):
             {'function_id': function_id, 'function_version': str(version)}
         )
 
+        if md5sum and self.conf.engine.prefetch_function_package:
+            self._prefetch_package(pod, function_id, version, md5sum)
+
+        # The requests are sent to the pod directly.
+        if self.conf.kubernetes.service_address_type == 'pod_ip':
+            return pod_name, self._get_pod_url(pod)
+
         # Create service for the chosen pod.
         service_name = "service-%s-%s" % (function_id, version)
         labels.update(
             {'function_id': function_id, 'function_version': str(version)}
         )
 
+        # The requests sent to the NodePort of the pod's node are not
+        # forwarded to the pods on other nodes.
+        address_type = self.conf.kubernetes.service_address_type
+        external_traffic_policy = None
+        if address_type == 'pod_node':
+            external_traffic_policy = 'Local'
+
         # TODO(kong): Make the service type configurable.
         service_body = self.service_template.render(
             {
                 "service_name": service_name,
                 "labels": labels,
-                "selector": pod_labels
+                "selector": pod_labels,
+                "external_traffic_policy": external_traffic_policy
             }
         )
         try:
@@ -343,24 +390,55 @@ class KubernetesManager(base.OrchestratorBase):
             else:
                 raise
 
-        # Get external ip address for an arbitrary node.
-        node_port = ret.spec.ports[0].node_port
-        nodes = self.v1.list_node()
-        addresses = nodes.items[0].status.addresses
-        node_ip = None
-        for addr in addresses:
-            if addr.type == 'ExternalIP':
-                node_ip = addr.address
+        if address_type == 'cluster_ip':
+            pod_service_url = 'http://%s:%s' % (ret.spec.cluster_ip,
+                                                ret.spec.ports[0].port)
+        else:
+            node_name = None
+            if address_type == 'pod_node':
+                node_name = pod.spec.node_name
+            node_ip = self.node_cache.get_address(node_name)
+            pod_service_url = 'http://%s:%s' % (node_ip,
+                                                ret.spec.ports[0].node_port)
 
-        # FIXME: test purpose using minikube
-        if not node_ip:
-            for addr in addresses:
-                if addr.type == 'InternalIP':
-                    node_ip = addr.address
+        return pod_name, pod_service_url
 
-        pod_service_url = 'http://%s:%s' % (node_ip, node_port)
+    def _prefetch_package(self, pod, function_id, version, md5sum):
+        """Ask the sidecar to download the package in background.
 
-        return pod_name, pod_service_url
+        The package is downloaded by the first execution anyway, so any
+        failure is ignored.
+        """
+        if not pod.status.pod_ip:
+            return
+
+        data = {
+            'download_url': utils.get_download_url(
+                self.qinling_endpoint, function_id, version
+            ),
+            'function_id': function_id,
+            'package_md5': md5sum
+        }
+        if self.conf.pecan.auth_enable:
+            data['token'] = context.get_ctx().auth_token
+
+        # The sidecar only listens on localhost, the request is forwarded by
+        # the runtime.
+        url = 'http://%s:%s/prefetch' % (pod.status.pod_ip, WORKER_PORT)
+        try:
+            self.session.post(url, json=data, timeout=(3, 3))
+        except Exception as e:
+            LOG.warning('Failed to prefetch package of function %s(version '
+                        '%s) in pod %s: %s', function_id, version,
+                        pod.metadata.name, e)
+
+    def _get_pod_url(self, pod):
+        if not pod.status.pod_ip:
+            raise exc.OrchestratorException(
+                'Pod %s has no IP address.' % pod.metadata.name
+            )
+
+        return 'http://%s:%s' % (pod.status.pod_ip, WORKER_PORT)
 
     def _create_pod(self, image, rlimit, pod_name, labels, input):
         """Create pod for image type function."""
@@ -407,19 +485,26 @@ class KubernetesManager(base.OrchestratorBase):
                 'labels': pod_labels
             }
         }
-        self.v1.patch_namespaced_pod(
+        ret = self.v1.patch_namespaced_pod(
             name, self.conf.kubernetes.namespace, body
         )
 
+        # Don't choose the pod again before the watch event arrives.
+        if self.pod_cache:
+            self.pod_cache.update(ret)
+
         LOG.debug('Labels updated for pod %s', name)
 
         return pod_labels
 
     def prepare_execution(self, function_id, version, rlimit=None, image=None,
-                          identifier=None, labels=None, input=None):
+                          identifier=None, labels=None, input=None,
+                          md5sum=None):
         """Prepare service URL for function version.
 
         :param rlimit: optional argument passed to limit cpu/mem resources.
+        :param md5sum: optional function package md5, the package is
+            prefetched by the chosen pod if provided.
 
         For image function, create a single pod with rlimit and input, so the
         function will be executed in the resource limited pod.
@@ -453,7 +538,8 @@ class KubernetesManager(base.OrchestratorBase):
 
         try:
             pod_name, url = self._prepare_pod(
-                pods[0], identifier, function_id, version, labels
+                pods[0], identifier, function_id, version, labels,
+                md5sum=md5sum
             )
             return pod_name, url
         except Exception:
@@ -463,7 +549,8 @@ class KubernetesManager(base.OrchestratorBase):
 
     def run_execution(self, execution_id, function_id, version, rlimit=None,
                       input=None, identifier=None, service_url=None,
-                      entry='main.main', trust_id=None, timeout=None):
+                      entry='main.main', trust_id=None, timeout=None,
+                      md5sum=None):
         """Run execution.
 
         Return a tuple including the result and the output.
@@ -472,7 +559,7 @@ class KubernetesManager(base.OrchestratorBase):
             func_url = '%s/execute' % service_url
             data = utils.get_request_data(
                 self.conf, function_id, version, execution_id, rlimit, input,
-                entry, trust_id, self.qinling_endpoint, timeout
+                entry, trust_id, self.qinling_endpoint, timeout, md5sum=md5sum
             )
             LOG.debug(
                 'Invoke function %s(version %s), url: %s, data: %s',
@@ -569,7 +656,8 @@ class KubernetesManager(base.OrchestratorBase):
             label_selector=selector
         )
 
-    def scaleup_function(self, function_id, version, identifier=None, count=1):
+    def scaleup_function(self, function_id, version, identifier=None, count=1,
+                         md5sum=None):
         pod_names = []
         labels = {'runtime_id': identifier}
         pods = self._choose_available_pods(labels, count=count)
@@ -579,7 +667,7 @@ class KubernetesManager(base.OrchestratorBase):
 
         for pod in pods:
             pod_name, service_url = self._prepare_pod(
-                pod, identifier, function_id, version, labels
+                pod, identifier, function_id, version, labels, md5sum=md5sum
             )
             pod_names.append(pod_name)
 
@@ -588,6 +676,20 @@ class KubernetesManager(base.OrchestratorBase):
 
         return pod_names, service_url
 
+    def get_worker_url(self, pod_name, **kwargs):
+        if self.conf.kubernetes.service_address_type != 'pod_ip':
+            return None
+
+        pod = None
+        if self.pod_cache:
+            pod = self.pod_cache.get_pod(pod_name)
+        if not pod:
+            pod = self.v1.read_namespaced_pod(
+                pod_name, self.conf.kubernetes.namespace
+            )
+
+        return self._get_pod_url(pod)
+
     def delete_worker(self, pod_name, **kwargs):
         self.v1.delete_namespaced_pod(
             pod_name,
@@ -0,0 +1,90 @@
+# Copyright 2018 Catalyst IT Limited
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+import threading
+import time
+
+from oslo_log import log as logging
+
+from qinling import exceptions as exc
+
+LOG = logging.getLogger(__name__)
+
+
+def get_node_address(node):
+    """Get the external IP of the node, or the internal IP if not exists."""
+    addresses = node.status.addresses or []
+
+    for addr_type in ('ExternalIP', 'InternalIP'):
+        for addr in addresses:
+            if addr.type == addr_type:
+                return addr.address
+
+
+class NodeAddressCache(object):
+    """Cache of the node addresses, refreshed periodically.
+
+    The nodes are listed again if the cache is older than ttl seconds or the
+    requested node is not known yet, e.g. a new node joined the cluster.
+    """
+
+    def __init__(self, v1, ttl=300):
+        self.v1 = v1
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        # List of (node name, address), in the order returned by the API.
+        self._nodes = []
+        self._updated_at = None
+
+    def _refresh(self):
+        nodes = self.v1.list_node()
+
+        self._nodes = [(n.metadata.name, get_node_address(n))
+                       for n in nodes.items]
+        self._updated_at = time.time()
+
+        LOG.debug('Node address cache refreshed, %d nodes.', len(self._nodes))
+
+    def _expired(self):
+        return (self._updated_at is None or
+                time.time() - self._updated_at >= self.ttl)
+
+    def get_address(self, node_name=None):
+        """Get the address of the node.
+
+        :param node_name: Optional. The address of an arbitrary node is
+            returned if not specified or the node does not exist.
+        """
+        with self._lock:
+            if self._expired():
+                self._refresh()
+            elif node_name and node_name not in dict(self._nodes):
+                self._refresh()
+
+            addresses = dict(self._nodes)
+            if node_name and addresses.get(node_name):
+                return addresses[node_name]
+
+            if node_name:
+                LOG.warning('Address of node %s not found, using an '
+                            'arbitrary node.', node_name)
+
+            for _, address in self._nodes:
+                if address:
+                    return address
+
+        raise exc.OrchestratorException('No node address available.')
+
+    def invalidate(self):
+        with self._lock:
+            self._updated_at = None
@@ -0,0 +1,151 @@
+# Copyright 2018 Catalyst IT Limited
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+import threading
+import time
+
+from kubernetes import watch
+from oslo_log import log as logging
+
+LOG = logging.getLogger(__name__)
+
+
+def _newer_or_equal(pod, other):
+    """Check if the pod object is not older than the other one."""
+    try:
+        return (int(pod.metadata.resource_version) >=
+                int(other.metadata.resource_version))
+    except (TypeError, ValueError):
+        # Resource version is supposed to be opaque.
+        return True
+
+
+class PodCache(object):
+    """Local cache of the pods in the namespace, kept by list and watch.
+
+    All the pods in the namespace are listed once, then the changes are
+    received from the watch API, the pods are relisted when the watch can not
+    be resumed.
+    """
+
+    def __init__(self, v1, namespace, watch_timeout=300):
+        self.v1 = v1
+        self.namespace = namespace
+        self.watch_timeout = watch_timeout
+        self._lock = threading.Lock()
+        self._pods = {}
+        self._resource_version = None
+        self._watch = None
+        self._thread = None
+        self._stopped = False
+
+    def start(self):
+        self._list()
+
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+        LOG.info('Pod cache started for namespace %s, %d pods.',
+                 self.namespace, len(self._pods))
+
+    def stop(self):
+        self._stopped = True
+        if self._watch:
+            self._watch.stop()
+
+    def update(self, pod):
+        """Update the pod in the cache, e.g. with the pod returned by patch."""
+        with self._lock:
+            cur = self._pods.get(pod.metadata.name)
+            if cur is None or _newer_or_equal(pod, cur):
+                self._pods[pod.metadata.name] = pod
+
+    def delete(self, name):
+        with self._lock:
+            self._pods.pop(name, None)
+
+    def get_pod(self, name):
+        with self._lock:
+            return self._pods.get(name)
+
+    def get_pods(self, labels, bound=None):
+        """Get the pods matching all the labels.
+
+        :param bound: Optional. If False, only return the pods that are not
+            bound to any function, i.e. without function_id label.
+        """
+        with self._lock:
+            pods = list(self._pods.values())
+
+        ret = []
+        for pod in pods:
+            pod_labels = pod.metadata.labels or {}
+
+            if bound is False and 'function_id' in pod_labels:
+                continue
+            if pod.metadata.deletion_timestamp:
+                continue
+            if all(pod_labels.get(k) == v for k, v in labels.items()):
+                ret.append(pod)
+
+        return sorted(ret, key=lambda p: p.metadata.name)
+
+    def _list(self):
+        ret = self.v1.list_namespaced_pod(self.namespace)
+
+        with self._lock:
+            self._pods = dict((p.metadata.name, p) for p in ret.items)
+            self._resource_version = ret.metadata.resource_version
+
+    def _run(self):
+        while not self._stopped:
+            try:
+                self._watch_pods()
+            except Exception as e:
+                if self._stopped:
+                    break
+
+                # e.g. 410 Gone if the resource version is too old.
+                LOG.warning('Failed to watch pods in namespace %s, relisting. '
+                            'Error: %s', self.namespace, e)
+                time.sleep(1)
+                self._resource_version = None
+
+            if self._resource_version is None and not self._stopped:
+                try:
+                    self._list()
+                except Exception:
+                    LOG.exception('Failed to list pods in namespace %s.',
+                                  self.namespace)
+
+    def _watch_pods(self):
+        self._watch = watch.Watch()
+
+        for event in self._watch.stream(
+                self.v1.list_namespaced_pod,
+                self.namespace,
+                resource_version=self._resource_version,
+                timeout_seconds=self.watch_timeout):
+            event_type = event['type']
+            pod = event['object']
+
+            if event_type == 'ERROR':
+                raise Exception(event.get('raw_object'))
+
+            if event_type == 'DELETED':
+                self.delete(pod.metadata.name)
+            else:
+                self.update(pod)
+
+            self._resource_version = pod.metadata.resource_version
@@ -183,9 +183,24 @@ class EngineClient(object):
                 function_id=function_id,
                 function_version=version,
                 runtime_id=runtime_id,
-                input=input
+                input=input,
+                is_sync=False
             )
 
+    @wrap_messaging_exception
+    def create_executions(self, execution_ids, function_id, version,
+                          runtime_id, inputs=None):
+        """Send a batch of asynchronous executions in one message."""
+        self._client.prepare(topic=self.topic, server=None).cast(
+            ctx.get_ctx(),
+            'create_executions',
+            execution_ids=execution_ids,
+            function_id=function_id,
+            function_version=version,
+            runtime_id=runtime_id,
+            inputs=inputs
+        )
+
     @wrap_messaging_exception
     def delete_function(self, id, version=0):
         return self._client.prepare(topic=self.topic, server=None).cast(
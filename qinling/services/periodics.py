@@ -23,7 +23,10 @@ from oslo_utils import timeutils
 
 from qinling import context
 from qinling.db import api as db_api
+from qinling.db import cache as db_cache
 from qinling.db.sqlalchemy import models
+from qinling.engine import retention
+from qinling.engine import utils as engine_utils
 from qinling import rpc
 from qinling import status
 from qinling.utils import constants
@@ -55,7 +58,7 @@ def handle_function_service_expiration(ctx, engine):
     )
 
     for func_db in results:
-        if not etcd_util.get_service_url(func_db.id, 0):
+        if not etcd_util.get_service_url(func_db.id, 0, cached=True):
             continue
 
         LOG.info(
@@ -76,7 +79,8 @@ def handle_function_service_expiration(ctx, engine):
     )
 
     for v in versions:
-        if not etcd_util.get_service_url(v.function_id, v.version_number):
+        if not etcd_util.get_service_url(v.function_id, v.version_number,
+                                         cached=True):
             continue
 
         LOG.info(
@@ -176,6 +180,45 @@ def handle_job(engine_client):
             context.set_ctx(None)
 
 
+def handle_function_autoscaling(engine):
+    """Scale the function workers according to the recorded load."""
+    engine.autoscaler.tick()
+
+
+def handle_execution_purge(purger):
+    """Delete the expired executions.
+
+    Only one engine purges the executions at a time, the others skip the
+    run, so that the same executions are not exported several times.
+    """
+    try:
+        lock_ttl = CONF.execution_retention.interval
+        with etcd_util.get_execution_purge_lock(lock_ttl) as lock:
+            if not lock.is_acquired():
+                LOG.info('The expired executions are being purged by '
+                         'another engine.')
+                return
+
+            purger.purge()
+    except Exception:
+        LOG.exception('Failed to purge the expired executions.')
+
+    LOG.info('Execution purge statistics: %s', purger.stats())
+
+
+@periodics.periodic(300)
+def report_engine_stats():
+    """Log the statistics of the caches used by the engine."""
+    LOG.info('Function service health cache statistics: %s',
+             engine_utils.SERVICE_HEALTH.stats())
+
+
+@periodics.periodic(300)
+def report_metadata_cache_stats():
+    if CONF.metadata_cache.enabled:
+        LOG.info('Metadata cache statistics: %s', db_cache.get_stats())
+
+
 def start_function_mapping_handler(engine):
     """Start function mapping handler thread.
 
@@ -187,6 +230,15 @@ def start_function_mapping_handler(engine):
         ctx=context.Context(),
         engine=engine
     )
+    worker.add(report_engine_stats)
+    worker.add(report_metadata_cache_stats)
+    if engine.autoscaler:
+        worker.add(
+            periodics.periodic(CONF.engine.autoscale_interval)(
+                handle_function_autoscaling
+            ),
+            engine=engine
+        )
     _periodic_tasks[constants.PERIODIC_FUNC_MAPPING_HANDLER] = worker
 
     thread = threading.Thread(target=worker.start)
@@ -196,6 +248,33 @@ def start_function_mapping_handler(engine):
     LOG.info('Function mapping handler started.')
 
 
+def start_execution_purger():
+    """Start the thread deleting the expired executions.
+
+    The purge may take long, it's not run by the function mapping handler
+    to not delay the other periodic tasks.
+    """
+    conf = CONF.execution_retention
+    purger = retention.ExecutionPurger(
+        conf.days,
+        project_days=conf.project_days,
+        batch_size=conf.batch_size,
+        archive_dir=conf.archive_dir
+    )
+    worker = periodics.PeriodicWorker([])
+    worker.add(
+        periodics.periodic(conf.interval)(handle_execution_purge),
+        purger=purger
+    )
+    _periodic_tasks[constants.PERIODIC_EXECUTION_PURGER] = worker
+
+    thread = threading.Thread(target=worker.start)
+    thread.setDaemon(True)
+    thread.start()
+
+    LOG.info('Execution purger started.')
+
+
 def start_job_handler():
     """Start job handler thread.
 
@@ -207,6 +286,7 @@ def start_job_handler():
         handle_job,
         engine_client=engine_client
     )
+    worker.add(report_metadata_cache_stats)
     _periodic_tasks[constants.PERIODIC_JOB_HANDLER] = worker
 
     thread = threading.Thread(target=worker.start)
@@ -218,7 +298,7 @@ def start_job_handler():
 
 def stop(task=None):
     if not task:
-        for name, worker in _periodic_tasks.items():
+        for name, worker in list(_periodic_tasks.items()):
             LOG.info('Stopping periodic task: %s', name)
             worker.stop()
             del _periodic_tasks[name]
@@ -32,7 +32,7 @@ class PackageStorage(object):
 
         :param project_id: Project ID.
         :param function: Function ID.
-        :param data: Package file content.
+        :param data: Package file content, or a file object to read it from.
         :param kwargs: A dict may including
             - md5sum: The MD5 provided by the user.
         :return: A tuple (if the package is updated, MD5 value of the package)
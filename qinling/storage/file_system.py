@@ -12,8 +12,11 @@
 #    See the License for the specific language governing permissions and
 #    limitations under the License.
 
+import hashlib
+import io
 import os
 import shutil
+import tempfile
 import zipfile
 
 from oslo_log import log as logging
@@ -21,7 +24,6 @@ from oslo_utils import fileutils
 
 from qinling import exceptions as exc
 from qinling.storage import base
-from qinling.utils import common
 
 LOG = logging.getLogger(__name__)
 PACKAGE_NAME_TEMPLATE = "%s_%s.zip"
@@ -29,6 +31,8 @@ PACKAGE_NAME_TEMPLATE = "%s_%s.zip"
 PACKAGE_PATH_TEMPLATE = "%s/%s_%s.zip"
 # Package path name including version
 PACKAGE_VERSION_TEMPLATE = "%s_%s_%s.zip"
+# Size of the chunks in which the packages are read when stored.
+CHUNK_SIZE = 64 * 1024
 
 
 class FileSystemStorage(base.PackageStorage):
@@ -40,9 +44,13 @@ class FileSystemStorage(base.PackageStorage):
     def store(self, project_id, function, data, md5sum=None):
         """Store the function package data to local file system.
 
+        The package is written to a temporary file in chunks while its MD5 is
+        computed, then renamed to the package path once validated, so the
+        memory used doesn't depend on the package size.
+
         :param project_id: Project ID.
         :param function: Function ID.
-        :param data: Package file content.
+        :param data: Package file content, or a file object to read it from.
         :param md5sum: The MD5 provided by the user.
         :return: A tuple (if the package is updated, MD5 value of the package)
         """
@@ -53,28 +61,42 @@ class FileSystemStorage(base.PackageStorage):
         project_path = os.path.join(self.base_path, project_id)
         fileutils.ensure_tree(project_path)
 
-        # Check md5
-        md5_actual = common.md5(content=data)
-        if md5sum and md5_actual != md5sum:
-            raise exc.InputException("Package md5 mismatch.")
+        if not hasattr(data, 'read'):
+            data = io.BytesIO(data)
 
-        func_zip = os.path.join(
-            project_path,
-            PACKAGE_NAME_TEMPLATE % (function, md5_actual)
+        fd, new_func_zip = tempfile.mkstemp(
+            prefix='%s.' % function, suffix='.zip.new', dir=project_path
         )
-        if os.path.exists(func_zip):
-            return False, md5_actual
+        try:
+            hash_md5 = hashlib.md5()
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in iter(lambda: data.read(CHUNK_SIZE), b''):
+                    hash_md5.update(chunk)
+                    f.write(chunk)
+            md5_actual = hash_md5.hexdigest()
 
-        # Save package
-        new_func_zip = os.path.join(project_path, '%s.zip.new' % function)
-        with open(new_func_zip, 'wb') as fd:
-            fd.write(data)
+            # Check md5
+            if md5sum and md5_actual != md5sum:
+                raise exc.InputException("Package md5 mismatch.")
 
-        if not zipfile.is_zipfile(new_func_zip):
-            fileutils.delete_if_exists(new_func_zip)
-            raise exc.InputException("Package is not a valid ZIP package.")
+            func_zip = os.path.join(
+                project_path,
+                PACKAGE_NAME_TEMPLATE % (function, md5_actual)
+            )
+            if os.path.exists(func_zip):
+                return False, md5_actual
+
+            # Only the central directory at the end of the file is read.
+            try:
+                zipfile.ZipFile(new_func_zip).close()
+            except (zipfile.BadZipfile, IOError):
+                raise exc.InputException(
+                    "Package is not a valid ZIP package."
+                )
 
-        os.rename(new_func_zip, func_zip)
+            os.rename(new_func_zip, func_zip)
+        finally:
+            fileutils.delete_if_exists(new_func_zip)
 
         return True, md5_actual
 
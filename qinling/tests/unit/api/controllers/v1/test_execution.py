@@ -40,6 +40,22 @@ class TestExecutionController(base.APITest):
 
         self.assertEqual(1, resp.json.get('count'))
 
+    @mock.patch('qinling.rpc.EngineClient.create_execution')
+    def test_post_metadata_cache_enabled(self, mock_create_execution):
+        self.override_config('enabled', True, 'metadata_cache')
+        body = {
+            'function_id': self.func_id,
+        }
+
+        for _ in range(3):
+            resp = self.app.post_json('/v1/executions', body)
+            self.assertEqual(201, resp.status_int)
+
+        # The count of the cached function is stale, but the function count
+        # is still increased correctly.
+        resp = self.app.get('/v1/functions/%s' % self.func_id)
+        self.assertEqual(3, resp.json.get('count'))
+
     @mock.patch('qinling.rpc.EngineClient.create_execution')
     def test_post_with_version(self, mock_rpc):
         db_api.increase_function_version(self.func_id, 0,
@@ -102,6 +118,83 @@ class TestExecutionController(base.APITest):
         self.assertEqual(201, resp.status_int)
         self.assertEqual(status.ERROR, resp.json.get('status'))
 
+    @mock.patch('qinling.rpc.EngineClient.create_executions')
+    def test_post_batch(self, mock_create_executions):
+        body = {
+            'function_id': self.func_id,
+            'inputs': ['{"name": "a"}', 'b', None]
+        }
+        resp = self.app.post_json('/v1/executions/batch', body)
+
+        self.assertEqual(201, resp.status_int)
+        batch_id = resp.json.get('id')
+        execution_ids = resp.json.get('executions')
+        self.assertEqual(3, len(execution_ids))
+
+        inputs = [{'name': 'a'}, {'__function_input': 'b'}, None]
+        mock_create_executions.assert_called_once_with(
+            execution_ids, self.func_id, 0, mock.ANY, inputs=inputs
+        )
+        for execution_id, input in zip(execution_ids, body['inputs']):
+            execution = self.app.get('/v1/executions/%s' % execution_id).json
+            self.assertEqual(status.RUNNING, execution['status'])
+            self.assertFalse(execution['sync'])
+            self.assertEqual(input, execution.get('input'))
+            self.assertIn(batch_id, execution['description'])
+
+        resp = self.app.get('/v1/functions/%s' % self.func_id)
+        self.assertEqual(3, resp.json.get('count'))
+
+    @mock.patch('qinling.rpc.EngineClient.create_executions')
+    def test_post_batch_with_alias(self, mock_create_executions):
+        db_api.increase_function_version(self.func_id, 0,
+                                         description="version 1")
+        name = self.rand_name(name="alias", prefix=self.prefix)
+        db_api.create_function_alias(name=name, function_id=self.func_id,
+                                     function_version=1)
+        body = {
+            'function_alias': name,
+            'inputs': ['a', 'b'],
+            'description': 'batch description'
+        }
+        resp = self.app.post_json('/v1/executions/batch', body)
+
+        self.assertEqual(201, resp.status_int)
+        self.assertEqual(self.func_id, resp.json.get('function_id'))
+        self.assertEqual(1, resp.json.get('function_version'))
+        for execution_id in resp.json.get('executions'):
+            execution = self.app.get('/v1/executions/%s' % execution_id).json
+            self.assertEqual('batch description', execution['description'])
+
+    def test_post_batch_invalid_inputs(self):
+        self.override_config('max_batch_executions', 2, 'api')
+
+        for inputs in ([], ['a', 'b', 'c']):
+            resp = self.app.post_json(
+                '/v1/executions/batch',
+                {'function_id': self.func_id, 'inputs': inputs},
+                expect_errors=True
+            )
+            self.assertEqual(400, resp.status_int)
+
+        resp = self.app.post_json('/v1/executions/batch', {'inputs': ['a']},
+                                  expect_errors=True)
+        self.assertEqual(400, resp.status_int)
+
+    @mock.patch('qinling.rpc.EngineClient.create_executions')
+    def test_post_batch_rpc_error(self, mock_create_executions):
+        mock_create_executions.side_effect = exc.QinlingException
+        body = {
+            'function_id': self.func_id,
+            'inputs': ['a', 'b']
+        }
+        resp = self.app.post_json('/v1/executions/batch', body)
+
+        self.assertEqual(201, resp.status_int)
+        for execution_id in resp.json.get('executions'):
+            execution = self.app.get('/v1/executions/%s' % execution_id).json
+            self.assertEqual(status.ERROR, execution['status'])
+
     @mock.patch('qinling.rpc.EngineClient.create_execution')
     def test_get(self, mock_create_execution):
         body = {
@@ -157,6 +250,125 @@ class TestExecutionController(base.APITest):
         self.assertEqual(200, resp.status_int)
         self._assert_single_item(resp.json['executions'], id=exec_id)
 
+    def test_get_all_pagination(self):
+        exec_ids = [self.create_execution(self.func_id).id for _ in range(3)]
+
+        resp = self.app.get(
+            '/v1/executions?function_id=%s&limit=2' % self.func_id
+        )
+
+        self.assertEqual(200, resp.status_int)
+        self.assertEqual(
+            exec_ids[:2], [e['id'] for e in resp.json['executions']]
+        )
+        self.assertEqual(
+            'http://localhost/v1/executions?function_id=%s&limit=2&'
+            'marker=%s' % (self.func_id, exec_ids[1]),
+            resp.json['next']
+        )
+
+        resp = self.app.get(resp.json['next'])
+
+        self.assertEqual(
+            exec_ids[2:], [e['id'] for e in resp.json['executions']]
+        )
+        self.assertNotIn('next', resp.json)
+
+    def test_get_all_pagination_encoded_params(self):
+        description = u'Created by Job a&b=c \u4e2d'
+        exec_ids = [
+            self.create_execution(self.func_id, description=description).id
+            for _ in range(2)
+        ]
+
+        resp = self.app.get(
+            '/v1/executions',
+            params={'description': description.encode('utf-8'), 'limit': 1}
+        )
+
+        self.assertEqual(
+            'http://localhost/v1/executions?description=Created+by+Job+'
+            'a%%26b%%3Dc+%%E4%%B8%%AD&limit=1&marker=%s' % exec_ids[0],
+            resp.json['next']
+        )
+
+        resp = self.app.get(resp.json['next'])
+
+        self.assertEqual(
+            exec_ids[1:], [e['id'] for e in resp.json['executions']]
+        )
+
+    @mock.patch('qinling.db.api.get_executions')
+    def test_get_all_db_error(self, mock_get):
+        mock_get.side_effect = exc.DBError('Failed when querying database.')
+
+        resp = self.app.get('/v1/executions', expect_errors=True)
+
+        self.assertEqual(400, resp.status_int)
+
+    @mock.patch('qinling.utils.rest_utils.STREAM_BATCH_SIZE', 2)
+    def test_get_all_batches(self):
+        exec_ids = [self.create_execution(self.func_id).id for _ in range(5)]
+
+        with mock.patch.object(db_api, 'get_executions',
+                               wraps=db_api.get_executions) as mock_get:
+            resp = self.app.get('/v1/executions')
+
+        self.assertEqual(
+            exec_ids, [e['id'] for e in resp.json['executions']]
+        )
+        self.assertEqual(3, mock_get.call_count)
+
+    def test_get_all_fields(self):
+        exec_id = self.create_execution(
+            self.func_id, input={'name': 'qinling'}, description='test'
+        ).id
+
+        resp = self.app.get('/v1/executions?fields=status,input')
+
+        self.assertEqual(200, resp.status_int)
+        self.assertEqual(
+            [{'id': exec_id, 'status': status.RUNNING,
+              'input': '{"name": "qinling"}', 'function_version': 0}],
+            resp.json['executions']
+        )
+
+    def test_get_all_invalid_fields(self):
+        resp = self.app.get('/v1/executions?fields=status,logs',
+                            expect_errors=True)
+
+        self.assertEqual(400, resp.status_int)
+        self.assertEqual('Invalid field(s): logs',
+                         resp.json['faultstring'])
+
+    def test_get_all_invalid_limit(self):
+        resp = self.app.get('/v1/executions?limit=0', expect_errors=True)
+
+        self.assertEqual(400, resp.status_int)
+
+    def test_get_logs(self):
+        exec_id = self.create_execution(self.func_id).id
+        db_api.create_execution_logs(exec_id, 'Start execution\nFinished')
+
+        resp = self.app.get('/v1/executions/%s/log' % exec_id)
+
+        self.assertEqual(200, resp.status_int)
+        self.assertEqual('Start execution\nFinished', resp.text)
+
+        resp = self.app.get(
+            '/v1/executions/%s/log?offset=6&length=9' % exec_id
+        )
+
+        self.assertEqual('execution', resp.text)
+
+    def test_get_logs_invalid_offset(self):
+        exec_id = self.create_execution(self.func_id).id
+
+        resp = self.app.get('/v1/executions/%s/log?offset=-1' % exec_id,
+                            expect_errors=True)
+
+        self.assertEqual(400, resp.status_int)
+
     @mock.patch('qinling.rpc.EngineClient.create_execution')
     def test_delete(self, mock_create_execution):
         body = {
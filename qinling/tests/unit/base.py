@@ -140,6 +140,9 @@ class DbTestCase(BaseTest):
             (config.KUBERNETES_GROUP, config.kubernetes_opts),
             (config.ETCD_GROUP, config.etcd_opts),
             (config.RLIMITS_GROUP, config.rlimits_opts),
+            (config.METADATA_CACHE_GROUP, config.metadata_cache_opts),
+            (config.EXECUTION_RETENTION_GROUP,
+             config.execution_retention_opts),
             (None, [config.launch_opt]),
             (None, config.default_opts)
         ]
@@ -0,0 +1,202 @@
+# Copyright 2018 Catalyst IT Limited
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+from qinling.db import api as db_api
+from qinling.db import base as db_base
+from qinling.db.sqlalchemy import models
+from qinling import exceptions as exc
+from qinling import status
+from qinling.tests.unit import base
+from qinling.utils import common
+
+
+class TestCountExecutions(base.DbTestCase):
+    def setUp(self):
+        super(TestCountExecutions, self).setUp()
+
+        self.function_id = self.create_function().id
+        for _ in range(3):
+            self.create_execution(self.function_id, function_version=0)
+        self.create_execution(self.function_id, function_version=1)
+        self.create_execution(self.function_id, function_version=0,
+                              status=status.SUCCESS)
+
+    def test_count_executions(self):
+        self.assertEqual(
+            3,
+            db_api.count_executions(function_id=self.function_id,
+                                    function_version=0,
+                                    status=status.RUNNING)
+        )
+        self.assertEqual(
+            5, db_api.count_executions(function_id=self.function_id)
+        )
+
+    def test_count_executions_no_match(self):
+        self.assertEqual(
+            0,
+            db_api.count_executions(function_id=self.function_id,
+                                    status=status.ERROR)
+        )
+
+    def test_count_executions_other_project(self):
+        self.create_execution(self.function_id, function_version=0,
+                              project_id='another_project')
+
+        self.assertEqual(
+            4,
+            db_api.count_executions(function_id=self.function_id,
+                                    function_version=0,
+                                    status=status.RUNNING,
+                                    insecure=True)
+        )
+        self.assertEqual(
+            3,
+            db_api.count_executions(function_id=self.function_id,
+                                    function_version=0,
+                                    status=status.RUNNING)
+        )
+
+    def test_count_executions_by_function(self):
+        function_id = self.create_function().id
+        self.create_execution(function_id)
+
+        counts = db_api.count_executions_by_function(status=status.RUNNING)
+
+        self.assertEqual(
+            {(self.function_id, 0): 3, (self.function_id, 1): 1,
+             (function_id, 0): 1},
+            counts
+        )
+
+
+class TestCreateExecutions(base.DbTestCase):
+    def test_create_executions(self):
+        function_id = self.create_function().id
+        values = [
+            {'id': common.generate_unicode_uuid(), 'function_id': function_id,
+             'input': {'index': i}, 'sync': False, 'status': status.RUNNING}
+            for i in range(3)
+        ]
+
+        db_api.create_executions(values)
+
+        for v in values:
+            execution = db_api.get_execution(v['id'])
+            self.assertEqual(v['input'], execution.input)
+            self.assertEqual(0, execution.function_version)
+            self.assertEqual(self.ctx.projectid, execution.project_id)
+            self.assertIsNotNone(execution.created_at)
+
+    def test_create_executions_duplicate(self):
+        execution_id = self.create_execution().id
+
+        self.assertRaises(
+            exc.DBError,
+            db_api.create_executions,
+            [{'id': execution_id, 'function_id': execution_id,
+              'status': status.RUNNING}]
+        )
+
+
+class TestUpdateExecutionsStatus(base.DbTestCase):
+    def test_update_executions_status(self):
+        self.override_config('execution_log_chunk_size', 1024, 'engine')
+        execution_ids = [self.create_execution().id for _ in range(3)]
+        logs = 'x' * 2000
+
+        db_api.update_executions_status(
+            {
+                execution_ids[0]: {'status': status.SUCCESS,
+                                   'result': {'output': 'ok'}},
+                execution_ids[1]: {'status': status.FAILED,
+                                   'result': {'output': 'failed'}}
+            },
+            logs={execution_ids[0]: logs}
+        )
+
+        execution = db_api.get_execution(execution_ids[0])
+        self.assertEqual(status.SUCCESS, execution.status)
+        self.assertEqual({'output': 'ok'}, execution.result)
+        self.assertEqual(logs.encode('utf-8'),
+                         db_api.get_execution_logs(execution_ids[0]))
+        execution = db_api.get_execution(execution_ids[1])
+        self.assertEqual(status.FAILED, execution.status)
+        self.assertEqual(b'', db_api.get_execution_logs(execution_ids[1]))
+        self.assertEqual(status.RUNNING,
+                         db_api.get_execution(execution_ids[2]).status)
+
+
+class TestExecutionLogs(base.DbTestCase):
+    def setUp(self):
+        super(TestExecutionLogs, self).setUp()
+
+        self.override_config('execution_log_chunk_size', 1024, 'engine')
+        self.execution_id = self.create_execution().id
+        self.logs = ''.join('line %04d\n' % i for i in range(300))
+
+    def _get_chunks(self):
+        with db_api.transaction():
+            return db_base.model_query(models.ExecutionLog).all()
+
+    def test_get_execution_logs(self):
+        db_api.create_execution_logs(self.execution_id, self.logs)
+
+        self.assertEqual(
+            self.logs.encode('utf-8'),
+            db_api.get_execution_logs(self.execution_id)
+        )
+
+    def test_get_execution_logs_range(self):
+        db_api.create_execution_logs(self.execution_id, self.logs)
+        logs = self.logs.encode('utf-8')
+
+        for offset, length in ((0, 10), (1020, 10), (1500, 1024),
+                               (2990, 100), (3000, 10)):
+            self.assertEqual(
+                logs[offset:offset + length],
+                db_api.get_execution_logs(self.execution_id, offset=offset,
+                                          length=length)
+            )
+        self.assertEqual(
+            logs[2000:],
+            db_api.get_execution_logs(self.execution_id, offset=2000)
+        )
+
+    def test_get_execution_logs_compressed(self):
+        db_api.create_execution_logs(self.execution_id, self.logs)
+
+        chunks = self._get_chunks()
+
+        self.assertEqual([0, 1024, 2048], sorted(c.position for c in chunks))
+        self.assertLess(sum(len(c.data) for c in chunks), len(self.logs))
+
+    def test_get_execution_logs_legacy(self):
+        db_api.update_execution(self.execution_id, {'logs': u'legacy log'})
+
+        self.assertEqual(b'legacy log',
+                         db_api.get_execution_logs(self.execution_id))
+        self.assertEqual(
+            b'log',
+            db_api.get_execution_logs(self.execution_id, offset=7, length=5)
+        )
+
+    def test_delete_execution(self):
+        db_api.create_execution_logs(self.execution_id, self.logs)
+        execution_id = self.create_execution().id
+        db_api.create_execution_logs(execution_id, 'another log')
+
+        db_api.delete_execution(self.execution_id)
+        db_api.delete_executions(id=execution_id)
+
+        self.assertEqual([], self._get_chunks())
@@ -0,0 +1,139 @@
+# Copyright 2018 Catalyst IT Limited
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+import mock
+
+from qinling import context
+from qinling.db import api as db_api
+from qinling.db import cache as db_cache
+from qinling import exceptions as exc
+from qinling.tests.unit import base
+
+
+class TestMetadataCache(base.DbTestCase):
+    def setUp(self):
+        super(TestMetadataCache, self).setUp()
+
+        self.override_config('enabled', True, 'metadata_cache')
+        for cache in (db_cache.functions, db_cache.function_versions,
+                      db_cache.function_aliases, db_cache.runtimes):
+            patcher = mock.patch.object(cache, 'hits', 0)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+            patcher = mock.patch.object(cache, 'misses', 0)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        db_cache.invalidate_all()
+        self.addCleanup(db_cache.invalidate_all)
+
+        self.function_id = self.create_function().id
+
+    def test_get_function(self):
+        for _ in range(3):
+            func = db_api.get_function(self.function_id, cached=True)
+            self.assertEqual(self.function_id, func.id)
+
+        self.assertEqual(
+            {'hits': 2, 'misses': 1, 'hit_rate': 0.6667, 'size': 1},
+            db_cache.functions.stats()
+        )
+
+    def test_get_function_cache_disabled(self):
+        self.override_config('enabled', False, 'metadata_cache')
+
+        for _ in range(3):
+            db_api.get_function(self.function_id, cached=True)
+
+        self.assertEqual(
+            {'hits': 0, 'misses': 0, 'hit_rate': 0, 'size': 0},
+            db_cache.functions.stats()
+        )
+
+    def test_get_function_returns_copy(self):
+        db_api.get_function(self.function_id, cached=True)
+
+        func = db_api.get_function(self.function_id, cached=True)
+        func.code['source'] = 'image'
+
+        func = db_api.get_function(self.function_id, cached=True)
+        self.assertEqual('package', func.code['source'])
+
+    def test_update_function_invalidates_cache(self):
+        db_api.get_function(self.function_id, cached=True)
+
+        db_api.update_function(self.function_id, {'entry': 'new.main'})
+
+        func = db_api.get_function(self.function_id, cached=True)
+        self.assertEqual('new.main', func.entry)
+        self.assertEqual(0, db_cache.functions.hits)
+
+    def test_get_function_other_project(self):
+        db_api.get_function(self.function_id, cached=True)
+
+        context.set_ctx(base.get_context(default=False))
+
+        self.assertRaises(
+            exc.DBEntityNotFoundError,
+            db_api.get_function, self.function_id, cached=True
+        )
+        self.assertEqual(0, db_cache.functions.hits)
+
+    def test_get_function_lru_eviction(self):
+        self.override_config('size', 2, 'metadata_cache')
+        function_ids = [self.function_id, self.create_function().id,
+                        self.create_function().id]
+
+        for function_id in function_ids:
+            db_api.get_function(function_id, cached=True)
+        db_api.get_function(function_ids[0], cached=True)
+
+        self.assertEqual(0, db_cache.functions.hits)
+        self.assertEqual(2, db_cache.functions.stats()['size'])
+
+    @mock.patch('time.time')
+    def test_get_function_expired(self, mock_time):
+        mock_time.return_value = 100
+        db_api.get_function(self.function_id, cached=True)
+
+        mock_time.return_value = 100 + 10
+        db_api.get_function(self.function_id, cached=True)
+
+        self.assertEqual(0, db_cache.functions.hits)
+        self.assertEqual(2, db_cache.functions.misses)
+
+    def test_get_runtime_update_invalidates_cache(self):
+        runtime_id = db_api.get_function(self.function_id).runtime_id
+        db_api.get_runtime(runtime_id, cached=True)
+        db_api.get_runtime(runtime_id, cached=True)
+
+        db_api.update_runtime(runtime_id, {'status': 'error'})
+
+        runtime = db_api.get_runtime(runtime_id, cached=True)
+        self.assertEqual('error', runtime.status)
+        self.assertEqual(1, db_cache.runtimes.hits)
+
+    def test_get_function_alias(self):
+        db_api.increase_function_version(self.function_id, 0)
+        db_api.create_function_alias(
+            name='alias', function_id=self.function_id, function_version=1
+        )
+
+        for _ in range(2):
+            alias = db_api.get_function_alias('alias', cached=True)
+            self.assertEqual(1, alias.function_version)
+
+        db_api.update_function_alias('alias', function_version=0)
+
+        alias = db_api.get_function_alias('alias', cached=True)
+        self.assertEqual(0, alias.function_version)
+        self.assertEqual(1, db_cache.function_aliases.hits)
@@ -0,0 +1,215 @@
+# Copyright 2018 Catalyst IT Limited
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+import mock
+
+from qinling.engine import autoscaler
+from qinling.tests.unit import base
+
+FUNCTION_ID = 'function'
+RUNTIME_ID = 'runtime'
+
+
+class TestAutoscaler(base.BaseTest):
+    def setUp(self):
+        super(TestAutoscaler, self).setUp()
+
+        self.engine = mock.Mock()
+        self.autoscaler = autoscaler.Autoscaler(
+            self.engine, concurrency=2, max_step=3, idle_time=60,
+            expiration=600
+        )
+
+        self.lock = mock.Mock()
+        self.lock.is_acquired.return_value = True
+        lock_patcher = mock.patch('qinling.utils.etcd_util.get_worker_lock')
+        lock_patcher.start().return_value.__enter__.return_value = self.lock
+        self.addCleanup(lock_patcher.stop)
+
+        workers_patcher = mock.patch('qinling.utils.etcd_util.get_workers')
+        self.mock_getworkers = workers_patcher.start()
+        self.mock_getworkers.return_value = ['worker1']
+        self.addCleanup(workers_patcher.stop)
+
+        running_patcher = mock.patch(
+            'qinling.db.api.count_executions_by_function')
+        self.mock_running = running_patcher.start()
+        self.mock_running.return_value = {}
+        self.addCleanup(running_patcher.stop)
+
+    def _execute(self, count, now, duration=1.0, finish=True):
+        for _ in range(count):
+            self.autoscaler.record_arrival(FUNCTION_ID, 0, RUNTIME_ID,
+                                           now=now)
+            if finish:
+                self.autoscaler.record_finish(FUNCTION_ID, 0, duration)
+
+    def test_record(self):
+        self._execute(2, 100, duration=2.0)
+        self._execute(1, 100, finish=False)
+
+        load = self.autoscaler._loads[(FUNCTION_ID, 0)]
+        self.assertEqual(3, load.arrivals)
+        self.assertEqual(1, load.inflight)
+        self.assertEqual(2, load.finishes)
+
+        self.autoscaler.tick(now=110)
+
+        self.assertEqual(0, load.arrivals)
+        self.assertAlmostEqual(0.15, load.rate)
+        self.assertAlmostEqual(2.0, load.duration)
+
+    def test_tick_scaleup(self):
+        # 40 executions of 1 second within 10 seconds, the concurrency is 4
+        # and 2 workers are needed.
+        self._execute(1, 100)
+        self._execute(39, 105)
+        self.autoscaler._loads[(FUNCTION_ID, 0)].rate = 4.0
+
+        self.autoscaler.tick(now=110)
+
+        self.engine.scaleup_function.assert_called_once_with(
+            None, FUNCTION_ID, 0, RUNTIME_ID, 1
+        )
+
+    def test_tick_scaleup_rising_rate(self):
+        # The arrival rate rises from 0 to 2 per second, 4 per second is
+        # expected by the next tick.
+        self._execute(1, 100)
+        self._execute(19, 105)
+
+        self.autoscaler.tick(now=110)
+
+        self.engine.scaleup_function.assert_called_once_with(
+            None, FUNCTION_ID, 0, RUNTIME_ID, 1
+        )
+
+    def test_tick_scaleup_max_step(self):
+        self._execute(1, 100)
+        self._execute(200, 105)
+
+        self.autoscaler.tick(now=110)
+
+        self.engine.scaleup_function.assert_called_once_with(
+            None, FUNCTION_ID, 0, RUNTIME_ID, 3
+        )
+
+    def test_tick_scaleup_inflight(self):
+        self._execute(5, 100, finish=False)
+
+        self.autoscaler.tick(now=100)
+
+        self.engine.scaleup_function.assert_called_once_with(
+            None, FUNCTION_ID, 0, RUNTIME_ID, 2
+        )
+
+    def test_tick_not_scaleup(self):
+        self._execute(1, 100)
+        self._execute(19, 105)
+        self.autoscaler._loads[(FUNCTION_ID, 0)].rate = 2.0
+
+        self.autoscaler.tick(now=110)
+
+        self.engine.scaleup_function.assert_not_called()
+        self.engine.scaledown_function.assert_not_called()
+
+    def test_tick_no_worker(self):
+        self.mock_getworkers.return_value = []
+        self._execute(5, 100, finish=False)
+
+        self.autoscaler.tick(now=100)
+
+        self.engine.scaleup_function.assert_not_called()
+
+    def test_tick_lock_not_acquired(self):
+        self.lock.is_acquired.return_value = False
+        self._execute(5, 100, finish=False)
+
+        self.autoscaler.tick(now=100)
+
+        self.mock_getworkers.assert_not_called()
+        self.engine.scaleup_function.assert_not_called()
+
+    def test_tick_scaledown(self):
+        self.mock_getworkers.return_value = ['worker%s' % i for i in range(5)]
+        self._execute(1, 100)
+
+        self.autoscaler.tick(now=110)
+
+        # Twice the needed workers are kept.
+        self.engine.scaledown_function.assert_called_once_with(
+            None, FUNCTION_ID, 0, 3
+        )
+
+    def test_tick_not_scaledown_running_in_other_engines(self):
+        self.mock_getworkers.return_value = ['worker%s' % i for i in range(6)]
+        self.mock_running.return_value = {(FUNCTION_ID, 0): 1}
+        self._execute(1, 100)
+
+        self.autoscaler.tick(now=110)
+
+        # The worker running the execution may be the one deleted.
+        self.engine.scaledown_function.assert_not_called()
+
+    def test_tick_not_scaledown_busy_worker(self):
+        self.mock_getworkers.return_value = ['worker%s' % i for i in range(6)]
+        self._execute(1, 100)
+        self._execute(1, 100, finish=False)
+
+        self.autoscaler.tick(now=110)
+        self.engine.scaledown_function.assert_not_called()
+
+        # Scaled down once the execution is finished.
+        self.autoscaler.record_finish(FUNCTION_ID, 0, 1.0)
+        self.autoscaler.tick(now=120)
+        self.engine.scaledown_function.assert_called_once_with(
+            None, FUNCTION_ID, 0, 3
+        )
+
+    def test_tick_not_scaledown_running_unknown(self):
+        self.mock_getworkers.return_value = ['worker%s' % i for i in range(5)]
+        self.mock_running.side_effect = Exception()
+        self._execute(1, 100)
+
+        self.autoscaler.tick(now=110)
+
+        self.engine.scaledown_function.assert_not_called()
+
+    def test_tick_scaledown_idle(self):
+        self.mock_getworkers.return_value = ['worker1', 'worker2']
+        self._execute(1, 100)
+
+        self.autoscaler.tick(now=150)
+        self.engine.scaledown_function.assert_not_called()
+
+        self.autoscaler.tick(now=160)
+        self.engine.scaledown_function.assert_called_once_with(
+            None, FUNCTION_ID, 0, 1
+        )
+
+    def test_tick_not_scaledown_idle_running_in_other_engines(self):
+        self.mock_getworkers.return_value = ['worker1', 'worker2']
+        self.mock_running.return_value = {(FUNCTION_ID, 0): 1}
+        self._execute(1, 100)
+
+        self.autoscaler.tick(now=160)
+
+        self.engine.scaledown_function.assert_not_called()
+
+    def test_tick_expiration(self):
+        self._execute(1, 100)
+
+        self.autoscaler.tick(now=700)
+
+        self.assertEqual({}, self.autoscaler.stats())
+        self.mock_getworkers.assert_not_called()
@@ -0,0 +1,65 @@
+# Copyright 2018 Catalyst IT Limited
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+from qinling.engine import balancer
+from qinling.tests.unit import base
+
+URLS = ['http://10.0.0.%s:9090' % i for i in range(1, 4)]
+
+
+class TestWorkerBalancer(base.BaseTest):
+    def test_acquire_no_workers(self):
+        self.assertIsNone(balancer.WorkerBalancer().acquire([]))
+
+    def test_acquire_release(self):
+        b = balancer.WorkerBalancer(balancer.RANDOM)
+
+        url = b.acquire(URLS[:1])
+        b.acquire(URLS[:1])
+
+        self.assertEqual(URLS[0], url)
+        self.assertEqual(2, b.outstanding(url))
+
+        b.release(url)
+        b.release(url)
+        b.release(url)
+
+        self.assertEqual(0, b.outstanding(url))
+        self.assertEqual({}, dict(b._outstanding))
+
+    def test_least_outstanding(self):
+        b = balancer.WorkerBalancer(balancer.LEAST_OUTSTANDING)
+
+        chosen = [b.acquire(URLS) for _ in range(6)]
+
+        for url in URLS:
+            self.assertEqual(2, chosen.count(url))
+
+        b.release(URLS[1])
+
+        self.assertEqual(URLS[1], b.acquire(URLS))
+
+    def test_power_of_two(self):
+        b = balancer.WorkerBalancer(balancer.POWER_OF_TWO)
+        # The slow worker has many requests in progress.
+        for _ in range(10):
+            b._outstanding[URLS[0]] += 1
+
+        # The slow worker never wins when chosen with another one.
+        for _ in range(50):
+            url = b.acquire(URLS)
+            self.assertNotEqual(URLS[0], url)
+            b.release(url)
+
+    def test_unknown_policy(self):
+        self.assertRaises(ValueError, balancer.WorkerBalancer, 'unknown')
@@ -12,10 +12,14 @@
 #    See the License for the specific language governing permissions and
 #    limitations under the License.
 
+import threading
+
 import mock
 from oslo_config import cfg
 
+from qinling import context
 from qinling.db import api as db_api
+from qinling.db import cache as db_cache
 from qinling.engine import default_engine
 from qinling import exceptions as exc
 from qinling import status
@@ -79,7 +83,7 @@ class TestDefaultEngine(base.DbTestCase):
             runtime_id)
         self.assertRaisesRegex(
             exc.DBEntityNotFoundError,
-            "^Runtime not found \[id=%s\]$" % runtime_id,
+            r"^Runtime not found \[id=%s\]$" % runtime_id,
             db_api.get_runtime, runtime_id)
 
     def test_update_runtime(self):
@@ -131,7 +135,12 @@ class TestDefaultEngine(base.DbTestCase):
 
         self.default_engine.function_load_check(function_id, 0, runtime_id)
 
-        mock_getworkers.assert_called_once_with(function_id, 0)
+        # Checked again with the lock held.
+        self.assertEqual(
+            [mock.call(function_id, 0, cached=True),
+             mock.call(function_id, 0)],
+            mock_getworkers.call_args_list
+        )
         mock_scaleup.assert_called_once_with(None, function_id, 0, runtime_id,
                                              1)
 
@@ -154,7 +163,11 @@ class TestDefaultEngine(base.DbTestCase):
 
         self.default_engine.function_load_check(function_id, 0, runtime_id)
 
-        mock_getworkers.assert_called_once_with(function_id, 0)
+        self.assertEqual(
+            [mock.call(function_id, 0, cached=True),
+             mock.call(function_id, 0)],
+            mock_getworkers.call_args_list
+        )
         mock_scaleup.assert_called_once_with(None, function_id, 0, runtime_id,
                                              1)
 
@@ -177,13 +190,91 @@ class TestDefaultEngine(base.DbTestCase):
 
         self.default_engine.function_load_check(function_id, 0, runtime_id)
 
-        mock_getworkers.assert_called_once_with(function_id, 0)
+        mock_getworkers.assert_called_once_with(function_id, 0,
+                                                cached=True)
+        mock_getlock.assert_not_called()
         mock_scaleup.assert_not_called()
 
+    @mock.patch('qinling.engine.default_engine.DefaultEngine.scaleup_function')
+    @mock.patch('qinling.utils.etcd_util.get_workers')
+    @mock.patch('qinling.utils.etcd_util.get_worker_lock')
+    def test_function_load_check_scaled_by_others(self, mock_getlock,
+                                                  mock_getworkers,
+                                                  mock_scaleup):
+        function = self.create_function()
+        function_id = function.id
+        runtime_id = function.runtime_id
+        lock = mock.Mock()
+        lock.is_acquired.return_value = True
+        mock_getlock.return_value.__enter__.return_value = lock
+        # Scaled up by another execution before the lock is acquired.
+        mock_getworkers.side_effect = [['worker1'], ['worker1', 'worker2']]
+        self._create_running_executions(function_id, 4)
+
+        self.default_engine.function_load_check(function_id, 0, runtime_id)
+
+        mock_getlock.assert_called_once_with(function_id, 0)
+        mock_scaleup.assert_not_called()
+
+    @mock.patch('qinling.db.api.count_executions')
+    @mock.patch('qinling.utils.etcd_util.get_workers')
+    @mock.patch('qinling.utils.etcd_util.get_worker_lock')
+    def test_function_load_check_cached_count(self, mock_getlock,
+                                              mock_getworkers,
+                                              mock_count):
+        function_id = common.generate_unicode_uuid()
+        runtime_id = common.generate_unicode_uuid()
+        mock_getworkers.return_value = ['worker1']
+        mock_count.return_value = 2
+
+        for _ in range(3):
+            self.default_engine.function_load_check(function_id, 0,
+                                                    runtime_id)
+
+        mock_count.assert_called_once_with(
+            function_id=function_id, function_version=0,
+            status=status.RUNNING
+        )
+        mock_getlock.assert_not_called()
+
+        self.override_config('load_check_cache_ttl', 0, 'engine')
+        self.default_engine.function_load_check(function_id, 0, runtime_id)
+        self.assertEqual(2, mock_count.call_count)
+
+    @mock.patch('qinling.db.api.count_executions')
+    @mock.patch('qinling.engine.default_engine.DefaultEngine.scaleup_function')
+    @mock.patch('qinling.utils.etcd_util.get_workers')
+    @mock.patch('qinling.utils.etcd_util.get_worker_lock')
+    def test_function_load_check_autoscale(self, mock_getlock,
+                                           mock_getworkers, mock_scaleup,
+                                           mock_getexecutions):
+        self.override_config('autoscale', True, 'engine')
+        engine = default_engine.DefaultEngine(
+            self.orchestrator, self.qinling_endpoint
+        )
+        function_id = common.generate_unicode_uuid()
+        runtime_id = common.generate_unicode_uuid()
+        lock = mock.Mock()
+        lock.is_acquired.return_value = True
+        mock_getlock.return_value.__enter__.return_value = lock
+        mock_getworkers.side_effect = [['worker1'], [], []]
+
+        engine.function_load_check(function_id, 0, runtime_id)
+        mock_scaleup.assert_not_called()
+        mock_getlock.assert_not_called()
+
+        # The first worker is still created for the execution.
+        engine.function_load_check(function_id, 0, runtime_id)
+        mock_scaleup.assert_called_once_with(None, function_id, 0, runtime_id,
+                                             1)
+
+        mock_getexecutions.assert_not_called()
+
+    @mock.patch('qinling.engine.default_engine.DefaultEngine.scaleup_function')
     @mock.patch('qinling.utils.etcd_util.get_workers')
     @mock.patch('qinling.utils.etcd_util.get_worker_lock')
     def test_function_load_check_lock_wait(self, mock_getlock,
-                                           mock_getworkers):
+                                           mock_getworkers, mock_scaleup):
         function = self.create_function()
         function_id = function.id
         runtime_id = function.runtime_id
@@ -191,14 +282,42 @@ class TestDefaultEngine(base.DbTestCase):
         mock_getlock.return_value.__enter__.return_value = lock
         # Lock is acquired upon the third try.
         lock.is_acquired.side_effect = [False, False, True]
-        mock_getworkers.return_value = ['worker1']
-        self._create_running_executions(function_id, 3)
+        mock_getworkers.return_value = []
 
         self.default_engine.function_load_check(function_id, 0, runtime_id)
 
         self.assertEqual(3, lock.is_acquired.call_count)
-        mock_getworkers.assert_called_once_with(function_id, 0)
+        # Checked without the lock for every try and once with the lock.
+        self.assertEqual(4, mock_getworkers.call_count)
+        mock_scaleup.assert_called_once_with(None, function_id, 0, runtime_id,
+                                             1)
 
+    @mock.patch('qinling.engine.default_engine.DefaultEngine.scaleup_function')
+    @mock.patch('qinling.utils.etcd_util.get_workers')
+    @mock.patch('qinling.utils.etcd_util.get_worker_lock')
+    def test_function_load_check_lock_contended(self, mock_getlock,
+                                                mock_getworkers,
+                                                mock_scaleup):
+        function = self.create_function()
+        function_id = function.id
+        runtime_id = function.runtime_id
+        lock = mock.Mock()
+        lock.is_acquired.return_value = False
+        mock_getlock.return_value.__enter__.return_value = lock
+        mock_getworkers.return_value = ['worker1']
+        self._create_running_executions(function_id, 4)
+
+        # Sent to the existing worker while another execution scales up.
+        self.assertIsNone(
+            self.default_engine.function_load_check(function_id, 0,
+                                                    runtime_id)
+        )
+
+        lock.is_acquired.assert_called_once_with()
+        mock_scaleup.assert_not_called()
+
+    @mock.patch('qinling.utils.etcd_util.get_workers', mock.Mock(
+        return_value=[]))
     @mock.patch('qinling.utils.etcd_util.get_worker_lock')
     def test_function_load_check_failed_to_get_worker_lock(self, mock_getlock):
         function = self.create_function()
@@ -213,7 +332,7 @@ class TestDefaultEngine(base.DbTestCase):
         self.assertRaisesRegex(
             exc.EtcdLockException,
             "^Etcd: failed to get worker lock for function %s"
-            "\(version %s\)\.$" % (function_id, function_version),
+            r"\(version %s\)\.$" % (function_id, function_version),
             self.default_engine.function_load_check,
             function_id, function_version, runtime_id
         )
@@ -256,7 +375,8 @@ class TestDefaultEngine(base.DbTestCase):
         )
 
         get_service_url_calls = [
-            mock.call(function_id, 0), mock.call(function_id, 0)
+            mock.call(function_id, 0, cached=True),
+            mock.call(function_id, 0, cached=True)
         ]
         mock_svc_url.assert_has_calls(get_service_url_calls)
 
@@ -267,14 +387,16 @@ class TestDefaultEngine(base.DbTestCase):
                       image=function.code['image'],
                       identifier=mock.ANY,
                       labels=None,
-                      input=None),
+                      input=None,
+                      md5sum=None),
             mock.call(function_id,
                       0,
                       rlimit=self.rlimit,
                       image=function.code['image'],
                       identifier=mock.ANY,
                       labels=None,
-                      input='input')
+                      input='input',
+                      md5sum=None)
         ]
         self.orchestrator.prepare_execution.assert_has_calls(prepare_calls)
 
@@ -288,7 +410,8 @@ class TestDefaultEngine(base.DbTestCase):
                       service_url=None,
                       entry=function.entry,
                       trust_id=function.trust_id,
-                      timeout=function.timeout),
+                      timeout=function.timeout,
+                      md5sum=None),
             mock.call(execution_2_id,
                       function_id,
                       0,
@@ -298,7 +421,8 @@ class TestDefaultEngine(base.DbTestCase):
                       service_url=None,
                       entry=function.entry,
                       trust_id=function.trust_id,
-                      timeout=function.timeout)
+                      timeout=function.timeout,
+                      md5sum=None)
         ]
         self.orchestrator.run_execution.assert_has_calls(run_calls)
 
@@ -306,10 +430,11 @@ class TestDefaultEngine(base.DbTestCase):
         execution_2 = db_api.get_execution(execution_2_id)
 
         self.assertEqual(status.SUCCESS, execution_1.status)
-        self.assertEqual('fake log', execution_1.logs)
+        self.assertEqual(b'fake log',
+                         db_api.get_execution_logs(execution_1_id))
         self.assertEqual({"duration": 5}, execution_1.result)
         self.assertEqual(status.FAILED, execution_2.status)
-        self.assertEqual('', execution_2.logs)
+        self.assertEqual(b'', db_api.get_execution_logs(execution_2_id))
         self.assertEqual(
             {'duration': 0, 'output': 'Function execution failed.'},
             execution_2.result
@@ -352,7 +477,7 @@ class TestDefaultEngine(base.DbTestCase):
         execution = db_api.get_execution(execution_id)
 
         self.assertEqual(status.ERROR, execution.status)
-        self.assertEqual('', execution.logs)
+        self.assertEqual(b'', db_api.get_execution_logs(execution_id))
         self.assertEqual({'output': 'Function execution failed.'},
                          execution.result)
 
@@ -380,20 +505,23 @@ class TestDefaultEngine(base.DbTestCase):
 
         self.default_engine.function_load_check.assert_called_once_with(
             function_id, 0, runtime_id)
-        etcd_util_get_service_url_mock.assert_called_once_with(function_id, 0)
+        etcd_util_get_service_url_mock.assert_called_once_with(
+            function_id, 0, cached=True)
         self.orchestrator.prepare_execution.assert_called_once_with(
             function_id, 0, rlimit=self.rlimit, image=None,
             identifier=runtime_id, labels={'runtime_id': runtime_id},
-            input=None)
+            input=None, md5sum='fake_md5')
         self.orchestrator.run_execution.assert_called_once_with(
             execution_id, function_id, 0, rlimit=self.rlimit, input=None,
             identifier=runtime_id, service_url='svc_url', entry=function.entry,
-            trust_id=function.trust_id, timeout=function.timeout)
+            trust_id=function.trust_id, timeout=function.timeout,
+            md5sum='fake_md5')
 
         execution = db_api.get_execution(execution_id)
 
         self.assertEqual(execution.status, status.SUCCESS)
-        self.assertEqual(execution.logs, 'execution log')
+        self.assertEqual(b'execution log',
+                         db_api.get_execution_logs(execution_id))
         self.assertEqual(execution.result, {'output': 'success output'})
 
     def test_create_execution_loadcheck_exception(self):
@@ -414,7 +542,7 @@ class TestDefaultEngine(base.DbTestCase):
         execution = db_api.get_execution(execution_id)
 
         self.assertEqual(status.ERROR, execution.status)
-        self.assertEqual('', execution.logs)
+        self.assertEqual(b'', db_api.get_execution_logs(execution_id))
         self.assertEqual({'output': 'Function execution failed.'},
                          execution.result)
 
@@ -446,21 +574,213 @@ class TestDefaultEngine(base.DbTestCase):
 
         self.default_engine.function_load_check.assert_called_once_with(
             function_id, 0, runtime_id)
-        etcd_util_get_service_url_mock.assert_called_once_with(function_id, 0)
+        etcd_util_get_service_url_mock.assert_called_once_with(
+            function_id, 0, cached=True)
         engine_utils_get_request_data_mock.assert_called_once_with(
             mock.ANY, function_id, 0, execution_id, self.rlimit,
             'input', function.entry, function.trust_id,
-            self.qinling_endpoint, function.timeout)
+            self.qinling_endpoint, function.timeout, md5sum='fake_md5')
         engine_utils_url_request_mock.assert_called_once_with(
             self.default_engine.session, 'svc_url/execute', body='data')
 
         execution = db_api.get_execution(execution_id)
 
         self.assertEqual(execution.status, status.FAILED)
-        self.assertEqual(execution.logs, 'execution log')
+        self.assertEqual(b'execution log',
+                         db_api.get_execution_logs(execution_id))
         self.assertEqual(execution.result,
                          {'success': False, 'output': 'failed output'})
 
+    @mock.patch('qinling.engine.utils.get_request_data')
+    @mock.patch('qinling.engine.utils.url_request')
+    @mock.patch('qinling.utils.etcd_util.get_service_url')
+    def test_create_execution_async_dispatch(
+        self,
+        etcd_util_get_service_url_mock,
+        engine_utils_url_request_mock,
+        engine_utils_get_request_data_mock
+    ):
+        dispatcher = mock.Mock()
+        self.default_engine.dispatcher = dispatcher
+        function = self.create_function()
+        function_id = function.id
+        runtime_id = function.runtime_id
+        execution = self.create_execution(function_id=function_id)
+        execution_id = execution.id
+        self.default_engine.function_load_check = mock.Mock(return_value='')
+        etcd_util_get_service_url_mock.return_value = 'svc_url'
+        engine_utils_get_request_data_mock.return_value = 'data'
+
+        self.default_engine.create_execution(
+            mock.Mock(), execution_id, function_id, 0, runtime_id,
+            input='input', is_sync=False)
+
+        dispatcher.dispatch.assert_called_once_with(
+            execution_id, 'svc_url/execute', 'data', callback=None)
+        engine_utils_url_request_mock.assert_not_called()
+
+        execution = db_api.get_execution(execution_id)
+        self.assertEqual(status.RUNNING, execution.status)
+
+    @mock.patch('qinling.engine.utils.get_request_data')
+    @mock.patch('qinling.engine.utils.url_request')
+    @mock.patch('qinling.utils.etcd_util.get_service_url')
+    @mock.patch('qinling.utils.etcd_util.get_worker_urls')
+    def test_create_execution_pod_ip(
+        self,
+        etcd_util_get_worker_urls_mock,
+        etcd_util_get_service_url_mock,
+        engine_utils_url_request_mock,
+        engine_utils_get_request_data_mock
+    ):
+        self.override_config('service_address_type', 'pod_ip', 'kubernetes')
+        function = self.create_function()
+        function_id = function.id
+        runtime_id = function.runtime_id
+        execution = self.create_execution(function_id=function_id)
+        execution_id = execution.id
+        self.default_engine.function_load_check = mock.Mock(return_value='')
+        etcd_util_get_worker_urls_mock.return_value = ['http://10.0.0.1:9090']
+        engine_utils_get_request_data_mock.return_value = 'data'
+        engine_utils_url_request_mock.return_value = (
+            True, {'success': True, 'logs': 'execution log',
+                   'output': 'success output'}
+        )
+
+        self.default_engine.create_execution(
+            mock.Mock(), execution_id, function_id, 0, runtime_id)
+
+        etcd_util_get_worker_urls_mock.assert_called_once_with(
+            function_id, 0, cached=True)
+        etcd_util_get_service_url_mock.assert_not_called()
+        engine_utils_url_request_mock.assert_called_once_with(
+            self.default_engine.session, 'http://10.0.0.1:9090/execute',
+            body='data'
+        )
+        # The worker is released in the balancer.
+        self.assertEqual(
+            0, self.default_engine.balancer.outstanding('http://10.0.0.1:9090')
+        )
+
+        execution = db_api.get_execution(execution_id)
+        self.assertEqual(status.SUCCESS, execution.status)
+
+    @mock.patch('qinling.engine.utils.get_request_data')
+    @mock.patch('qinling.utils.etcd_util.get_worker_urls')
+    def test_create_execution_pod_ip_exception(
+        self,
+        etcd_util_get_worker_urls_mock,
+        engine_utils_get_request_data_mock
+    ):
+        self.override_config('service_address_type', 'pod_ip', 'kubernetes')
+        function = self.create_function()
+        execution = self.create_execution(function_id=function.id)
+        self.default_engine.function_load_check = mock.Mock(return_value='')
+        etcd_util_get_worker_urls_mock.return_value = ['http://10.0.0.1:9090']
+        engine_utils_get_request_data_mock.side_effect = RuntimeError()
+
+        self.assertRaises(
+            RuntimeError,
+            self.default_engine.create_execution,
+            mock.Mock(), execution.id, function.id, 0, function.runtime_id
+        )
+
+        # No worker is left outstanding in the balancer.
+        self.assertEqual(
+            0, self.default_engine.balancer.outstanding('http://10.0.0.1:9090')
+        )
+
+    def test_create_executions(self):
+        self.override_config('batch_execution_concurrency', 2, 'engine')
+        function = self.create_function()
+        execution_ids = [
+            self.create_execution(function_id=function.id).id
+            for _ in range(5)
+        ]
+        inputs = [{'index': i} for i in range(5)]
+        self.default_engine.create_execution = mock.Mock(
+            side_effect=lambda *args, **kwargs: kwargs['finished']()
+        )
+        ctx = context.get_ctx()
+
+        self.default_engine.create_executions(
+            ctx, execution_ids, function.id, 0, function.runtime_id,
+            inputs=inputs
+        )
+
+        self.default_engine.create_execution.assert_has_calls(
+            [mock.call(ctx, execution_id, function.id, 0,
+                       function.runtime_id, input=input, is_sync=False,
+                       finished=mock.ANY)
+             for execution_id, input in zip(execution_ids, inputs)],
+            any_order=True
+        )
+        self.assertEqual(5, self.default_engine.create_execution.call_count)
+
+    @mock.patch('qinling.engine.utils.get_request_data')
+    @mock.patch('qinling.utils.etcd_util.get_service_url')
+    def test_create_executions_async_dispatch(
+        self,
+        etcd_util_get_service_url_mock,
+        engine_utils_get_request_data_mock
+    ):
+        self.override_config('batch_execution_concurrency', 2, 'engine')
+        function = self.create_function()
+        execution_ids = [
+            self.create_execution(function_id=function.id).id
+            for _ in range(5)
+        ]
+        self.default_engine.function_load_check = mock.Mock(return_value='')
+        etcd_util_get_service_url_mock.return_value = 'svc_url'
+        engine_utils_get_request_data_mock.return_value = 'data'
+
+        lock = threading.Lock()
+        running = []
+        max_running = []
+
+        def _finish(callback):
+            with lock:
+                running.pop()
+            callback()
+
+        def _dispatch(execution_id, url, data, callback=None):
+            with lock:
+                running.append(execution_id)
+                max_running.append(len(running))
+            threading.Timer(0.01, _finish, args=(callback,)).start()
+
+        dispatcher = mock.Mock()
+        dispatcher.dispatch.side_effect = _dispatch
+        self.default_engine.dispatcher = dispatcher
+
+        self.default_engine.create_executions(
+            context.get_ctx(), execution_ids, function.id, 0,
+            function.runtime_id
+        )
+
+        self.assertEqual(5, dispatcher.dispatch.call_count)
+        # The dispatched executions are limited by the batch concurrency.
+        self.assertEqual(2, max(max_running))
+
+    def test_create_executions_exception(self):
+        function = self.create_function()
+        execution_ids = [
+            self.create_execution(function_id=function.id).id
+            for _ in range(2)
+        ]
+        self.default_engine.create_execution = mock.Mock(
+            side_effect=[None, exc.OrchestratorException('failed')]
+        )
+
+        self.default_engine.create_executions(
+            context.get_ctx(), execution_ids, function.id, 0,
+            function.runtime_id
+        )
+
+        statuses = sorted(db_api.get_execution(execution_id).status
+                          for execution_id in execution_ids)
+        self.assertEqual([status.ERROR, status.RUNNING], statuses)
+
     def test_delete_function(self):
         function_id = common.generate_unicode_uuid()
 
@@ -470,6 +790,49 @@ class TestDefaultEngine(base.DbTestCase):
             function_id, 0
         )
 
+    @mock.patch('qinling.utils.etcd_util.get_service_url')
+    def test_create_execution_after_function_updated(
+        self,
+        etcd_util_get_service_url_mock
+    ):
+        self.override_config('enabled', True, 'metadata_cache')
+        db_cache.invalidate_all()
+        self.addCleanup(db_cache.invalidate_all)
+        function = self.create_function()
+        function_id = function.id
+        runtime_id = function.runtime_id
+        self.default_engine.function_load_check = mock.Mock(return_value='')
+        etcd_util_get_service_url_mock.return_value = None
+        self.orchestrator.prepare_execution.return_value = (
+            mock.Mock(), 'svc_url')
+        self.orchestrator.run_execution.return_value = (
+            True,
+            {'success': True, 'logs': 'execution log',
+             'output': 'success output'})
+
+        execution = self.create_execution(function_id=function_id)
+        self.default_engine.create_execution(
+            mock.Mock(), execution.id, function_id, 0, runtime_id)
+
+        # The package is updated by the api service in another process, the
+        # function resources are deleted afterwards.
+        with mock.patch.object(db_cache.functions, 'invalidate'):
+            db_api.update_function(
+                function_id,
+                {'code': {'source': 'package', 'md5sum': 'new_md5'}}
+            )
+        self.default_engine.delete_function(mock.Mock(), function_id)
+
+        execution = self.create_execution(function_id=function_id)
+        self.default_engine.create_execution(
+            mock.Mock(), execution.id, function_id, 0, runtime_id)
+
+        self.orchestrator.run_execution.assert_called_with(
+            execution.id, function_id, 0, rlimit=self.rlimit, input=None,
+            identifier=runtime_id, service_url='svc_url', entry=function.entry,
+            trust_id=function.trust_id, timeout=function.timeout,
+            md5sum='new_md5')
+
     @mock.patch('qinling.utils.etcd_util.create_service_url')
     @mock.patch('qinling.utils.etcd_util.create_worker')
     def test_scaleup_function(
@@ -485,12 +848,30 @@ class TestDefaultEngine(base.DbTestCase):
             mock.Mock(), function_id, 0, runtime_id)
 
         self.orchestrator.scaleup_function.assert_called_once_with(
-            function_id, 0, identifier=runtime_id, count=1)
+            function_id, 0, identifier=runtime_id, count=1, md5sum=None)
         etcd_util_create_worker_mock.assert_called_once_with(
             function_id, 'worker', version=0)
         etcd_util_create_service_url_mock.assert_called_once_with(
             function_id, 'url', version=0)
 
+    @mock.patch('qinling.utils.etcd_util.create_service_url')
+    @mock.patch('qinling.utils.etcd_util.create_worker')
+    def test_scaleup_function_prefetch_package(
+        self,
+        etcd_util_create_worker_mock,
+        etcd_util_create_service_url_mock
+    ):
+        self.override_config('prefetch_function_package', True, 'engine')
+        function = self.create_function()
+        runtime_id = function.runtime_id
+        self.orchestrator.scaleup_function.return_value = (['worker'], 'url')
+
+        self.default_engine.scaleup_function(
+            mock.Mock(), function.id, 0, runtime_id)
+
+        self.orchestrator.scaleup_function.assert_called_once_with(
+            function.id, 0, identifier=runtime_id, count=1, md5sum='fake_md5')
+
     @mock.patch('qinling.utils.etcd_util.create_service_url')
     @mock.patch('qinling.utils.etcd_util.create_worker')
     def test_scaleup_function_multiple_workers(
@@ -508,7 +889,7 @@ class TestDefaultEngine(base.DbTestCase):
         )
 
         self.orchestrator.scaleup_function.assert_called_once_with(
-            function_id, 0, identifier=runtime_id, count=2
+            function_id, 0, identifier=runtime_id, count=2, md5sum=None
         )
         # Two new workers are created.
         expected = [mock.call(function_id, 'worker0', version=0),
@@ -518,6 +899,34 @@ class TestDefaultEngine(base.DbTestCase):
             function_id, 'url', version=0
         )
 
+    @mock.patch('qinling.utils.etcd_util.create_service_url')
+    @mock.patch('qinling.utils.etcd_util.create_worker_url')
+    @mock.patch('qinling.utils.etcd_util.create_worker')
+    def test_scaleup_function_pod_ip(
+        self,
+        etcd_util_create_worker_mock,
+        etcd_util_create_worker_url_mock,
+        etcd_util_create_service_url_mock
+    ):
+        self.override_config('service_address_type', 'pod_ip', 'kubernetes')
+        function_id = common.generate_unicode_uuid()
+        runtime_id = common.generate_unicode_uuid()
+        self.orchestrator.scaleup_function.return_value = (
+            ['worker0', 'worker1'], 'url1')
+        self.orchestrator.get_worker_url.side_effect = ['url0', 'url1']
+
+        self.default_engine.scaleup_function(
+            mock.Mock(), function_id, 0, runtime_id, count=2
+        )
+
+        expected = [mock.call(function_id, 'worker0', 'url0', version=0),
+                    mock.call(function_id, 'worker1', 'url1', version=0)]
+        etcd_util_create_worker_url_mock.assert_has_calls(expected)
+        self.assertEqual(2, etcd_util_create_worker_mock.call_count)
+        etcd_util_create_service_url_mock.assert_called_once_with(
+            function_id, 'url1', version=0
+        )
+
     @mock.patch('qinling.utils.etcd_util.delete_worker')
     @mock.patch('qinling.utils.etcd_util.get_workers')
     def test_scaledown_function(
@@ -0,0 +1,161 @@
+# Copyright 2018 Catalyst IT Limited
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+import json
+import threading
+
+import mock
+import six
+from six.moves import BaseHTTPServer
+import testtools
+
+from qinling import context
+from qinling.tests.unit import base
+
+if six.PY3:
+    import aiohttp
+
+    from qinling.engine import dispatcher
+
+
+class FakeFunctionHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.send_response(200)
+        self.end_headers()
+        self.wfile.write(b'pong')
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        self.server.requests.append(json.loads(body.decode('utf-8')))
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.end_headers()
+        self.wfile.write(json.dumps(
+            {'success': True, 'logs': 'execution log', 'output': 'success'}
+        ).encode('utf-8'))
+
+    def log_message(self, *args):
+        pass
+
+
+@testtools.skipIf(six.PY2, 'Asynchronous dispatch requires Python 3.')
+class TestAsyncDispatcher(base.BaseTest):
+    def setUp(self):
+        super(TestAsyncDispatcher, self).setUp()
+
+        self.server = BaseHTTPServer.HTTPServer(('127.0.0.1', 0),
+                                                FakeFunctionHandler)
+        self.server.requests = []
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.url = 'http://127.0.0.1:%s/execute' % self.server.server_port
+
+        self.ctx = base.get_context()
+        context.set_ctx(self.ctx)
+        self.addCleanup(context.set_ctx, None)
+
+        self.dispatcher = dispatcher.AsyncDispatcher(max_executions=2,
+                                                     db_workers=1)
+        self.dispatcher.start()
+
+    @mock.patch('qinling.engine.utils.finish_execution')
+    def test_dispatch(self, finish_execution_mock):
+        ctxs = []
+        finish_execution_mock.side_effect = (
+            lambda *args, **kwargs: ctxs.append(context.get_ctx())
+        )
+
+        for i in range(5):
+            self.dispatcher.dispatch('execution_%s' % i, self.url,
+                                     {'execution_id': 'execution_%s' % i})
+        self.dispatcher.stop()
+
+        self.assertEqual(
+            set(['execution_%s' % i for i in range(5)]),
+            set([r['execution_id'] for r in self.server.requests])
+        )
+        self.assertEqual(5, finish_execution_mock.call_count)
+        finish_execution_mock.assert_any_call(
+            'execution_0', True,
+            {'success': True, 'logs': 'execution log', 'output': 'success'},
+            is_sync=False
+        )
+        self.assertEqual([self.ctx] * 5, ctxs)
+
+    @mock.patch('qinling.engine.dispatcher.RETRY_INTERVAL', 0)
+    @mock.patch('qinling.engine.dispatcher.PING_ATTEMPTS', 2)
+    @mock.patch('qinling.engine.utils.finish_execution')
+    def test_dispatch_service_unavailable(self, finish_execution_mock):
+        self.server.shutdown()
+        self.server.server_close()
+
+        callback = mock.Mock()
+
+        self.dispatcher.dispatch('execution_id', self.url, {},
+                                 callback=callback)
+        self.dispatcher.stop()
+
+        finish_execution_mock.assert_called_once_with(
+            'execution_id', False, {'output': 'Function execution failed.'},
+            is_sync=False
+        )
+        callback.assert_called_once_with()
+
+    @mock.patch('qinling.engine.utils.finish_execution')
+    def test_dispatch_callback_failed(self, finish_execution_mock):
+        callback = mock.Mock(side_effect=Exception('callback failed'))
+
+        self.dispatcher.dispatch('execution_id', self.url, {},
+                                 callback=callback)
+        self.dispatcher.stop()
+
+        callback.assert_called_once_with()
+        finish_execution_mock.assert_called_once_with(
+            'execution_id', True,
+            {'success': True, 'logs': 'execution log', 'output': 'success'},
+            is_sync=False
+        )
+
+    @mock.patch('qinling.engine.dispatcher.RETRY_INTERVAL', 0)
+    @mock.patch('qinling.engine.utils.finish_execution')
+    def test_dispatch_connect_timeout(self, finish_execution_mock):
+        session = self.dispatcher._session
+        request = session._request
+        timeouts = []
+
+        def _request(method, url, **kwargs):
+            # The first execution request times out before connected.
+            if method == 'POST' and not timeouts:
+                timeouts.append(url)
+                future = self.dispatcher._loop.create_future()
+                future.set_exception(
+                    aiohttp.ServerTimeoutError('Connection timeout'))
+                return future
+            return request(method, url, **kwargs)
+
+        with mock.patch.object(session, '_request', side_effect=_request):
+            self.dispatcher.dispatch('execution_id', self.url,
+                                     {'execution_id': 'execution_id'})
+            self.dispatcher.stop()
+
+        self.assertEqual([self.url], timeouts)
+        self.assertEqual(1, len(self.server.requests))
+        finish_execution_mock.assert_called_once_with(
+            'execution_id', True,
+            {'success': True, 'logs': 'execution log', 'output': 'success'},
+            is_sync=False
+        )
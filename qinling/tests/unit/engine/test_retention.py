@@ -0,0 +1,164 @@
+# Copyright 2018 Catalyst IT Limited
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+from datetime import datetime
+from datetime import timedelta
+import gzip
+import json
+import os
+import shutil
+import tempfile
+
+import mock
+
+from qinling.db import api as db_api
+from qinling.engine import retention
+from qinling import status
+from qinling.tests.unit import base
+
+NOW = datetime(2018, 9, 10, 12, 0, 0)
+
+
+class TestExecutionPurger(base.DbTestCase):
+    def setUp(self):
+        super(TestExecutionPurger, self).setUp()
+
+        self.function_id = self.create_function().id
+
+    def _create_execution(self, days, project_id=base.DEFAULT_PROJECT_ID,
+                          execution_status=status.SUCCESS):
+        return self.create_execution(
+            self.function_id,
+            project_id=project_id,
+            status=execution_status,
+            created_at=NOW - timedelta(days=days, seconds=1)
+        ).id
+
+    def _get_execution_ids(self):
+        return set(e.id for e in db_api.get_executions(insecure=True))
+
+    def test_purge(self):
+        self._create_execution(31)
+        self._create_execution(40, execution_status=status.FAILED)
+        running_id = self._create_execution(31,
+                                            execution_status=status.RUNNING)
+        recent_id = self._create_execution(29)
+
+        purger = retention.ExecutionPurger(30)
+        purged = purger.purge(now=NOW)
+
+        self.assertEqual(2, purged)
+        self.assertEqual({running_id, recent_id}, self._get_execution_ids())
+
+    def test_purge_project_days(self):
+        project_a_id = self._create_execution(10, project_id='project_a')
+        project_b_id = self._create_execution(8, project_id='project_b')
+        self._create_execution(10)
+        self._create_execution(31, project_id='project_a')
+        self._create_execution(10, project_id='project_b')
+
+        purger = retention.ExecutionPurger(
+            5, project_days={'project_a': '30', 'project_b': '9'}
+        )
+        purged = purger.purge(now=NOW)
+
+        self.assertEqual(3, purged)
+        self.assertEqual({project_a_id, project_b_id},
+                         self._get_execution_ids())
+
+    def test_purge_batches(self):
+        for _ in range(5):
+            self._create_execution(31)
+
+        purger = retention.ExecutionPurger(30, batch_size=2)
+        with mock.patch.object(
+            db_api, 'delete_executions_by_id',
+            wraps=db_api.delete_executions_by_id
+        ) as mock_delete:
+            purged = purger.purge(now=NOW)
+
+        self.assertEqual(5, purged)
+        self.assertEqual(
+            [2, 2, 1], [len(c[0][0]) for c in mock_delete.call_args_list]
+        )
+        self.assertEqual(set(), self._get_execution_ids())
+
+    def test_purge_archive(self):
+        archive_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, archive_dir)
+        execution_id = self._create_execution(31)
+        db_api.create_execution_logs(execution_id, 'execution log')
+        self._create_execution(29)
+
+        purger = retention.ExecutionPurger(30, archive_dir=archive_dir)
+        purger.purge(now=NOW)
+
+        path = os.path.join(archive_dir, 'executions-20180910120000.jsonl.gz')
+        with gzip.open(path, 'rb') as f:
+            lines = [json.loads(line.decode('utf-8')) for line in f]
+
+        self.assertEqual(1, len(lines))
+        self.assertEqual(execution_id, lines[0]['id'])
+        self.assertEqual('execution log', lines[0]['logs'])
+        self.assertNotIn(execution_id, self._get_execution_ids())
+
+    def test_purge_archive_logs_batch(self):
+        self.override_config('execution_log_chunk_size', 4, 'engine')
+        archive_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, archive_dir)
+        execution_ids = [self._create_execution(31) for _ in range(3)]
+        for i, execution_id in enumerate(execution_ids[:2]):
+            db_api.create_execution_logs(execution_id, 'execution log %s' % i)
+        db_api.update_execution(execution_ids[2], {'logs': 'legacy log'})
+
+        purger = retention.ExecutionPurger(30, archive_dir=archive_dir)
+        with mock.patch.object(
+            db_api, 'get_execution_logs',
+            wraps=db_api.get_execution_logs
+        ) as mock_get_logs:
+            purger.purge(now=NOW)
+
+        mock_get_logs.assert_not_called()
+        path = os.path.join(archive_dir, 'executions-20180910120000.jsonl.gz')
+        with gzip.open(path, 'rb') as f:
+            logs = dict((line['id'], line['logs']) for line in
+                        (json.loads(raw.decode('utf-8')) for raw in f))
+
+        self.assertEqual(
+            {execution_ids[0]: 'execution log 0',
+             execution_ids[1]: 'execution log 1',
+             execution_ids[2]: 'legacy log'},
+            logs
+        )
+
+    def test_purge_archive_nothing_expired(self):
+        archive_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, archive_dir)
+        self._create_execution(29)
+
+        purger = retention.ExecutionPurger(30, archive_dir=archive_dir)
+        purger.purge(now=NOW)
+
+        self.assertEqual([], os.listdir(archive_dir))
+
+    def test_stats(self):
+        self._create_execution(31)
+        purger = retention.ExecutionPurger(30)
+
+        purger.purge(now=NOW)
+        purger.purge(now=NOW)
+
+        stats = purger.stats()
+        self.assertEqual(2, stats['runs'])
+        self.assertEqual(1, stats['purged'])
+        self.assertEqual(0, stats['last_purged'])
@@ -0,0 +1,187 @@
+# Copyright 2018 Catalyst IT Limited
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+import mock
+import requests
+
+from qinling.db import api as db_api
+from qinling.engine import utils
+from qinling import exceptions as exc
+from qinling import status
+from qinling.tests.unit import base
+
+SERVICE_URL = 'http://127.0.0.1:9090'
+FUNCTION_URL = SERVICE_URL + '/execute'
+PING_URL = SERVICE_URL + '/ping'
+
+
+@mock.patch('time.sleep', mock.Mock())
+class TestUrlRequest(base.BaseTest):
+    def setUp(self):
+        super(TestUrlRequest, self).setUp()
+
+        health_cache = utils.ServiceHealthCache()
+        patcher = mock.patch.object(utils, 'SERVICE_HEALTH', health_cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.session = mock.Mock()
+        self.session.post.return_value.json.return_value = {'output': 'ok'}
+
+    def test_url_request_skip_ping_for_healthy_service(self):
+        for _ in range(3):
+            success, res = utils.url_request(self.session, FUNCTION_URL,
+                                             body={})
+
+            self.assertTrue(success)
+            self.assertEqual({'output': 'ok'}, res)
+
+        self.session.get.assert_called_once_with(
+            PING_URL, timeout=(3, 3), verify=False)
+        self.assertEqual(3, self.session.post.call_count)
+        self.assertEqual(
+            {'hits': 2, 'misses': 1, 'services': 1},
+            utils.SERVICE_HEALTH.stats()
+        )
+
+    def test_url_request_ping_after_connection_error(self):
+        utils.url_request(self.session, FUNCTION_URL, body={})
+
+        self.session.post.side_effect = [
+            requests.ConnectionError(), mock.DEFAULT
+        ]
+        utils.url_request(self.session, FUNCTION_URL, body={})
+        self.assertEqual(1, self.session.get.call_count)
+
+        self.session.post.side_effect = None
+        utils.url_request(self.session, FUNCTION_URL, body={})
+        self.assertEqual(1, self.session.get.call_count)
+
+        self.assertEqual(
+            {'hits': 2, 'misses': 1, 'services': 1},
+            utils.SERVICE_HEALTH.stats()
+        )
+
+    def test_url_request_ping_failed(self):
+        self.session.get.side_effect = Exception()
+
+        success, res = utils.url_request(self.session, FUNCTION_URL, body={})
+
+        self.assertFalse(success)
+        self.assertEqual({'output': 'Function execution failed.'}, res)
+        self.session.post.assert_not_called()
+        self.assertEqual(
+            {'hits': 0, 'misses': 1, 'services': 0},
+            utils.SERVICE_HEALTH.stats()
+        )
+
+    def test_url_request_health_cache_disabled(self):
+        self.override_config('service_health_ttl', 0, 'engine')
+
+        for _ in range(3):
+            utils.url_request(self.session, FUNCTION_URL, body={})
+
+        self.assertEqual(3, self.session.get.call_count)
+        self.assertEqual(
+            {'hits': 0, 'misses': 3, 'services': 0},
+            utils.SERVICE_HEALTH.stats()
+        )
+
+
+class TestExecutionResultBuffer(base.DbTestCase):
+    def setUp(self):
+        super(TestExecutionResultBuffer, self).setUp()
+
+        self.override_config('execution_result_flush_interval', 1, 'engine')
+        self.buffer = utils.ExecutionResultBuffer()
+        # Flush the buffer from the tests instead of the background thread.
+        self.buffer._start = mock.Mock()
+        patcher = mock.patch.object(utils, 'RESULT_BUFFER', self.buffer)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_finish_execution_async(self):
+        execution_ids = [self.create_execution().id for _ in range(3)]
+
+        for execution_id in execution_ids:
+            utils.finish_execution(
+                execution_id, True,
+                {'success': True, 'logs': 'log of %s' % execution_id,
+                 'output': 'ok'},
+                is_sync=False
+            )
+
+        for execution_id in execution_ids:
+            self.assertEqual(status.RUNNING,
+                             db_api.get_execution(execution_id).status)
+
+        self.buffer.flush()
+
+        for execution_id in execution_ids:
+            execution = db_api.get_execution(execution_id)
+            self.assertEqual(status.SUCCESS, execution.status)
+            self.assertEqual({'output': 'ok'}, execution.result)
+            self.assertEqual(
+                ('log of %s' % execution_id).encode('utf-8'),
+                db_api.get_execution_logs(execution_id)
+            )
+
+    def test_finish_execution_sync(self):
+        execution_id = self.create_execution().id
+
+        utils.finish_execution(execution_id, False, {'output': 'failed'})
+
+        execution = db_api.get_execution(execution_id)
+        self.assertEqual(status.FAILED, execution.status)
+        self.assertEqual({'output': 'failed'}, execution.result)
+
+    def test_finish_execution_buffer_disabled(self):
+        self.override_config('execution_result_flush_interval', 0, 'engine')
+        execution_id = self.create_execution().id
+
+        utils.finish_execution(execution_id, True, {'output': 'ok'},
+                               is_sync=False)
+
+        self.assertEqual(status.SUCCESS,
+                         db_api.get_execution(execution_id).status)
+
+    def test_add_batch_size(self):
+        self.override_config('execution_result_batch_size', 2, 'engine')
+
+        self.buffer.add('execution_1', status.SUCCESS, '', {})
+        self.assertFalse(self.buffer._full.is_set())
+        self.buffer.add('execution_2', status.SUCCESS, '', {})
+        self.assertTrue(self.buffer._full.is_set())
+
+        self.buffer._start.assert_called_once_with()
+
+    def test_flush_failed(self):
+        execution_id = self.create_execution().id
+        self.buffer.add(execution_id, status.SUCCESS, 'log', {})
+        self.buffer.add('invalid', status.SUCCESS, '', {})
+        update_executions_status = db_api.update_executions_status
+
+        def _update(values, logs=None):
+            if 'invalid' in values:
+                raise exc.DBError('Failed.')
+            update_executions_status(values, logs=logs)
+
+        with mock.patch.object(db_api, 'update_executions_status',
+                               side_effect=_update) as update_mock:
+            self.buffer.flush()
+
+        # The batch, then the executions one by one.
+        self.assertEqual(3, update_mock.call_count)
+        self.assertEqual(status.SUCCESS,
+                         db_api.get_execution(execution_id).status)
+        self.assertEqual(b'log', db_api.get_execution_logs(execution_id))
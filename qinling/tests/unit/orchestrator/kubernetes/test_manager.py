@@ -18,6 +18,7 @@ import yaml
 
 import mock
 from oslo_config import cfg
+import requests
 
 from qinling import config
 from qinling import exceptions as exc
@@ -192,7 +193,7 @@ class TestKubernetesManager(base.DbTestCase):
 
         self.assertRaisesRegex(
             exc.OrchestratorException,
-            "^Deployment %s not ready\.$" % fake_deployment_name,
+            r"^Deployment %s not ready\.$" % fake_deployment_name,
             self.manager.create_pool,
             fake_deployment_name, fake_image)
         self.assertLess(
@@ -301,6 +302,27 @@ class TestKubernetesManager(base.DbTestCase):
         expected = {"total": 3, "available": 1}
         self.assertEqual(expected, pool_info)
 
+    @mock.patch('qinling.orchestrator.kubernetes.pod_cache.PodCache')
+    def test_get_pool_pod_cache(self, mock_cache):
+        self.override_config('enable_pod_cache', True,
+                             config.KUBERNETES_GROUP)
+        manager = k8s_manager.KubernetesManager(self.conf,
+                                                self.qinling_endpoint)
+        mock_cache.return_value.start.assert_called_once_with()
+        mock_cache.return_value.get_pods.return_value = [mock.Mock()] * 2
+        fake_deployment_name = self.rand_name('deployment', prefix=self.prefix)
+        ret = mock.Mock()
+        ret.status.replicas = 3
+        self.k8s_v1_ext.read_namespaced_deployment.return_value = ret
+
+        pool_info = manager.get_pool(fake_deployment_name)
+
+        self.assertEqual({"total": 3, "available": 2}, pool_info)
+        mock_cache.return_value.get_pods.assert_called_once_with(
+            {'runtime_id': fake_deployment_name}, bound=False
+        )
+        self.k8s_v1_api.list_namespaced_pod.assert_not_called()
+
     def test_get_pool_not_ready(self):
         fake_deployment_name = self.rand_name('deployment', prefix=self.prefix)
 
@@ -483,7 +505,7 @@ class TestKubernetesManager(base.DbTestCase):
 
         self.assertRaisesRegex(
             exc.OrchestratorException,
-            "^Execution preparation failed\.$",
+            r"^Execution preparation failed\.$",
             self.manager.prepare_execution,
             function_id, 0, rlimit=None, image=None,
             identifier=runtime_id, labels=labels)
@@ -548,7 +570,7 @@ class TestKubernetesManager(base.DbTestCase):
         ) as delete_function_mock:
             self.assertRaisesRegex(
                 exc.OrchestratorException,
-                '^Execution preparation failed\.$',
+                r'^Execution preparation failed\.$',
                 self.manager.prepare_execution,
                 function_id, 0, rlimit=None, image=None, identifier=runtime_id,
                 labels={'runtime_id': runtime_id})
@@ -588,6 +610,160 @@ class TestKubernetesManager(base.DbTestCase):
             'http://%s:%s' % (SERVICE_ADDRESS_INTERNAL, SERVICE_PORT),
             service_url)
 
+    def test_prepare_execution_service_pod_node(self):
+        self.override_config('service_address_type', 'pod_node',
+                             config.KUBERNETES_GROUP)
+        pod = mock.Mock()
+        pod.metadata.name = self.rand_name('pod', prefix=self.prefix)
+        pod.metadata.labels = {'pod1_key1': 'pod1_value1'}
+        pod.spec.node_name = 'node-2'
+        list_pod_ret = mock.Mock()
+        list_pod_ret.items = [pod]
+        self.k8s_v1_api.list_namespaced_pod.return_value = list_pod_ret
+        self.k8s_v1_api.create_namespaced_service.return_value = (
+            self._create_service()
+        )
+        nodes = self._create_nodes_with_external_ip()
+        nodes.items[0].metadata.name = 'node-1'
+        nodes.items.append(self._create_nodes_with_internal_ip().items[0])
+        nodes.items[1].metadata.name = 'node-2'
+        self.k8s_v1_api.list_node.return_value = nodes
+        runtime_id = common.generate_unicode_uuid()
+
+        for _ in range(2):
+            _, service_url = self.manager.prepare_execution(
+                common.generate_unicode_uuid(), 0, rlimit=None, image=None,
+                identifier=runtime_id, labels={'runtime_id': runtime_id})
+
+            self.assertEqual(
+                'http://%s:%s' % (SERVICE_ADDRESS_INTERNAL, SERVICE_PORT),
+                service_url)
+
+        # The node addresses are cached.
+        self.k8s_v1_api.list_node.assert_called_once_with()
+        # The requests are not forwarded to other nodes.
+        service_body = (
+            self.k8s_v1_api.create_namespaced_service.call_args[0][1]
+        )
+        self.assertEqual('Local',
+                         service_body['spec']['externalTrafficPolicy'])
+
+    def test_prepare_execution_service_cluster_ip(self):
+        self.override_config('service_address_type', 'cluster_ip',
+                             config.KUBERNETES_GROUP)
+        pod = mock.Mock()
+        pod.metadata.name = self.rand_name('pod', prefix=self.prefix)
+        pod.metadata.labels = {'pod1_key1': 'pod1_value1'}
+        list_pod_ret = mock.Mock()
+        list_pod_ret.items = [pod]
+        self.k8s_v1_api.list_namespaced_pod.return_value = list_pod_ret
+        service = self._create_service()
+        service.spec.cluster_ip = '10.96.0.10'
+        service.spec.ports[0].port = 9090
+        self.k8s_v1_api.create_namespaced_service.return_value = service
+        runtime_id = common.generate_unicode_uuid()
+        function_id = common.generate_unicode_uuid()
+
+        _, service_url = self.manager.prepare_execution(
+            function_id, 0, rlimit=None, image=None, identifier=runtime_id,
+            labels={'runtime_id': runtime_id})
+
+        self.assertEqual('http://10.96.0.10:9090', service_url)
+        self.k8s_v1_api.list_node.assert_not_called()
+
+    def test_prepare_execution_pod_ip(self):
+        self.override_config('service_address_type', 'pod_ip',
+                             config.KUBERNETES_GROUP)
+        pod = mock.Mock()
+        pod.metadata.name = self.rand_name('pod', prefix=self.prefix)
+        pod.metadata.labels = {'pod1_key1': 'pod1_value1'}
+        pod.status.pod_ip = '10.0.0.1'
+        list_pod_ret = mock.Mock()
+        list_pod_ret.items = [pod]
+        self.k8s_v1_api.list_namespaced_pod.return_value = list_pod_ret
+        runtime_id = common.generate_unicode_uuid()
+        function_id = common.generate_unicode_uuid()
+
+        pod_name, service_url = self.manager.prepare_execution(
+            function_id, 0, rlimit=None, image=None, identifier=runtime_id,
+            labels={'runtime_id': runtime_id})
+
+        self.assertEqual(pod.metadata.name, pod_name)
+        self.assertEqual('http://10.0.0.1:9090', service_url)
+        self.assertEqual(1, self.k8s_v1_api.patch_namespaced_pod.call_count)
+        self.k8s_v1_api.create_namespaced_service.assert_not_called()
+        self.k8s_v1_api.list_node.assert_not_called()
+
+    def _prepare_execution_prefetch(self, post_side_effect=None):
+        self.override_config('service_address_type', 'pod_ip',
+                             config.KUBERNETES_GROUP)
+        pod = mock.Mock()
+        pod.metadata.name = self.rand_name('pod', prefix=self.prefix)
+        pod.metadata.labels = {}
+        pod.status.pod_ip = '10.0.0.1'
+        list_pod_ret = mock.Mock()
+        list_pod_ret.items = [pod]
+        self.k8s_v1_api.list_namespaced_pod.return_value = list_pod_ret
+        self.manager.session = mock.Mock()
+        self.manager.session.post.side_effect = post_side_effect
+        function_id = common.generate_unicode_uuid()
+
+        _, service_url = self.manager.prepare_execution(
+            function_id, 0, rlimit=None, image=None, identifier='runtime',
+            labels={'runtime_id': 'runtime'}, md5sum='fake_md5')
+
+        self.assertEqual('http://10.0.0.1:9090', service_url)
+        return function_id
+
+    def test_prepare_execution_prefetch_package(self):
+        self.override_config('prefetch_function_package', True,
+                             config.ENGINE_GROUP)
+
+        function_id = self._prepare_execution_prefetch()
+
+        self.manager.session.post.assert_called_once_with(
+            'http://10.0.0.1:9090/prefetch',
+            json={
+                'download_url': 'http://127.0.0.1:7070/v1/functions/%s'
+                                '?download=true' % function_id,
+                'function_id': function_id,
+                'package_md5': 'fake_md5'
+            },
+            timeout=(3, 3)
+        )
+
+    def test_prepare_execution_prefetch_package_failed(self):
+        self.override_config('prefetch_function_package', True,
+                             config.ENGINE_GROUP)
+
+        # The failure is ignored.
+        self._prepare_execution_prefetch(
+            post_side_effect=requests.ConnectionError)
+        self.manager.session.post.assert_called_once_with(
+            mock.ANY, json=mock.ANY, timeout=(3, 3))
+
+    def test_prepare_execution_prefetch_package_disabled(self):
+        self._prepare_execution_prefetch()
+
+        self.manager.session.post.assert_not_called()
+
+    def test_get_worker_url(self):
+        pod_name = self.rand_name('pod', prefix=self.prefix)
+
+        self.assertIsNone(self.manager.get_worker_url(pod_name))
+
+        self.override_config('service_address_type', 'pod_ip',
+                             config.KUBERNETES_GROUP)
+        self.k8s_v1_api.read_namespaced_pod.return_value.status.pod_ip = (
+            '10.0.0.1'
+        )
+
+        self.assertEqual('http://10.0.0.1:9090',
+                         self.manager.get_worker_url(pod_name))
+        self.k8s_v1_api.read_namespaced_pod.assert_called_once_with(
+            pod_name, self.fake_namespace
+        )
+
     def test_run_execution_image_type_function(self):
         pod = mock.Mock()
         status = mock.Mock()
@@ -715,6 +891,38 @@ class TestKubernetesManager(base.DbTestCase):
             self.manager.session, 'FAKE_URL/execute', body=data
         )
 
+    @mock.patch('qinling.engine.utils.url_request')
+    def test_run_execution_reuse_module(self, mock_request):
+        self.override_config('reuse_function_module', True,
+                             config.ENGINE_GROUP)
+        mock_request.return_value = (True, 'fake output')
+        execution_id = common.generate_unicode_uuid()
+        function_id = common.generate_unicode_uuid()
+
+        self.manager.run_execution(
+            execution_id, function_id, 0, rlimit=self.rlimit,
+            service_url='FAKE_URL', timeout=3, md5sum='fake_md5'
+        )
+
+        data = mock_request.call_args[1]['body']
+        self.assertTrue(data['reuse_module'])
+        self.assertEqual('fake_md5', data['package_md5'])
+
+    @mock.patch('qinling.engine.utils.url_request')
+    def test_run_execution_package_md5(self, mock_request):
+        mock_request.return_value = (True, 'fake output')
+        execution_id = common.generate_unicode_uuid()
+        function_id = common.generate_unicode_uuid()
+
+        self.manager.run_execution(
+            execution_id, function_id, 0, rlimit=self.rlimit,
+            service_url='FAKE_URL', timeout=3, md5sum='fake_md5'
+        )
+
+        data = mock_request.call_args[1]['body']
+        self.assertNotIn('reuse_module', data)
+        self.assertEqual('fake_md5', data['package_md5'])
+
     def test_delete_function(self):
         # Deleting namespaced service is also tested in this.
         svc1 = mock.Mock()
@@ -842,7 +1050,7 @@ class TestKubernetesManager(base.DbTestCase):
 
         self.assertRaisesRegex(
             exc.OrchestratorException,
-            "^Not enough workers available\.$",
+            r"^Not enough workers available\.$",
             self.manager.scaleup_function,
             function_id, 0, identifier=runtime_id, count=2)
 
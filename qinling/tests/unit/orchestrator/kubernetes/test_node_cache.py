@@ -0,0 +1,79 @@
+# Copyright 2018 Catalyst IT Limited
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+import mock
+
+from qinling import exceptions as exc
+from qinling.orchestrator.kubernetes import node_cache
+from qinling.tests.unit import base
+
+
+def fake_node(name, addresses):
+    node = mock.Mock()
+    node.metadata.name = name
+    node.status.addresses = []
+    for addr_type, address in addresses:
+        addr = mock.Mock()
+        addr.type = addr_type
+        addr.address = address
+        node.status.addresses.append(addr)
+    return node
+
+
+class TestNodeAddressCache(base.BaseTest):
+    def setUp(self):
+        super(TestNodeAddressCache, self).setUp()
+
+        self.v1 = mock.Mock()
+        self.nodes = mock.Mock()
+        self.nodes.items = [
+            fake_node('node-1', [('InternalIP', '10.0.0.1')]),
+            fake_node('node-2', [('InternalIP', '10.0.0.2'),
+                                 ('ExternalIP', '1.2.3.4')]),
+        ]
+        self.v1.list_node.return_value = self.nodes
+
+        self.cache = node_cache.NodeAddressCache(self.v1, ttl=300)
+
+    def test_get_address(self):
+        self.assertEqual('10.0.0.1', self.cache.get_address())
+        self.assertEqual('1.2.3.4', self.cache.get_address('node-2'))
+        self.assertEqual('10.0.0.1', self.cache.get_address('node-1'))
+
+        self.v1.list_node.assert_called_once_with()
+
+    @mock.patch('time.time')
+    def test_get_address_expired(self, mock_time):
+        mock_time.return_value = 100
+        self.cache.get_address()
+        mock_time.return_value = 400
+
+        self.cache.get_address()
+
+        self.assertEqual(2, self.v1.list_node.call_count)
+
+    def test_get_address_new_node(self):
+        self.cache.get_address()
+        self.nodes.items.append(fake_node('node-3', [('InternalIP',
+                                                      '10.0.0.3')]))
+
+        self.assertEqual('10.0.0.3', self.cache.get_address('node-3'))
+        self.assertEqual(2, self.v1.list_node.call_count)
+
+    def test_get_address_node_not_found(self):
+        self.assertEqual('10.0.0.1', self.cache.get_address('node-4'))
+
+    def test_get_address_no_address(self):
+        self.nodes.items = [fake_node('node-1', [])]
+
+        self.assertRaises(exc.OrchestratorException, self.cache.get_address)
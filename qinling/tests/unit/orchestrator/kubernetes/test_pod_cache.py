@@ -0,0 +1,126 @@
+# Copyright 2018 Catalyst IT Limited
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+import mock
+
+from qinling.orchestrator.kubernetes import pod_cache
+from qinling.tests.unit import base
+
+
+def fake_pod(name, labels, resource_version='1'):
+    pod = mock.Mock()
+    pod.metadata.name = name
+    pod.metadata.labels = labels
+    pod.metadata.resource_version = resource_version
+    pod.metadata.deletion_timestamp = None
+    return pod
+
+
+class TestPodCache(base.BaseTest):
+    def setUp(self):
+        super(TestPodCache, self).setUp()
+
+        self.v1 = mock.Mock()
+        self.pods = [
+            fake_pod('pod-1', {'runtime_id': 'r1'}),
+            fake_pod('pod-2', {'runtime_id': 'r1', 'function_id': 'f1',
+                               'function_version': '0'}),
+            fake_pod('pod-3', {'runtime_id': 'r2'}),
+        ]
+        ret = mock.Mock()
+        ret.items = self.pods
+        ret.metadata.resource_version = '10'
+        self.v1.list_namespaced_pod.return_value = ret
+
+        self.cache = pod_cache.PodCache(self.v1, 'qinling')
+        self.cache._list()
+
+    def test_get_pods(self):
+        self.assertEqual(
+            ['pod-1', 'pod-2'],
+            [p.metadata.name
+             for p in self.cache.get_pods({'runtime_id': 'r1'})]
+        )
+        self.assertEqual(
+            [self.pods[0]],
+            self.cache.get_pods({'runtime_id': 'r1'}, bound=False)
+        )
+        self.assertEqual(
+            [self.pods[1]],
+            self.cache.get_pods({'function_id': 'f1',
+                                 'function_version': '0'})
+        )
+
+    def test_get_pods_skip_deleting_pods(self):
+        self.pods[0].metadata.deletion_timestamp = 'now'
+
+        self.assertEqual(
+            [], self.cache.get_pods({'runtime_id': 'r1'}, bound=False)
+        )
+
+    def test_update_ignore_older_pod(self):
+        self.cache.update(
+            fake_pod('pod-1', {'runtime_id': 'r1', 'function_id': 'f2'}, '5')
+        )
+        self.cache.update(fake_pod('pod-1', {'runtime_id': 'r1'}, '4'))
+
+        self.assertEqual(
+            [], self.cache.get_pods({'runtime_id': 'r1'}, bound=False)
+        )
+
+    @mock.patch('kubernetes.watch.Watch')
+    def test_watch_pods(self, mock_watch):
+        mock_watch.return_value.stream.return_value = [
+            {'type': 'ADDED', 'object': fake_pod('pod-4', {'runtime_id': 'r2'},
+                                                 '11')},
+            {'type': 'DELETED', 'object': fake_pod('pod-3', {}, '12')},
+            {'type': 'MODIFIED',
+             'object': fake_pod('pod-1', {'runtime_id': 'r1',
+                                          'function_id': 'f2'}, '13')},
+        ]
+
+        self.cache._watch_pods()
+
+        mock_watch.return_value.stream.assert_called_once_with(
+            self.v1.list_namespaced_pod, 'qinling', resource_version='10',
+            timeout_seconds=300
+        )
+        self.assertEqual(
+            ['pod-4'],
+            [p.metadata.name
+             for p in self.cache.get_pods({'runtime_id': 'r2'})]
+        )
+        self.assertEqual(
+            [], self.cache.get_pods({'runtime_id': 'r1'}, bound=False)
+        )
+        self.assertEqual('13', self.cache._resource_version)
+
+    @mock.patch('time.sleep', mock.Mock())
+    @mock.patch('kubernetes.watch.Watch')
+    def test_run_relist_after_watch_error(self, mock_watch):
+        def stream(*args, **kwargs):
+            if kwargs['resource_version'] is None:
+                self.fail('Watch should not start before relisting.')
+
+            if self.v1.list_namespaced_pod.call_count == 1:
+                yield {'type': 'ERROR', 'object': None,
+                       'raw_object': {'code': 410}}
+            else:
+                self.cache._stopped = True
+
+        mock_watch.return_value.stream.side_effect = stream
+
+        self.cache._run()
+
+        self.assertEqual(2, self.v1.list_namespaced_pod.call_count)
+        self.assertEqual(2, mock_watch.return_value.stream.call_count)
@@ -69,7 +69,8 @@ class TestPeriodics(base.DbTestCase):
         # of the function, it is updated as a new version is created. So the
         # call to get_service_url with version 0 should return None as there is
         # not any worker for function version 0.
-        def mock_srv_url_side_effect(function_id, function_version):
+        def mock_srv_url_side_effect(function_id, function_version,
+                                     cached=False):
             return 'http://localhost:37718' if function_version != 0 else None
 
         mock_srv_url.side_effect = mock_srv_url_side_effect
@@ -197,3 +198,25 @@ class TestPeriodics(base.DbTestCase):
         db_execs = db_api.get_executions(function_id=function_id,
                                          function_version=1)
         self.assertEqual(2, len(db_execs))
+
+    @mock.patch('qinling.utils.etcd_util.get_execution_purge_lock')
+    def test_handle_execution_purge_error(self, mock_lock):
+        lock = mock_lock.return_value.__enter__.return_value
+        lock.is_acquired.return_value = True
+        purger = mock.Mock()
+        purger.purge.side_effect = Exception('DB error')
+
+        periodics.handle_execution_purge(purger)
+
+        purger.stats.assert_called_once_with()
+
+    @mock.patch('qinling.utils.etcd_util.get_execution_purge_lock')
+    def test_handle_execution_purge_lock_not_acquired(self, mock_lock):
+        lock = mock_lock.return_value.__enter__.return_value
+        lock.is_acquired.return_value = False
+        purger = mock.Mock()
+
+        periodics.handle_execution_purge(purger)
+
+        mock_lock.assert_called_once_with(CONF.execution_retention.interval)
+        purger.purge.assert_not_called()
@@ -12,8 +12,12 @@
 #    See the License for the specific language governing permissions and
 #    limitations under the License.
 
+import io
 import mock
 import os
+import shutil
+import tempfile
+import zipfile
 
 from oslo_config import cfg
 
@@ -35,18 +39,22 @@ class TestFileSystemStorage(base.BaseTest):
         self.project_id = base.DEFAULT_PROJECT_ID
         self.storage = file_system.FileSystemStorage(CONF)
 
-    @mock.patch('oslo_utils.fileutils.ensure_tree')
-    @mock.patch('os.rename')
-    @mock.patch('qinling.storage.file_system.open')
-    @mock.patch('zipfile.is_zipfile')
-    def test_store(self, is_zipfile_mock, open_mock, rename_mock,
-                   ensure_tree_mock):
-        is_zipfile_mock.return_value = True
-        fake_fd = mock.Mock()
-        open_mock.return_value.__enter__.return_value = fake_fd
+    def _make_storage_dir(self):
+        storage_path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, storage_path)
+        self.storage.base_path = storage_path
+        return os.path.join(storage_path, self.project_id)
+
+    def _make_package(self):
+        data = io.BytesIO()
+        with zipfile.ZipFile(data, 'w') as zf:
+            zf.writestr('main.py', 'def main():\n    pass\n')
+        return data.getvalue()
+
+    def test_store(self):
+        project_path = self._make_storage_dir()
         function = self.rand_name('function', prefix='TestFileSystemStorage')
-        # For python3, data should be encoded into bytes before hashing.
-        function_data = "Some data".encode('utf8')
+        function_data = self._make_package()
         md5 = common.md5(content=function_data)
 
         package_updated, ret_md5 = self.storage.store(
@@ -55,28 +63,43 @@ class TestFileSystemStorage(base.BaseTest):
 
         self.assertTrue(package_updated)
         self.assertEqual(md5, ret_md5)
-
-        temp_package_path = os.path.join(FAKE_STORAGE_PATH, self.project_id,
-                                         '%s.zip.new' % function)
         package_path = os.path.join(
-            FAKE_STORAGE_PATH,
-            file_system.PACKAGE_PATH_TEMPLATE % (self.project_id, function,
-                                                 md5)
+            project_path, file_system.PACKAGE_NAME_TEMPLATE % (function, md5)
         )
-        ensure_tree_mock.assert_called_once_with(
-            os.path.join(FAKE_STORAGE_PATH, self.project_id)
+        with open(package_path, 'rb') as f:
+            self.assertEqual(function_data, f.read())
+        # The temporary file is renamed.
+        self.assertEqual([os.path.basename(package_path)],
+                         os.listdir(project_path))
+
+    @mock.patch('qinling.storage.file_system.CHUNK_SIZE', 10)
+    def test_store_file_object(self):
+        project_path = self._make_storage_dir()
+        function = self.rand_name('function', prefix='TestFileSystemStorage')
+        function_data = self._make_package()
+        md5 = common.md5(content=function_data)
+        package_file = mock.Mock(wraps=io.BytesIO(function_data))
+
+        package_updated, ret_md5 = self.storage.store(
+            self.project_id, function, package_file, md5sum=md5
         )
-        fake_fd.write.assert_called_once_with(function_data)
-        is_zipfile_mock.assert_called_once_with(temp_package_path)
-        rename_mock.assert_called_once_with(temp_package_path, package_path)
 
-    @mock.patch('oslo_utils.fileutils.ensure_tree')
-    @mock.patch('os.path.exists')
-    def test_store_zip_exists(self, exists_mock, ensure_tree_mock):
+        self.assertTrue(package_updated)
+        self.assertEqual(md5, ret_md5)
+        # Read in chunks instead of all at once.
+        package_file.read.assert_called_with(10)
+        package_path = os.path.join(
+            project_path, file_system.PACKAGE_NAME_TEMPLATE % (function, md5)
+        )
+        with open(package_path, 'rb') as f:
+            self.assertEqual(function_data, f.read())
+
+    def test_store_zip_exists(self):
+        project_path = self._make_storage_dir()
         function = self.rand_name('function', prefix='TestFileSystemStorage')
-        function_data = "Some data".encode('utf8')
+        function_data = self._make_package()
         md5 = common.md5(content=function_data)
-        exists_mock.return_value = True
+        self.storage.store(self.project_id, function, function_data)
 
         package_updated, ret_md5 = self.storage.store(
             self.project_id, function, function_data
@@ -84,58 +107,38 @@ class TestFileSystemStorage(base.BaseTest):
 
         self.assertFalse(package_updated)
         self.assertEqual(md5, ret_md5)
-
-        package_path = os.path.join(
-            FAKE_STORAGE_PATH,
-            file_system.PACKAGE_PATH_TEMPLATE % (self.project_id, function,
-                                                 md5)
+        self.assertEqual(
+            [file_system.PACKAGE_NAME_TEMPLATE % (function, md5)],
+            os.listdir(project_path)
         )
 
-        exists_mock.assert_called_once_with(package_path)
-
-    @mock.patch('oslo_utils.fileutils.ensure_tree')
-    def test_store_md5_mismatch(self, ensure_tree_mock):
+    def test_store_md5_mismatch(self):
+        project_path = self._make_storage_dir()
         function = self.rand_name('function', prefix='TestFileSystemStorage')
-        # For python3, data should be encoded into bytes before hashing.
-        function_data = "Some data".encode('utf8')
+        function_data = self._make_package()
         not_a_md5sum = "Not a md5sum"
 
         self.assertRaisesRegex(
             exc.InputException,
-            "^Package md5 mismatch\.$",
+            r"^Package md5 mismatch\.$",
             self.storage.store,
             self.project_id, function, function_data, md5sum=not_a_md5sum)
 
-        ensure_tree_mock.assert_called_once_with(
-            os.path.join(FAKE_STORAGE_PATH, self.project_id))
+        self.assertEqual([], os.listdir(project_path))
 
-    @mock.patch('oslo_utils.fileutils.delete_if_exists')
-    @mock.patch('oslo_utils.fileutils.ensure_tree')
-    @mock.patch('qinling.storage.file_system.open')
-    @mock.patch('zipfile.is_zipfile')
-    def test_store_invalid_zip_package(
-        self, is_zipfile_mock, open_mock,
-        ensure_tree_mock, delete_if_exists_mock
-    ):
-        is_zipfile_mock.return_value = False
-        fake_fd = mock.Mock()
-        open_mock.return_value.__enter__.return_value = fake_fd
+    def test_store_invalid_zip_package(self):
+        project_path = self._make_storage_dir()
         function = self.rand_name('function', prefix='TestFileSystemStorage')
         # For python3, data should be encoded into bytes before hashing.
         function_data = "Some data".encode('utf8')
 
         self.assertRaisesRegex(
             exc.InputException,
-            "^Package is not a valid ZIP package\.$",
+            r"^Package is not a valid ZIP package\.$",
             self.storage.store,
             self.project_id, function, function_data)
 
-        ensure_tree_mock.assert_called_once_with(
-            os.path.join(FAKE_STORAGE_PATH, self.project_id))
-        fake_fd.write.assert_called_once_with(function_data)
-        delete_if_exists_mock.assert_called_once_with(
-            os.path.join(FAKE_STORAGE_PATH, self.project_id,
-                         '%s.zip.new' % function))
+        self.assertEqual([], os.listdir(project_path))
 
     @mock.patch('os.path.exists')
     @mock.patch('qinling.storage.file_system.open')
@@ -163,7 +166,7 @@ class TestFileSystemStorage(base.BaseTest):
 
         self.assertRaisesRegex(
             exc.StorageNotFoundException,
-            "^Package of function %s for project %s not found\.$" % (
+            r"^Package of function %s for project %s not found\.$" % (
                 function, self.project_id),
             self.storage.retrieve,
             self.project_id,
@@ -0,0 +1,77 @@
+# Copyright 2018 Catalyst IT Limited
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+import mock
+
+from qinling.db import api as db_api
+from qinling.tests.unit import base
+from qinling.utils import counters
+
+
+class TestCounters(base.DbTestCase):
+    def setUp(self):
+        super(TestCounters, self).setUp()
+
+        self.buffer = counters.CounterBuffer()
+        # Flush the counts in the test explicitly.
+        self.buffer._start = mock.Mock()
+        patcher = mock.patch.object(counters, 'BUFFER', self.buffer)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.function_id = self.create_function().id
+        db_api.increase_function_version(self.function_id, 0)
+
+    def test_increase_function_count_atomic(self):
+        for _ in range(3):
+            counters.increase_function_count(self.function_id)
+        counters.increase_function_count(self.function_id, version=1)
+
+        self.assertEqual(3, db_api.get_function(self.function_id).count)
+        self.assertEqual(
+            1, db_api.get_function_version(self.function_id, 1).count
+        )
+
+    def test_increase_function_count_buffered(self):
+        self.override_config('execution_count_mode', 'buffered', 'api')
+
+        for _ in range(3):
+            counters.increase_function_count(self.function_id)
+        counters.increase_function_count(self.function_id, version=1)
+
+        self.assertEqual(0, db_api.get_function(self.function_id).count)
+        self.buffer._start.assert_called_once_with()
+
+        with mock.patch.object(db_api, 'increase_function_count',
+                               wraps=db_api.increase_function_count) as m:
+            self.buffer.flush()
+
+        self.assertEqual(2, m.call_count)
+        self.assertEqual(3, db_api.get_function(self.function_id).count)
+        self.assertEqual(
+            1, db_api.get_function_version(self.function_id, 1).count
+        )
+
+    @mock.patch('qinling.db.api.increase_function_count')
+    def test_flush_failed(self, mock_increase):
+        mock_increase.side_effect = [Exception(), True]
+        self.buffer.add(self.function_id)
+        self.buffer.add(self.function_id)
+
+        self.buffer.flush()
+        self.buffer.flush()
+
+        self.assertEqual(
+            [mock.call(self.function_id, version=0, count=2)] * 2,
+            mock_increase.call_args_list
+        )
@@ -0,0 +1,172 @@
+# Copyright 2018 Catalyst IT Limited
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+import base64
+import json
+
+import mock
+import six
+
+from qinling.tests.unit import base
+from qinling.utils import etcd_util
+
+
+def _b64(data):
+    return base64.b64encode(data.encode('utf-8')).decode('utf-8')
+
+
+def _kv(key, value, revision):
+    return {'key': _b64(key), 'value': _b64(value),
+            'mod_revision': str(revision)}
+
+
+def _line(result):
+    return json.dumps({'result': result}).encode('utf-8')
+
+
+class TestKeyMirror(base.BaseTest):
+    def setUp(self):
+        super(TestKeyMirror, self).setUp()
+
+        self.client = mock.Mock()
+        self.client.get_url.side_effect = lambda path: path
+        self.client.post.return_value = {
+            'header': {'revision': '10'},
+            'kvs': [
+                _kv('f1_0/worker_a', 'a', 5),
+                _kv('f1_0/url_a', 'http://10.0.0.1:9090', 6),
+                _kv('f1_0/service_url', 'http://f1', 7),
+                _kv('/locks/f1_0', 'lease', 8),
+            ]
+        }
+        self.mirror = etcd_util.KeyMirror(self.client)
+
+    def _set_watch_lines(self, *lines):
+        response = mock.Mock()
+        response.iter_lines.return_value = lines
+        self.client.session.post.return_value = response
+
+    def test_load(self):
+        self.mirror._load()
+
+        self.assertEqual(['a'], self.mirror.get_prefix('f1_0/worker'))
+        self.assertEqual(['http://10.0.0.1:9090'],
+                         self.mirror.get_prefix('f1_0/url_'))
+        self.assertEqual('http://f1', self.mirror.get('f1_0/service_url'))
+        self.assertIsNone(self.mirror.get('f2_0/service_url'))
+        self.assertEqual([], self.mirror.get_prefix('f2_0/worker'))
+        self.assertEqual(10, self.mirror._revision)
+
+    def test_watch(self):
+        self.mirror._load()
+        self._set_watch_lines(
+            _line({'created': True}),
+            b'',
+            _line({'events': [
+                {'kv': _kv('f1_0/worker_b', 'b', 11)},
+                {'type': 'DELETE', 'kv': _kv('f1_0/worker_a', '', 12)},
+            ]}),
+        )
+
+        self.mirror._watch()
+
+        self.assertTrue(self.mirror.is_synced())
+        self.assertEqual(['b'], self.mirror.get_prefix('f1_0/worker'))
+        self.assertEqual(12, self.mirror._revision)
+        create_request = self.client.session.post.call_args[1]['json'][
+            'create_request']
+        self.assertEqual(11, create_request['start_revision'])
+
+    def test_watch_compacted(self):
+        self.mirror._load()
+        self._set_watch_lines(
+            _line({'created': True}),
+            _line({'compact_revision': '20', 'canceled': True}),
+        )
+
+        self.assertRaises(etcd_util.WatchCompacted, self.mirror._watch)
+
+    def test_run_reload_after_compaction(self):
+        self.mirror._load()
+        self._set_watch_lines(
+            _line({'created': True}),
+            _line({'compact_revision': '20', 'canceled': True}),
+        )
+
+        def _load():
+            # Stop after the keys are loaded again.
+            self.mirror._stop.set()
+            raise Exception('Stopped.')
+
+        with mock.patch.object(self.mirror, '_load', side_effect=_load):
+            self.mirror._run()
+
+        self.assertIsNone(self.mirror._revision)
+        self.assertFalse(self.mirror.is_synced())
+
+    def test_write_through(self):
+        self.mirror._load()
+
+        self.mirror.put('f1_0/worker_b', u'b')
+        self.mirror.put('f1_0/worker_c', b'c')
+        self.assertEqual(['a', 'b', 'c'],
+                         self.mirror.get_prefix('f1_0/worker'))
+        self.assertIsInstance(self.mirror.get('f1_0/worker_c'),
+                              six.text_type)
+
+        self.mirror.delete('f1_0/worker_a')
+        self.assertEqual(['b', 'c'], self.mirror.get_prefix('f1_0/worker'))
+
+        self.mirror.delete_prefix('f1_0/url_')
+        self.assertEqual([], self.mirror.get_prefix('f1_0/url_'))
+        self.assertEqual('http://f1', self.mirror.get('f1_0/service_url'))
+
+        self.mirror.delete_prefix('f1_0/')
+        self.assertIsNone(self.mirror.get('f1_0/service_url'))
+
+
+class TestEtcdUtil(base.BaseTest):
+    def setUp(self):
+        super(TestEtcdUtil, self).setUp()
+
+        self.client = mock.Mock()
+        self.client.get_prefix.return_value = [('etcd', {})]
+        self.mirror = mock.Mock()
+        self.mirror.get_prefix.return_value = ['mirror']
+
+        for name, value in (('CLIENT', self.client),
+                            ('MIRROR', self.mirror)):
+            patcher = mock.patch.object(etcd_util, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_get_workers_cached(self):
+        self.mirror.is_synced.return_value = True
+
+        self.assertEqual(['mirror'],
+                         etcd_util.get_workers('f1', cached=True))
+        self.assertEqual(['etcd'], etcd_util.get_workers('f1'))
+        self.client.get_prefix.assert_called_once_with('f1_0/worker')
+
+    def test_get_workers_cached_not_synced(self):
+        self.mirror.is_synced.return_value = False
+
+        self.assertEqual(['etcd'],
+                         etcd_util.get_workers('f1', cached=True))
+        self.mirror.get_prefix.assert_not_called()
+
+    def test_create_worker_write_through(self):
+        etcd_util.create_worker('f1', 'a', version=1)
+
+        self.client.create.assert_called_once_with('f1_1/worker_a', 'a')
+        self.mirror.put.assert_called_once_with('f1_1/worker_a', 'a')
@@ -15,9 +15,11 @@ CURRENT_VERSION = 'v1'
 
 EXECUTION_BY_JOB = 'Created by Job %s'
 EXECUTION_BY_WEBHOOK = 'Created by Webhook %s'
+EXECUTION_BY_BATCH = 'Created by Batch %s'
 
 PERIODIC_JOB_HANDLER = 'job_handler'
 PERIODIC_FUNC_MAPPING_HANDLER = 'function_mapping_handler'
+PERIODIC_EXECUTION_PURGER = 'execution_purger'
 
 PACKAGE_FUNCTION = 'package'
 SWIFT_FUNCTION = 'swift'
@@ -0,0 +1,92 @@
+# Copyright 2018 Catalyst IT Limited
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+import atexit
+import collections
+import os
+import threading
+
+from oslo_config import cfg
+from oslo_log import log as logging
+
+from qinling.db import api as db_api
+
+LOG = logging.getLogger(__name__)
+CONF = cfg.CONF
+
+
+class CounterBuffer(object):
+    """Aggregate the function invocation counts in memory.
+
+    The counts are written to the database periodically by a background
+    thread, one UPDATE statement per function or function version no matter
+    how many executions were created in the interval.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = collections.defaultdict(int)
+        self._pid = None
+        self._stop = threading.Event()
+
+    def add(self, function_id, version=0, count=1):
+        with self._lock:
+            self._counts[(function_id, version)] += count
+
+            # The API workers are forked after the module is imported.
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._start()
+
+    def flush(self):
+        with self._lock:
+            counts, self._counts = self._counts, collections.defaultdict(int)
+
+        for (function_id, version), count in counts.items():
+            try:
+                db_api.increase_function_count(function_id, version=version,
+                                               count=count)
+            except Exception:
+                LOG.exception(
+                    'Failed to increase count of function %s(version %s) by '
+                    '%s, will retry.', function_id, version, count
+                )
+                with self._lock:
+                    self._counts[(function_id, version)] += count
+
+    def stop(self):
+        self._stop.set()
+        self.flush()
+
+    def _start(self):
+        self._stop.clear()
+        thread = threading.Thread(target=self._run)
+        thread.daemon = True
+        thread.start()
+
+    def _run(self):
+        while not self._stop.wait(CONF.api.execution_count_flush_interval):
+            self.flush()
+
+
+BUFFER = CounterBuffer()
+atexit.register(BUFFER.stop)
+
+
+def increase_function_count(function_id, version=0, count=1):
+    """Increase the invocation count of the function or function version."""
+    if CONF.api.execution_count_mode == 'buffered':
+        BUFFER.add(function_id, version=version, count=count)
+    else:
+        db_api.increase_function_count(function_id, version=version,
+                                       count=count)
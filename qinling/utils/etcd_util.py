@@ -11,12 +11,219 @@
 #    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 #    See the License for the specific language governing permissions and
 #    limitations under the License.
+import base64
+import threading
 
 import etcd3gw
 from oslo_config import cfg
+from oslo_log import log as logging
+from oslo_serialization import jsonutils
+from requests import adapters
+import six
 
+LOG = logging.getLogger(__name__)
 CONF = cfg.CONF
 CLIENT = None
+MIRROR = None
+
+WATCH_RETRY_INTERVAL = 1
+
+
+class WatchCompacted(Exception):
+    pass
+
+
+def _encode(data):
+    if isinstance(data, six.text_type):
+        data = data.encode('utf-8')
+    return base64.b64encode(data).decode('utf-8')
+
+
+def _decode(data):
+    # The values are returned as text by etcd3gw, the mirror does the same.
+    return base64.b64decode(data).decode('utf-8')
+
+
+class KeyMirror(object):
+    """Keep a copy of the function keys of etcd in memory.
+
+    The keys are loaded with one range request and kept up to date by a
+    watch from the revision of the range request. The watch is resumed from
+    the last revision received if the stream is interrupted, the keys are
+    loaded again if that revision has been compacted. The mirror is not used
+    while it is out of sync.
+
+    The keys are grouped by function version, i.e. the "<function>_<version>"
+    part of the key, so that the keys of a function version are read without
+    going through all the keys.
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self._lock = threading.Lock()
+        self._functions = {}
+        self._revision = None
+        self._response = None
+        self._synced = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self.loads = 0
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run,
+                                        name='qinling-etcd-mirror')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._synced.clear()
+
+        response = self._response
+        if response is not None:
+            response.close()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def is_synced(self):
+        return self._synced.is_set()
+
+    def get(self, key):
+        function, _, name = key.partition('/')
+        with self._lock:
+            return self._functions.get(function, {}).get(name)
+
+    def get_prefix(self, prefix):
+        """Get the values of the keys with the prefix, sorted by key."""
+        function, _, name_prefix = prefix.partition('/')
+        with self._lock:
+            keys = self._functions.get(function, {})
+            return [keys[name] for name in sorted(keys)
+                    if name.startswith(name_prefix)]
+
+    def put(self, key, value):
+        if isinstance(value, six.binary_type):
+            value = value.decode('utf-8')
+
+        function, _, name = key.partition('/')
+        # The other keys in etcd, e.g. the locks.
+        if not function or not name:
+            return
+
+        with self._lock:
+            self._functions.setdefault(function, {})[name] = value
+
+    def delete(self, key):
+        function, _, name = key.partition('/')
+        with self._lock:
+            keys = self._functions.get(function)
+            if keys is not None:
+                keys.pop(name, None)
+                if not keys:
+                    del self._functions[function]
+
+    def delete_prefix(self, prefix):
+        function, _, name_prefix = prefix.partition('/')
+        with self._lock:
+            if not name_prefix:
+                self._functions.pop(function, None)
+                return
+
+            keys = self._functions.get(function, {})
+            for name in [n for n in keys if n.startswith(name_prefix)]:
+                del keys[name]
+
+    def _load(self):
+        result = self.client.post(
+            self.client.get_url('/kv/range'),
+            json={'key': _encode('\0'), 'range_end': _encode('\0')}
+        )
+
+        functions = {}
+        for kv in result.get('kvs', []):
+            function, _, name = _decode(kv['key']).partition('/')
+            if function and name:
+                functions.setdefault(function, {})[name] = _decode(
+                    kv.get('value', ''))
+
+        with self._lock:
+            self._functions = functions
+
+        self._revision = int(result['header']['revision'])
+        self.loads += 1
+        LOG.info('Loaded the function keys from etcd at revision %s.',
+                 self._revision)
+
+    def _apply(self, event):
+        kv = event['kv']
+        key = _decode(kv['key'])
+
+        if event.get('type') == 'DELETE':
+            self.delete(key)
+        else:
+            self.put(key, _decode(kv.get('value', '')))
+
+        self._revision = max(self._revision, int(kv['mod_revision']))
+
+    def _watch(self):
+        self._response = self.client.session.post(
+            self.client.get_url('/watch'),
+            json={
+                'create_request': {
+                    'key': _encode('\0'),
+                    'range_end': _encode('\0'),
+                    'start_revision': self._revision + 1
+                }
+            },
+            stream=True
+        )
+
+        try:
+            for line in self._response.iter_lines():
+                if self._stop.is_set():
+                    return
+                if not line:
+                    continue
+
+                result = jsonutils.loads(line.decode('utf-8'))
+                if 'error' in result:
+                    raise Exception(result['error'])
+
+                result = result.get('result', {})
+                if int(result.get('compact_revision', 0)):
+                    raise WatchCompacted()
+                if result.get('canceled'):
+                    raise Exception('The watch is canceled.')
+                if result.get('created'):
+                    self._synced.set()
+
+                for event in result.get('events', []):
+                    self._apply(event)
+        finally:
+            self._response.close()
+            self._response = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                if self._revision is None:
+                    self._load()
+                self._watch()
+            except WatchCompacted:
+                LOG.warning('Revision %s of etcd is compacted, loading the '
+                            'function keys again.', self._revision)
+                self._revision = None
+                self._synced.clear()
+                continue
+            except Exception:
+                if self._stop.is_set():
+                    return
+                LOG.exception('Failed to watch the function keys in etcd.')
+
+            self._synced.clear()
+            self._stop.wait(WATCH_RETRY_INTERVAL)
 
 
 def get_client(conf=None):
@@ -31,9 +238,43 @@ def get_client(conf=None):
                                 cert_cert=conf.etcd.cert_file,
                                 cert_key=conf.etcd.cert_key)
 
+        # Keep a connection to etcd for every thread using the client
+        # instead of the default 10.
+        adapter = adapters.HTTPAdapter(
+            pool_maxsize=conf.etcd.connection_pool_size
+        )
+        CLIENT.session.mount('http://', adapter)
+        CLIENT.session.mount('https://', adapter)
+
     return CLIENT
 
 
+def start_mirror():
+    """Start mirroring the function keys of etcd in memory."""
+    global MIRROR
+
+    if not MIRROR:
+        MIRROR = KeyMirror(get_client())
+        MIRROR.start()
+
+    return MIRROR
+
+
+def stop_mirror():
+    global MIRROR
+
+    if MIRROR:
+        MIRROR.stop()
+        MIRROR = None
+
+
+def _get_mirror(cached):
+    mirror = MIRROR
+    if cached and mirror and mirror.is_synced():
+        return mirror
+    return None
+
+
 def get_worker_lock(function_id, version=0):
     client = get_client()
     lock_id = "function_worker_%s_%s" % (function_id, version)
@@ -46,6 +287,15 @@ def get_function_version_lock(function_id):
     return client.lock(id=lock_id)
 
 
+def get_execution_purge_lock(ttl):
+    """Get the lock making only one engine purge the expired executions.
+
+    The lock expires after ttl seconds if the engine holding it dies.
+    """
+    client = get_client()
+    return client.lock(id='execution_purge', ttl=ttl)
+
+
 def create_worker(function_id, worker, version=0):
     """Create the worker info in etcd.
 
@@ -55,35 +305,85 @@ def create_worker(function_id, worker, version=0):
     # available orchestrator at the moment, the value of the worker param
     # is the name of the pod so it is unique.
     client = get_client()
-    client.create(
-        '%s_%s/worker_%s' % (function_id, version, worker),
-        worker
-    )
+    key = '%s_%s/worker_%s' % (function_id, version, worker)
+    client.create(key, worker)
+
+    # Visible to this process before the watch event is received.
+    if MIRROR:
+        MIRROR.put(key, worker)
 
 
 def delete_worker(function_id, worker, version=0):
     client = get_client()
-    client.delete('%s_%s/worker_%s' % (function_id, version, worker))
+    for key in ('%s_%s/worker_%s' % (function_id, version, worker),
+                '%s_%s/url_%s' % (function_id, version, worker)):
+        client.delete(key)
+        if MIRROR:
+            MIRROR.delete(key)
 
 
-def get_workers(function_id, version=0):
+def get_workers(function_id, version=0, cached=False):
+    """Get the workers of the function version.
+
+    :param cached: Optional. Read the workers from the local mirror of etcd
+        if it is in sync.
+    """
+    prefix = "%s_%s/worker" % (function_id, version)
+    mirror = _get_mirror(cached)
+    if mirror:
+        return mirror.get_prefix(prefix)
+
     client = get_client()
-    values = client.get_prefix("%s_%s/worker" % (function_id, version))
+    values = client.get_prefix(prefix)
     workers = [w[0] for w in values]
     return workers
 
 
+def create_worker_url(function_id, worker, url, version=0):
+    """Create the url to send requests to the worker directly."""
+    client = get_client()
+    key = '%s_%s/url_%s' % (function_id, version, worker)
+    client.create(key, url)
+
+    if MIRROR:
+        MIRROR.put(key, url)
+
+
+def get_worker_urls(function_id, version=0, cached=False):
+    prefix = "%s_%s/url_" % (function_id, version)
+    mirror = _get_mirror(cached)
+    if mirror:
+        return mirror.get_prefix(prefix)
+
+    client = get_client()
+    values = client.get_prefix(prefix)
+    urls = [w[0] for w in values]
+    return urls
+
+
 def delete_function(function_id, version=0):
     client = get_client()
     client.delete_prefix("%s_%s" % (function_id, version))
 
+    if MIRROR:
+        MIRROR.delete_prefix("%s_%s/" % (function_id, version))
+
 
 def create_service_url(function_id, url, version=0):
     client = get_client()
-    client.create('%s_%s/service_url' % (function_id, version), url)
+    key = '%s_%s/service_url' % (function_id, version)
+    client.create(key, url)
+
+    if MIRROR:
+        MIRROR.put(key, url)
+
 
+def get_service_url(function_id, version=0, cached=False):
+    key = '%s_%s/service_url' % (function_id, version)
+    mirror = _get_mirror(cached)
+    if mirror:
+        return mirror.get(key)
 
-def get_service_url(function_id, version=0):
     client = get_client()
-    values = client.get('%s_%s/service_url' % (function_id, version))
+    values = client.get(key)
     return None if not values else values[0]
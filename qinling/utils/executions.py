@@ -15,79 +15,37 @@ from oslo_log import log as logging
 from oslo_serialization import jsonutils
 
 from qinling.db import api as db_api
-from qinling.db.sqlalchemy import models
 from qinling import exceptions as exc
 from qinling import status
+from qinling.utils import common
 from qinling.utils import constants
+from qinling.utils import counters
 
 LOG = logging.getLogger(__name__)
 
 
-def _update_function_db(function_id, pre_count):
-    # Function update is done using UPDATE ... FROM ... WHERE
-    # non-locking clause.
-    while True:
-        modified = db_api.conditional_update(
-            models.Function,
-            {
-                'count': pre_count + 1,
-            },
-            {
-                'id': function_id,
-                'count': pre_count
-            },
-            insecure=True,
-        )
-        if not modified:
-            LOG.warning("Retrying to update function count.")
-            pre_count += 1
-            continue
-        else:
-            break
-
-
-def _update_function_version_db(version_id, pre_count):
-    # Update is done using UPDATE ... FROM ... WHERE non-locking clause.
-    while True:
-        modified = db_api.conditional_update(
-            models.FunctionVersion,
-            {
-                'count': pre_count + 1,
-            },
-            {
-                'id': version_id,
-                'count': pre_count
-            },
-            insecure=True,
-        )
-        if not modified:
-            LOG.warning("Retrying to update function version count.")
-            pre_count += 1
-            continue
-        else:
-            break
-
+def _get_function(params):
+    """Get the function and version to execute, validate them.
 
-def create_execution(engine_client, params):
+    :return: A tuple of the function id, version and runtime id.
+    """
     function_alias = params.get('function_alias')
     function_id = params.get('function_id')
     version = params.get('function_version', 0)
-    is_sync = params.get('sync', True)
-    input = params.get('input')
 
     if function_alias:
-        alias_db = db_api.get_function_alias(function_alias)
+        alias_db = db_api.get_function_alias(function_alias, cached=True)
         function_id = alias_db.function_id
         version = alias_db.function_version
         params.update({'function_id': function_id,
                        'version': version})
 
-    func_db = db_api.get_function(function_id)
+    func_db = db_api.get_function(function_id, cached=True)
     runtime_id = func_db.runtime_id
 
     # Image type function does not need runtime
     if runtime_id:
-        runtime_db = db_api.get_runtime(runtime_id)
+        runtime_db = db_api.get_runtime(runtime_id, cached=True)
         if runtime_db and runtime_db.status != status.AVAILABLE:
             raise exc.RuntimeNotAvailableException(
                 'Runtime %s is not available.' % func_db.runtime_id
@@ -100,25 +58,36 @@ def create_execution(engine_client, params):
                 constants.PACKAGE_FUNCTION
             )
 
-        # update version count
-        version_db = db_api.get_function_version(function_id, version)
-        pre_version_count = version_db.count
-        _update_function_version_db(version_db.id, pre_version_count)
-    else:
-        pre_count = func_db.count
-        _update_function_db(function_id, pre_count)
+        # Make sure the version exists.
+        db_api.get_function_version(function_id, version, cached=True)
+
+    return function_id, version, runtime_id
+
+
+def _get_function_input(input):
+    """Convert the input string to the value stored in db."""
+    try:
+        function_input = jsonutils.loads(input)
+        # If input is e.g. '6', result of jsonutils.loads is 6 which can
+        # not be stored in db.
+        if type(function_input) == int:
+            raise ValueError
+        return function_input
+    except ValueError:
+        return {'__function_input': input}
+
+
+def create_execution(engine_client, params):
+    is_sync = params.get('sync', True)
+    input = params.get('input')
+
+    function_id, version, runtime_id = _get_function(params)
+
+    counters.increase_function_count(function_id, version=version)
 
     # input in params should be a string.
     if input:
-        try:
-            function_input = jsonutils.loads(input)
-            # If input is e.g. '6', result of jsonutils.loads is 6 which can
-            # not be stored in db.
-            if type(function_input) == int:
-                raise ValueError
-            params['input'] = function_input
-        except ValueError:
-            params['input'] = {'__function_input': input}
+        params['input'] = _get_function_input(input)
 
     params.update({'status': status.RUNNING})
     db_model = db_api.create_execution(params)
@@ -146,3 +115,51 @@ def create_execution(engine_client, params):
         db_model = db_api.get_execution(db_model.id)
 
     return db_model
+
+
+def create_executions(engine_client, params, inputs):
+    """Create asynchronous executions of a function, one for every input.
+
+    The executions are inserted into the database and sent to the engine
+    all together.
+
+    :return: A tuple of the batch id and the list of the execution ids.
+    """
+    function_id, version, runtime_id = _get_function(params)
+    params.update({'function_id': function_id, 'function_version': version})
+    batch_id = common.generate_unicode_uuid()
+    description = (params.get('description') or
+                   constants.EXECUTION_BY_BATCH % batch_id)
+
+    counters.increase_function_count(function_id, version=version,
+                                     count=len(inputs))
+
+    executions = [
+        {
+            'id': common.generate_unicode_uuid(),
+            'function_id': function_id,
+            'function_version': version,
+            'description': description,
+            'sync': False,
+            'input': _get_function_input(input) if input else None,
+            'status': status.RUNNING
+        }
+        for input in inputs
+    ]
+    db_api.create_executions(executions)
+    execution_ids = [e['id'] for e in executions]
+
+    try:
+        engine_client.create_executions(
+            execution_ids, function_id, version, runtime_id,
+            inputs=[e['input'] for e in executions]
+        )
+    except exc.QinlingException:
+        # The executions are not sent to the engine.
+        LOG.exception('Failed to send the executions of batch %s.', batch_id)
+        with db_api.transaction():
+            for execution_id in execution_ids:
+                db_api.update_execution(execution_id,
+                                        {'status': status.ERROR})
+
+    return batch_id, execution_ids
@@ -18,14 +18,20 @@ import json
 from oslo_log import log as logging
 import pecan
 import six
+from six.moves.urllib import parse as urlparse
 import webob
 from wsme import exc as wsme_exc
+from wsme.rest import json as wsme_json
 
 from qinling import context
 from qinling import exceptions as exc
+from qinling.utils import common
 
 LOG = logging.getLogger(__name__)
 
+# Number of the records read from the database at a time when streaming a
+# resource list.
+STREAM_BATCH_SIZE = 100
 FILTER_TYPES = ('in', 'nin', 'eq', 'neq', 'gt', 'gte', 'lt', 'lte', 'has')
 LIST_VALUE_FILTER_TYPES = {'in', 'nin'}
 
@@ -146,3 +152,111 @@ def get_project_params(project_id, all_projects):
         all_projects = True
 
     return project_id, all_projects
+
+
+def get_fields(resource_cls, fields):
+    """Validate the fields requested for the resource.
+
+    :param fields: Optional. List of the fields requested, all the fields of
+        the resource are returned if not specified.
+    :return: List of the fields, the id is always included.
+    """
+    available = resource_cls.get_fields()
+    if not fields:
+        return available
+
+    invalid = set(fields) - set(available)
+    if invalid:
+        raise exc.InputException(
+            'Invalid field(s): %s' % ', '.join(sorted(invalid))
+        )
+
+    return ['id'] + [f for f in fields if f != 'id']
+
+
+def stream_resources(resource_cls, collection_name, get_func, fields,
+                     limit=None, marker=None, next_args=None, **filters):
+    """Serialize a resource list to JSON while reading it from the database.
+
+    The records are read in batches of STREAM_BATCH_SIZE with keyset
+    pagination (the last record of a batch is the marker of the next one),
+    so the memory used doesn't depend on the number of the records. Only the
+    columns of the given fields (plus the ones needed by the pagination) are
+    queried, the fields not stored in the database are skipped.
+
+    The returned generator is iterated after the controller returns, it
+    keeps the request context and url for itself.
+
+    :param get_func: DB API function with limit, marker and fields params,
+        records are sorted by created_at and id.
+    :param limit: Optional. Maximum number of the records returned, a link
+        to the next page is added if reached.
+    :param marker: Optional. The DB object after which the records start.
+    :param next_args: Optional. Dict of the query params kept in the link to
+        the next page.
+    """
+    ctx = context.get_ctx()
+    url = pecan.request.host_url + pecan.request.path
+    columns = fields + [c for c in ('created_at', 'id') if c not in fields]
+
+    def batch_size(count):
+        if limit is None:
+            return STREAM_BATCH_SIZE
+        return min(STREAM_BATCH_SIZE, limit - count)
+
+    # The first batch is read before the response is started, so that the
+    # invalid filters or database errors are still returned as errors.
+    first_rows = get_func(limit=batch_size(0), marker=marker, fields=columns,
+                          **filters)
+
+    def generate():
+        yield ('{"%s": [' % collection_name).encode('utf-8')
+
+        count = 0
+        last = marker
+        rows = first_rows
+        while True:
+            size = batch_size(count)
+
+            for row in rows:
+                values = dict((f, getattr(row, f)) for f in fields
+                              if hasattr(row, f))
+                common.datetime_to_str(values, 'created_at')
+                common.datetime_to_str(values, 'updated_at')
+                obj = resource_cls.from_dict(values)
+
+                item = json.dumps(wsme_json.tojson(resource_cls, obj))
+                yield ((', ' if count else '') + item).encode('utf-8')
+                count += 1
+
+            if len(rows) < size:
+                break
+            last = rows[-1]
+            if limit is not None and count >= limit:
+                break
+
+            old_ctx = context.get_ctx() if context.has_ctx() else None
+            context.set_ctx(ctx)
+            try:
+                rows = get_func(limit=batch_size(count), marker=last,
+                                fields=columns, **filters)
+            except Exception:
+                # The response has been started, the client gets a
+                # truncated JSON document.
+                LOG.exception('Failed to read the %s.', collection_name)
+                raise
+            finally:
+                context.set_ctx(old_ctx)
+
+        end = ']'
+        if limit is not None and count == limit:
+            args = dict(next_args or {}, limit=limit, marker=last.id)
+            query = urlparse.urlencode([
+                (k, v.encode('utf-8') if isinstance(v, six.text_type) else v)
+                for k, v in sorted(args.items())
+            ])
+            end += ', "next": %s' % json.dumps('%s?%s' % (url, query))
+
+        yield (end + '}').encode('utf-8')
+
+    return generate()
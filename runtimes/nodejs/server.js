@@ -39,6 +39,9 @@ function execute(req, res) {
     if (token) {
        requestData['token'] = token
     }
+    if (req.body.package_md5) {
+       requestData['package_md5'] = req.body.package_md5
+    }
 
     // download function package and unzip
     async function download(reqBody) {
@@ -98,7 +101,33 @@ function execute(req, res) {
     download(requestData).then(getHandler).then(run).then(succeed).catch(fail)
 }
 
+// The sidecar only listens on localhost, the prefetch requests of the
+// engine are forwarded to it.
+function prefetch(req, res) {
+    let options = {
+        uri: 'http://localhost:9091/prefetch',
+        method: 'POST',
+        headers: {
+            "content-type": "application/json",
+        },
+        body: {
+            'download_url': req.body.download_url,
+            'function_id': req.body.function_id,
+            'token': req.body.token,
+            'package_md5': req.body.package_md5
+        },
+        json: true,
+    }
+
+    rp(options).then(function () {
+        res.status(202).send("prefetching")
+    }).catch(function (error) {
+        res.status(error.statusCode || 500).send(String(error.message))
+    })
+}
+
 app.post('/execute', execute)
+app.post('/prefetch', prefetch)
 app.get('/ping', function ping(req, res) {
     res.status(200).send("pong")
 })
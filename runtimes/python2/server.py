@@ -12,12 +12,15 @@
 #    See the License for the specific language governing permissions and
 #    limitations under the License.
 
+import cPickle as pickle
 import importlib
 import json
-from multiprocessing import Manager
+import mmap
+from multiprocessing import Pipe
 from multiprocessing import Process
 import os
 import resource
+import struct
 import sys
 import time
 import traceback
@@ -37,6 +40,9 @@ INVOKE_ERROR = "Function execution failed because of too much resource " \
                "consumption"
 TIMEOUT_ERROR = "Function execution timeout."
 
+# The result smaller than this is sent through the pipe directly.
+PIPE_RESULT_SIZE = 65536
+
 
 def _print_trace():
     exc_type, exc_value, exc_traceback = sys.exc_info()
@@ -86,8 +92,37 @@ def _killtree(pid, including_parent=True):
         parent.kill()
 
 
+def _send_result(conn, buf, return_dict):
+    """Send the execution result to the parent process.
+
+    The result is pickled and sent through the pipe if it's small, otherwise
+    it's written to the shared memory buffer and only its size is sent.
+    """
+    try:
+        data = pickle.dumps(return_dict, pickle.HIGHEST_PROTOCOL)
+    except Exception as e:
+        data = pickle.dumps({'success': False, 'result': str(e)})
+
+    if PIPE_RESULT_SIZE < len(data) <= len(buf):
+        buf[:len(data)] = data
+        conn.send_bytes(b'B' + struct.pack('!Q', len(data)))
+    else:
+        conn.send_bytes(b'P' + data)
+
+
+def _recv_result(conn, buf):
+    """Receive the execution result sent by _send_result."""
+    msg = conn.recv_bytes()
+
+    if msg[:1] == b'B':
+        size = struct.unpack('!Q', msg[1:])[0]
+        return pickle.loads(buf[:size])
+
+    return pickle.loads(msg[1:])
+
+
 def _invoke_function(execution_id, zip_file_dir, module_name, method, arg,
-                     input, return_dict, rlimit):
+                     input, conn, buf, rlimit):
     """Thie function is supposed to be running in a child process.
 
     HOSTNAME will be used to create cgroup directory related to worker.
@@ -119,6 +154,7 @@ def _invoke_function(execution_id, zip_file_dir, module_name, method, arg,
 
     print('Start execution: %s' % execution_id)
 
+    return_dict = {'success': False}
     sys.path.insert(0, zip_file_dir)
     try:
         module = importlib.import_module(module_name)
@@ -136,6 +172,8 @@ def _invoke_function(execution_id, zip_file_dir, module_name, method, arg,
     finally:
         print('Finished execution: %s' % execution_id)
 
+    _send_result(conn, buf, return_dict)
+
 
 @app.route('/execute', methods=['POST'])
 def execute():
@@ -187,7 +225,8 @@ def execute():
         json={
             'download_url': download_url,
             'function_id': function_id,
-            'token': params.get('token')
+            'token': params.get('token'),
+            'package_md5': params.get('package_md5')
         }
     )
     if not resp.ok:
@@ -215,9 +254,11 @@ def execute():
     # Create a new process to run user's function
     #
     ####################################################################
-    manager = Manager()
-    return_dict = manager.dict()
-    return_dict['success'] = False
+    # The result is returned through a pipe, or a shared memory buffer sized
+    # by the function memory limit if it's large.
+    parent_conn, child_conn = Pipe(duplex=False)
+    buf = mmap.mmap(-1, int(rlimit['memory_size']))
+    return_dict = None
     start = time.time()
 
     # Run the function in a separate process to avoid messing up the log. If
@@ -225,15 +266,25 @@ def execute():
     p = Process(
         target=_invoke_function,
         args=(execution_id, zip_file_dir, function_module, function_method,
-              input.pop('__function_input', None), input, return_dict, rlimit)
+              input.pop('__function_input', None), input, child_conn, buf,
+              rlimit)
     )
 
-    timed_out = False
     p.start()
-    p.join(timeout)
+    child_conn.close()
+    timed_out = not parent_conn.poll(timeout)
+    if not timed_out:
+        try:
+            return_dict = _recv_result(parent_conn, buf)
+        except EOFError:
+            pass
+
+    p.join(0 if timed_out else timeout)
     if p.is_alive():
         _killtree(p.pid)
-        timed_out = True
+        p.join()
+    parent_conn.close()
+    buf.close()
 
     ####################################################################
     #
@@ -243,7 +294,7 @@ def execute():
     duration = round(time.time() - start, 3)
 
     # Process was killed unexpectedly or finished with error.
-    if p.exitcode != 0:
+    if return_dict is None:
         output = TIMEOUT_ERROR if timed_out else INVOKE_ERROR
         success = False
     else:
@@ -258,6 +309,29 @@ def execute():
     return _get_responce(output, duration, logs, success, 200)
 
 
+@app.route('/prefetch', methods=['POST'])
+def prefetch():
+    """Ask the sidecar to download the function package in background.
+
+    The sidecar only listens on localhost, the prefetch requests of the
+    engine are forwarded by the runtime.
+    """
+    params = request.get_json() or {}
+
+    resp = requests.post(
+        'http://localhost:9091/prefetch',
+        json={
+            'download_url': params.get('download_url'),
+            'function_id': params.get('function_id'),
+            'token': params.get('token'),
+            'package_md5': params.get('package_md5')
+        },
+        timeout=3
+    )
+
+    return Response(response=resp.content, status=resp.status_code)
+
+
 @app.route('/ping')
 def ping():
     return 'pong'
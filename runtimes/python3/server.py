@@ -13,15 +13,21 @@
 #    limitations under the License.
 
 import importlib
+import io
 import json
-from multiprocessing import Manager
+import mmap
+from multiprocessing import Pipe
 from multiprocessing import Process
 import os
+import pickle
 import resource
+import struct
 import sys
+import threading
 import time
 import traceback
 
+from flask import abort
 from flask import Flask
 from flask import request
 from flask import Response
@@ -37,6 +43,31 @@ INVOKE_ERROR = "Function execution failed because of too much resource " \
                "consumption"
 TIMEOUT_ERROR = "Function execution timeout."
 
+# The function module kept in the worker process in 'reuse module' mode, a
+# tuple of (cache key, module, sys.modules names and sys.path before import).
+_cached_module = None
+
+# Number of warm worker processes kept by each server process. uwsgi is
+# started with one thread per process, so one worker is enough by default.
+POOL_SIZE = int(os.getenv('QINLING_POOL_SIZE', 1))
+# A worker is replaced after running this many executions to release the
+# resources leaked by user functions, 0 means never.
+WORKER_MAX_TASKS = int(os.getenv('QINLING_WORKER_MAX_TASKS', 100))
+# Size of the shared memory buffer of each worker used to return the large
+# execution result, the default value is the maximum memory of function. The
+# memory is only allocated when it's used.
+RESULT_BUFFER_SIZE = int(os.getenv('QINLING_RESULT_BUFFER_SIZE', 134217728))
+# The result smaller than this is sent through the pipe directly.
+PIPE_RESULT_SIZE = 65536
+# Only the last LOG_SIZE bytes of the execution log are kept in memory, the
+# truncation marker is added at the beginning of the log if it's truncated.
+LOG_SIZE = int(os.getenv('QINLING_LOG_SIZE', 1048576))
+LOG_TRUNCATION_MARKER = os.getenv(
+    'QINLING_LOG_TRUNCATION_MARKER', 'true').lower() == 'true'
+# The log buffers are in shared memory so that they can be read by all the
+# server processes while the execution is running.
+LOG_DIR = '/dev/shm' if os.path.isdir('/dev/shm') else '/tmp'
+
 
 def _print_trace():
     exc_type, exc_value, exc_traceback = sys.exc_info()
@@ -86,9 +117,143 @@ def _killtree(pid, including_parent=True):
         parent.kill()
 
 
+def _cgroup_limit(rlimit):
+    """Set cpu and memory limits to cgroup by calling cglimit service."""
+    resp = requests.post(
+        'http://localhost:9092/cglimit',
+        json={
+            'cpu': rlimit['cpu'],
+            'memory_size': rlimit['memory_size'],
+            'pid': os.getpid()
+        }
+    )
+    return resp.ok
+
+
+def _get_os_session(auth_url, username, password, trust_id):
+    """Provide an openstack session to user's function."""
+    if not auth_url:
+        return None
+
+    auth = generic.Password(
+        username=username,
+        password=password,
+        auth_url=auth_url,
+        trust_id=trust_id,
+        user_domain_name='Default'
+    )
+    return session.Session(auth=auth, verify=False)
+
+
+class LogBuffer(object):
+    """A bounded ring buffer for the execution log.
+
+    The buffer is a memory mapped file in LOG_DIR, the header holds the
+    total number of bytes ever written so that the readers can tail the log
+    by offset while the execution is running.
+    """
+    HEADER = struct.Struct('!Q')
+
+    def __init__(self, execution_id, size=None, create=False):
+        self.path = os.path.join(LOG_DIR, 'qinling-%s.log' % execution_id)
+
+        try:
+            if create:
+                with open(self.path, 'wb') as f:
+                    f.truncate(self.HEADER.size + (size or LOG_SIZE))
+
+            with open(self.path, 'r+b') as f:
+                self._mm = mmap.mmap(f.fileno(), 0)
+        except Exception:
+            if create and os.path.exists(self.path):
+                os.remove(self.path)
+            raise
+        self.size = len(self._mm) - self.HEADER.size
+
+    @property
+    def total(self):
+        return self.HEADER.unpack_from(self._mm)[0]
+
+    def write(self, data):
+        total = self.total + len(data)
+        if len(data) > self.size:
+            data = data[-self.size:]
+
+        pos = (total - len(data)) % self.size
+        first = min(len(data), self.size - pos)
+        start = self.HEADER.size
+        self._mm[start + pos:start + pos + first] = data[:first]
+        self._mm[start:start + len(data) - first] = data[first:]
+
+        # The data is written before the header so that the readers never
+        # see the bytes not yet written.
+        self.HEADER.pack_into(self._mm, 0, total)
+
+    def read(self, offset=0):
+        """Read the log from offset.
+
+        Return a tuple of (data, the offset for the next read, the number of
+        bytes lost because they have been overwritten).
+        """
+        total = self.total
+        begin = max(offset, total - self.size, 0)
+        data = b''.join(self._read_range(begin, total))
+
+        # Drop the bytes overwritten by the writer during reading.
+        lost = max(self.total - self.size - begin, 0)
+        if lost:
+            data = data[lost:]
+            begin += lost
+
+        return data, total, max(begin - offset, 0)
+
+    def _read_range(self, begin, end):
+        start = self.HEADER.size
+        while begin < end:
+            pos = begin % self.size
+            length = min(end - begin, self.size - pos)
+            yield self._mm[start + pos:start + pos + length]
+            begin += length
+
+    def close(self, remove=False):
+        self._mm.close()
+        if remove:
+            os.remove(self.path)
+
+
+class LogWriter(io.TextIOBase):
+    """The file-like object used as sys.stdout of the execution."""
+
+    def __init__(self, log_buffer):
+        super(LogWriter, self).__init__()
+        self._log_buffer = log_buffer
+
+    def writable(self):
+        return True
+
+    def write(self, message):
+        self._log_buffer.write(message.encode('utf-8', 'replace'))
+        return len(message)
+
+
+def _release_module():
+    """Drop the cached function module and all the modules it imported."""
+    global _cached_module
+
+    if _cached_module is None:
+        return
+
+    _, _, modules, path = _cached_module
+    for name in set(sys.modules) - modules:
+        del sys.modules[name]
+    sys.path[:] = path
+
+    _cached_module = None
+
+
 def _invoke_function(execution_id, zip_file_dir, module_name, method, arg,
-                     input, return_dict, rlimit):
-    """Thie function is supposed to be running in a child process.
+                     input, rlimit, auth, cache_key=None):
+    """Thie function is supposed to be running in a worker process.
 
     HOSTNAME will be used to create cgroup directory related to worker.
 
@@ -97,31 +262,48 @@ def _invoke_function(execution_id, zip_file_dir, module_name, method, arg,
 
     Once executions exceed the cgroup limit, they will be killed by OOMKill
     and this subprocess will exit with number(-9).
+
+    The modules imported from the function package and the changes to
+    sys.path are reverted when the execution is finished, so that the next
+    execution in the same worker imports the function code from scratch.
+
+    If cache_key is provided('reuse module' mode), the function module is
+    kept in the worker process and reused by the following executions with
+    the same cache_key, i.e. the same function package.
     """
-    # Set resource limit for current sub-process
-    _set_ulimit()
+    global _cached_module
 
-    # Set cpu and memory limits to cgroup by calling cglimit service
-    pid = os.getpid()
-    root_resp = requests.post(
-        'http://localhost:9092/cglimit',
-        json={
-            'cpu': rlimit['cpu'],
-            'memory_size': rlimit['memory_size'],
-            'pid': pid
-        }
-    )
+    return_dict = {'success': False}
+    log_buffer = LogBuffer(execution_id)
+    sys.stdout = LogWriter(log_buffer)
 
-    sys.stdout = open("%s.out" % execution_id, "w")
+    if _cached_module is not None and _cached_module[0] != cache_key:
+        _release_module()
+    cached = _cached_module is not None
+    modules = set(sys.modules)
+    path = list(sys.path)
 
-    if not root_resp.ok:
-        print('WARN: Resource limiting failed, run in unlimit mode.')
+    try:
+        if not _cgroup_limit(rlimit):
+            print('WARN: Resource limiting failed, run in unlimit mode.')
+    except Exception as e:
+        print('WARN: Resource limiting failed, run in unlimit mode. '
+              'Error: %s' % str(e))
 
     print(('Start execution: %s' % execution_id))
 
-    sys.path.insert(0, zip_file_dir)
     try:
-        module = importlib.import_module(module_name)
+        input.update({'context': {'os_session': _get_os_session(**auth)}})
+
+        if cached:
+            module = _cached_module[1]
+        else:
+            sys.path.insert(0, zip_file_dir)
+            module = importlib.import_module(module_name)
+            if cache_key is not None:
+                _cached_module = (cache_key, module, modules, path)
+                cached = True
+
         func = getattr(module, method)
         return_dict['result'] = func(arg, **input) if arg else func(**input)
         return_dict['success'] = True
@@ -135,6 +317,205 @@ def _invoke_function(execution_id, zip_file_dir, module_name, method, arg,
         return_dict['success'] = False
     finally:
         print(('Finished execution: %s' % execution_id))
+        sys.stdout = sys.__stdout__
+        log_buffer.close()
+
+        if not cached:
+            for name in set(sys.modules) - modules:
+                del sys.modules[name]
+            sys.path[:] = path
+
+    return return_dict
+
+
+def _send_result(conn, buf, return_dict):
+    """Send the execution result to the server process.
+
+    The result is pickled and sent through the pipe if it's small, otherwise
+    it's written to the shared memory buffer and only its size is sent.
+    """
+    try:
+        data = pickle.dumps(return_dict, pickle.HIGHEST_PROTOCOL)
+    except Exception as e:
+        data = pickle.dumps({'success': False, 'result': str(e)})
+
+    if buf is not None and PIPE_RESULT_SIZE < len(data) <= len(buf):
+        buf[:len(data)] = data
+        conn.send_bytes(b'B' + struct.pack('!Q', len(data)))
+    else:
+        conn.send_bytes(b'P' + data)
+
+
+def _recv_result(conn, buf):
+    """Receive the execution result sent by _send_result."""
+    msg = conn.recv_bytes()
+
+    if msg[:1] == b'B':
+        size = struct.unpack('!Q', msg[1:])[0]
+        view = memoryview(buf)
+        try:
+            return pickle.loads(view[:size])
+        finally:
+            view.release()
+
+    return pickle.loads(msg[1:])
+
+
+def _worker_loop(conn, buf):
+    """Main loop of the worker process.
+
+    Receive the execution from the server process, run it and send back the
+    result, until the pipe is closed.
+    """
+    # Set resource limit for the worker process and its children.
+    _set_ulimit()
+
+    while True:
+        try:
+            task = conn.recv()
+        except EOFError:
+            break
+
+        if task is None:
+            break
+
+        _send_result(conn, buf, _invoke_function(**task))
+
+
+class Worker(object):
+    """A long-lived process running user's function one at a time."""
+
+    def __init__(self):
+        self.conn, child_conn = Pipe()
+        # Anonymous shared memory is inherited by the forked worker process.
+        self.buffer = (mmap.mmap(-1, RESULT_BUFFER_SIZE)
+                       if RESULT_BUFFER_SIZE else None)
+        self.process = Process(target=_worker_loop,
+                               args=(child_conn, self.buffer))
+        self.process.daemon = True
+        self.process.start()
+        child_conn.close()
+        self.tasks = 0
+
+    @property
+    def pid(self):
+        return self.process.pid
+
+    def is_alive(self):
+        return self.process.is_alive()
+
+    def run(self, task, timeout):
+        """Run the execution in the worker process.
+
+        Return a tuple of (result dict, timed_out). The result is None if the
+        worker process was killed or exited unexpectedly.
+        """
+        # The worker holding a function module is not recycled, otherwise
+        # the module would have to be imported again.
+        if task.get('cache_key') is None:
+            self.tasks += 1
+        self.conn.send(task)
+
+        if not self.conn.poll(timeout):
+            _killtree(self.pid)
+            self.process.join()
+            return None, True
+
+        try:
+            return _recv_result(self.conn, self.buffer), False
+        except EOFError:
+            self.process.join()
+            return None, False
+
+    def stop(self):
+        if self.is_alive():
+            try:
+                self.conn.send(None)
+            except (IOError, OSError):
+                pass
+            self.process.join(1)
+            if self.is_alive():
+                _killtree(self.pid)
+                self.process.join()
+        self.conn.close()
+        if self.buffer is not None:
+            self.buffer.close()
+
+
+class WorkerPool(object):
+    """A pool of pre-forked worker processes.
+
+    The worker process is reused by the following executions unless it's
+    killed because of timeout, crashed or has run WORKER_MAX_TASKS
+    executions, in which case a new worker is forked to replace it.
+    """
+
+    def __init__(self, size=POOL_SIZE, max_tasks=WORKER_MAX_TASKS):
+        self.size = size
+        self.max_tasks = max_tasks
+        self.pid = os.getpid()
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def fill(self):
+        with self._lock:
+            while len(self._idle) < self.size:
+                self._idle.append(Worker())
+
+    def acquire(self):
+        with self._lock:
+            while self._idle:
+                worker = self._idle.pop()
+                if worker.is_alive():
+                    return worker
+                worker.stop()
+
+        return Worker()
+
+    def release(self, worker):
+        expired = (not worker.is_alive() or
+                   (self.max_tasks and worker.tasks >= self.max_tasks))
+
+        with self._lock:
+            if not expired and len(self._idle) < self.size:
+                self._idle.append(worker)
+                return
+
+        worker.stop()
+
+    def shutdown(self):
+        with self._lock:
+            workers, self._idle = self._idle, []
+
+        for worker in workers:
+            worker.stop()
+
+
+_pool = None
+
+
+def get_pool():
+    """Get the worker pool of the current server process.
+
+    The pool is created lazily because uwsgi forks the server processes after
+    loading the application.
+    """
+    global _pool
+
+    if _pool is None or _pool.pid != os.getpid():
+        _pool = WorkerPool()
+
+    return _pool
+
+
+try:
+    from uwsgidecorators import postfork
+
+    @postfork
+    def _warm_pool():
+        get_pool().fill()
+except ImportError:
+    pass
 
 
 @app.route('/execute', methods=['POST'])
@@ -170,6 +551,12 @@ def execute():
     if entry:
         function_module, function_method = tuple(entry.rsplit('.', 1))
 
+    # The function module is reused until the function package is changed.
+    cache_key = None
+    if params.get('reuse_module'):
+        cache_key = (function_id, params.get('function_version', 0),
+                     params.get('package_md5'), function_module)
+
     print((
         'Request received, request_id: %s, execution_id: %s, input: %s, '
         'auth_url: %s' %
@@ -187,7 +574,8 @@ def execute():
         json={
             'download_url': download_url,
             'function_id': function_id,
-            'token': params.get('token')
+            'token': params.get('token'),
+            'package_md5': params.get('package_md5')
         }
     )
     if not resp.ok:
@@ -195,44 +583,41 @@ def execute():
 
     ####################################################################
     #
-    # Provide an openstack session to user's function
+    # Run user's function in a warm worker process
     #
     ####################################################################
-    os_session = None
-    if auth_url:
-        auth = generic.Password(
-            username=username,
-            password=password,
-            auth_url=auth_url,
-            trust_id=trust_id,
-            user_domain_name='Default'
-        )
-        os_session = session.Session(auth=auth, verify=False)
-    input.update({'context': {'os_session': os_session}})
+    task = {
+        'execution_id': execution_id,
+        'zip_file_dir': zip_file_dir,
+        'module_name': function_module,
+        'method': function_method,
+        'arg': input.pop('__function_input', None),
+        'input': input,
+        'rlimit': rlimit,
+        'cache_key': cache_key,
+        'auth': {
+            'auth_url': auth_url,
+            'username': username,
+            'password': password,
+            'trust_id': trust_id
+        }
+    }
 
-    ####################################################################
-    #
-    # Create a new process to run user's function
-    #
-    ####################################################################
-    manager = Manager()
-    return_dict = manager.dict()
-    return_dict['success'] = False
-    start = time.time()
-
-    # Run the function in a separate process to avoid messing up the log
-    p = Process(
-        target=_invoke_function,
-        args=(execution_id, zip_file_dir, function_module, function_method,
-              input.pop('__function_input', None), input, return_dict, rlimit)
-    )
+    pool = get_pool()
+    log_buffer = LogBuffer(execution_id, create=True)
 
-    timed_out = False
-    p.start()
-    p.join(timeout)
-    if p.is_alive():
-        _killtree(p.pid)
-        timed_out = True
+    # The log buffer is removed if no worker is available or the worker
+    # fails, otherwise it is left in LOG_DIR.
+    try:
+        worker = pool.acquire()
+        start = time.time()
+        try:
+            return_dict, timed_out = worker.run(task, timeout)
+        finally:
+            pool.release(worker)
+    except Exception:
+        log_buffer.close(remove=True)
+        raise
 
     ####################################################################
     #
@@ -242,7 +627,7 @@ def execute():
     duration = round(time.time() - start, 3)
 
     # Process was killed unexpectedly or finished with error.
-    if p.exitcode != 0:
+    if return_dict is None:
         output = TIMEOUT_ERROR if timed_out else INVOKE_ERROR
         success = False
     else:
@@ -250,11 +635,74 @@ def execute():
         success = return_dict['success']
 
     # Execution log
-    with open('%s.out' % execution_id) as f:
-        logs = f.read()
-    os.remove('%s.out' % execution_id)
+    data, _, truncated = log_buffer.read()
+    log_buffer.close(remove=True)
+    logs = data.decode('utf-8', 'replace')
+    if truncated and LOG_TRUNCATION_MARKER:
+        logs = '[%d bytes of log truncated]\n%s' % (truncated, logs)
+
+    resp = _get_responce(output, duration, logs, success, 200)
+    # Replace the killed or expired worker after the response is sent.
+    resp.call_on_close(pool.fill)
+
+    return resp
+
+
+@app.route('/logs/<execution_id>')
+def logs(execution_id):
+    """Get the log of a running execution.
+
+    :param offset: Optional. Return the log from this offset, the offset for
+        the next request is returned in the response.
+
+    Return 404 if the execution is not running in this worker any more.
+    """
+    offset = request.args.get('offset', 0, type=int)
+
+    try:
+        log_buffer = LogBuffer(execution_id)
+    except (IOError, OSError):
+        abort(404)
+
+    try:
+        data, next_offset, truncated = log_buffer.read(offset)
+    finally:
+        log_buffer.close()
+
+    return Response(
+        response=json.dumps(
+            {
+                'logs': data.decode('utf-8', 'replace'),
+                'offset': next_offset,
+                'truncated': truncated
+            }
+        ),
+        status=200,
+        mimetype='application/json'
+    )
+
+
+@app.route('/prefetch', methods=['POST'])
+def prefetch():
+    """Ask the sidecar to download the function package in background.
+
+    The sidecar only listens on localhost, the prefetch requests of the
+    engine are forwarded by the runtime.
+    """
+    params = request.get_json() or {}
+
+    resp = requests.post(
+        'http://localhost:9091/prefetch',
+        json={
+            'download_url': params.get('download_url'),
+            'function_id': params.get('function_id'),
+            'token': params.get('token'),
+            'package_md5': params.get('package_md5')
+        },
+        timeout=3
+    )
 
-    return _get_responce(output, duration, logs, success, 200)
+    return Response(response=resp.content, status=resp.status_code)
 
 
 @app.route('/ping')
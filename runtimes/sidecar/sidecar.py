@@ -12,9 +12,13 @@
 #    See the License for the specific language governing permissions and
 #    limitations under the License.
 
+import hashlib
 import logging
 import os
+import re
+import shutil
 import sys
+import threading
 import zipfile
 
 from flask import Flask
@@ -31,6 +35,18 @@ del app.logger.handlers[:]
 app.logger.addHandler(ch)
 
 DOWNLOAD_ERROR = "Failed to download function package from %s, error: %s"
+PACKAGE_DIR = '/var/qinling/packages'
+# The packages are stored by md5 in the cache directory, the package of a
+# function is linked to the cache as <function_id>.zip and <function_id>.
+CACHE_DIR = os.path.join(PACKAGE_DIR, '.cache')
+# Disk space in MB used by the packages not linked to any function, the
+# least recently used ones are deleted when exceeded.
+CACHE_SIZE = int(os.environ.get('QINLING_PACKAGE_CACHE_SIZE', 512))
+LOCK_PATH = '/var/lock/qinling'
+MD5_RE = re.compile('^[0-9a-f]{32}$')
+UUID_RE = re.compile(
+    '^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$'
+)
 
 
 def log(message, level="info"):
@@ -39,42 +55,224 @@ def log(message, level="info"):
     log_func(message)
 
 
-@lockutils.synchronized('download_function', external=True,
-                        lock_path='/var/lock/qinling')
+def _fetch(url, path, token=None, md5sum=None):
+    """Download url to path, check the md5 of the content if provided."""
+    headers = {}
+    if token:
+        headers = {'X-Auth-Token': token}
+
+    r = requests.get(url, headers=headers, stream=True, timeout=5,
+                     verify=False)
+    if r.status_code != 200:
+        raise Exception(r.content)
+
+    md5 = hashlib.md5()
+    with open(path, 'wb') as fd:
+        for chunk in r.iter_content(chunk_size=65535):
+            md5.update(chunk)
+            fd.write(chunk)
+
+    if md5sum and md5.hexdigest() != md5sum:
+        raise Exception('Package md5 mismatch, expected %s, got %s.' %
+                        (md5sum, md5.hexdigest()))
+
+
 def _download_package(url, zip_file, token=None, unzip=None):
     """Download package and unzip as needed.
 
+    The package and the unzipped directory are written to temporary paths
+    and renamed when complete, the zip file is renamed last. So the package
+    is ready once the zip file exists, which is checked without any lock.
+    Only the downloads of the same package are serialized.
+
     Return None if successful otherwise a Flask.Response object.
     """
     if os.path.isfile(zip_file):
         return None
 
-    log("Start downloading function")
+    lock_name = 'download-%s' % os.path.basename(zip_file)
+    with lockutils.lock(lock_name, external=True, lock_path=LOCK_PATH):
+        # Downloaded by another request while waiting for the lock.
+        if os.path.isfile(zip_file):
+            return None
 
-    headers = {}
-    if token:
-        headers = {'X-Auth-Token': token}
+        return _download(url, zip_file, token=token, unzip=unzip)
 
-    try:
-        r = requests.get(url, headers=headers, stream=True, timeout=5,
-                         verify=False)
-        if r.status_code != 200:
-            return make_response(DOWNLOAD_ERROR % (url, r.content), 500)
 
-        with open(zip_file, 'wb') as fd:
-            for chunk in r.iter_content(chunk_size=65535):
-                fd.write(chunk)
+def _download(url, zip_file, token=None, unzip=None):
+    log("Start downloading function package to %s" % zip_file)
+
+    tmp_suffix = '.tmp-%s' % os.getpid()
+    tmp_zip_file = zip_file + tmp_suffix
+    dest = zip_file.split('.')[0]
+    tmp_dest = dest + tmp_suffix
 
+    try:
+        _fetch(url, tmp_zip_file, token=token)
         log("Downloaded function package to %s" % zip_file)
 
         if unzip:
-            dest = zip_file.split('.')[0]
-            with open(zip_file, 'rb') as f:
+            shutil.rmtree(tmp_dest, ignore_errors=True)
+            with open(tmp_zip_file, 'rb') as f:
                 zf = zipfile.ZipFile(f)
-                zf.extractall(dest)
+                zf.extractall(tmp_dest)
+
+            # Left by a download interrupted before the zip file was renamed.
+            shutil.rmtree(dest, ignore_errors=True)
+            os.rename(tmp_dest, dest)
             log("Unzipped")
+
+        os.rename(tmp_zip_file, zip_file)
     except Exception as e:
         return make_response(DOWNLOAD_ERROR % (url, str(e)), 500)
+    finally:
+        if os.path.exists(tmp_zip_file):
+            os.remove(tmp_zip_file)
+        shutil.rmtree(tmp_dest, ignore_errors=True)
+
+
+def _cache_package(url, md5sum, token=None):
+    """Download and unzip the package to the cache if not there yet.
+
+    The package is prepared in a temporary directory renamed to the cache
+    entry when complete.
+    """
+    entry = os.path.join(CACHE_DIR, md5sum)
+
+    with lockutils.lock('download-%s' % md5sum, external=True,
+                        lock_path=LOCK_PATH):
+        if os.path.isdir(entry):
+            return
+
+        log("Start downloading function package %s" % md5sum)
+
+        tmp_entry = '%s.tmp-%s' % (entry, os.getpid())
+        shutil.rmtree(tmp_entry, ignore_errors=True)
+        os.makedirs(tmp_entry)
+
+        try:
+            zip_file = os.path.join(tmp_entry, 'package.zip')
+            _fetch(url, zip_file, token=token, md5sum=md5sum)
+            with open(zip_file, 'rb') as f:
+                zipfile.ZipFile(f).extractall(
+                    os.path.join(tmp_entry, 'package')
+                )
+
+            os.rename(tmp_entry, entry)
+        finally:
+            shutil.rmtree(tmp_entry, ignore_errors=True)
+
+        log("Downloaded function package %s" % md5sum)
+
+
+def _link_package(function_id, md5sum):
+    """Point the package paths of the function to the cache entry."""
+    for name, target in (('%s.zip' % function_id, 'package.zip'),
+                         (function_id, 'package')):
+        link = os.path.join(PACKAGE_DIR, name)
+        # Relative to the package directory, which may be mounted anywhere.
+        target = os.path.join(os.path.basename(CACHE_DIR), md5sum, target)
+
+        # Downloaded before the cache was used.
+        if os.path.isdir(link) and not os.path.islink(link):
+            shutil.rmtree(link)
+
+        tmp_link = '%s.tmp-%s-%s' % (link, os.getpid(),
+                                     threading.current_thread().ident)
+        os.symlink(target, tmp_link)
+        os.rename(tmp_link, link)
+
+
+def _get_linked_packages():
+    """Get the md5 of the packages linked to any function."""
+    md5sums = set()
+    for name in os.listdir(PACKAGE_DIR):
+        path = os.path.join(PACKAGE_DIR, name)
+        if os.path.islink(path):
+            md5sums.add(os.readlink(path).split(os.sep)[1])
+
+    return md5sums
+
+
+def _get_size(path):
+    size = 0
+    for root, _, files in os.walk(path):
+        size += sum(os.lstat(os.path.join(root, f)).st_size for f in files)
+
+    return size
+
+
+def _evict_packages():
+    """Delete the least recently used packages above the cache size.
+
+    Called with the package-cache lock held.
+    """
+    linked = _get_linked_packages()
+    entries = []
+    for md5sum in os.listdir(CACHE_DIR):
+        path = os.path.join(CACHE_DIR, md5sum)
+        if '.tmp-' in md5sum or md5sum in linked:
+            continue
+        entries.append((os.stat(path).st_mtime, _get_size(path), path))
+
+    size = sum(e[1] for e in entries)
+    for _, entry_size, path in sorted(entries):
+        if size <= CACHE_SIZE * 1024 * 1024:
+            break
+
+        log("Deleting cached function package %s" % os.path.basename(path))
+        shutil.rmtree(path, ignore_errors=True)
+        size -= entry_size
+
+
+def _check_params(params, md5_required=False):
+    """Check the params used to build the package paths.
+
+    Return None if valid otherwise a Flask.Response object.
+    """
+    if not UUID_RE.match(params.get('function_id') or ''):
+        return make_response(
+            'Invalid function id %s.' % params.get('function_id'), 400
+        )
+
+    md5sum = params.get('package_md5')
+    if (md5sum or md5_required) and not MD5_RE.match(md5sum or ''):
+        return make_response('Invalid package md5 %s.' % md5sum, 400)
+
+    if not params.get('download_url'):
+        return make_response('Download url is required.', 400)
+
+
+def _get_package(url, function_id, md5sum, token=None):
+    """Make the package with the md5 available to the function.
+
+    The package is used without any lock if the function is linked to it
+    already, otherwise it's downloaded if not in the cache, or linked to the
+    function if downloaded for another function.
+    """
+    entry = os.path.join(CACHE_DIR, md5sum)
+    link = os.path.join(PACKAGE_DIR, function_id)
+
+    if not (os.path.islink(link) and
+            os.readlink(link).split(os.sep)[1] == md5sum and
+            os.path.isdir(entry)):
+        if not os.path.isdir(CACHE_DIR):
+            os.makedirs(CACHE_DIR)
+
+        while True:
+            _cache_package(url, md5sum, token=token)
+
+            # The packages linked to a function are never evicted.
+            with lockutils.lock('package-cache', external=True,
+                                lock_path=LOCK_PATH):
+                # Unless evicted before being linked.
+                if os.path.isdir(entry):
+                    _link_package(function_id, md5sum)
+                    _evict_packages()
+                    break
+
+    # The modification time is the last use of the cache entry.
+    os.utime(entry, None)
 
 
 @app.route('/download', methods=['POST'])
@@ -89,11 +287,33 @@ def download():
     :param function_id: Function ID.
     :param token: Optional. The token used for download.
     :param unzip: Optional. If unzip is needed after download.
+    :param package_md5: Optional. The package md5, the package is shared by
+        the functions in the package cache if provided, it's always unzipped.
     """
-    params = request.get_json()
-    zip_file = '/var/qinling/packages/%s.zip' % params['function_id']
+    params = request.get_json() or {}
     log("Function package download request received, params: %s" % params)
 
+    # The function id and md5 are used in the package paths.
+    resp = _check_params(params)
+    if resp:
+        return resp
+
+    if params.get('package_md5'):
+        try:
+            _get_package(
+                params['download_url'],
+                params['function_id'],
+                params['package_md5'],
+                token=params.get('token')
+            )
+        except Exception as e:
+            return make_response(
+                DOWNLOAD_ERROR % (params['download_url'], str(e)), 500
+            )
+
+        return 'downloaded'
+
+    zip_file = os.path.join(PACKAGE_DIR, '%s.zip' % params['function_id'])
     resp = _download_package(
         params['download_url'],
         zip_file,
@@ -102,3 +322,45 @@ def download():
     )
 
     return resp if resp else 'downloaded'
+
+
+@app.route('/prefetch', methods=['POST'])
+def prefetch():
+    """Download function package to the package cache in background.
+
+    Called through the runtime when the worker is chosen for a function, so
+    that the package is ready before the first execution. The parameters are
+    the same as the download API, 'package_md5' is required.
+
+    The package is only added to the cache, it's linked to the function by
+    the download request of the first execution.
+    """
+    params = request.get_json() or {}
+    log("Function package prefetch request received, params: %s" % params)
+
+    resp = _check_params(params, md5_required=True)
+    if resp:
+        return resp
+
+    def _prefetch():
+        try:
+            if not os.path.isdir(CACHE_DIR):
+                os.makedirs(CACHE_DIR)
+
+            _cache_package(
+                params['download_url'],
+                params['package_md5'],
+                token=params.get('token')
+            )
+            with lockutils.lock('package-cache', external=True,
+                                lock_path=LOCK_PATH):
+                _evict_packages()
+        except Exception as e:
+            log(DOWNLOAD_ERROR % (params['download_url'], str(e)),
+                level='error')
+
+    thread = threading.Thread(target=_prefetch)
+    thread.daemon = True
+    thread.start()
+
+    return make_response('prefetching', 202)
@@ -0,0 +1,109 @@
+# Copyright 2018 Catalyst IT Limited
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+"""Throughput benchmark of the asynchronous execution dispatch.
+
+A fake function service answers every execution after a fixed delay. The
+executions are sent either by a pool of threads calling
+qinling.engine.utils.url_request (the RPC executor threads of the engine) or
+by the asyncio dispatcher.
+
+Usage:
+    python tools/benchmark/async_dispatch.py [--count 2000] [--threads 64] \
+        [--delay 1]
+"""
+import argparse
+import asyncio
+from concurrent import futures
+import threading
+import time
+
+from aiohttp import web
+import mock
+import requests
+
+from qinling import context
+from qinling.engine import dispatcher
+from qinling.engine import utils
+
+
+def start_function_service(delay):
+    loop = asyncio.new_event_loop()
+
+    async def ping(request):
+        return web.Response(text='pong')
+
+    async def execute(request):
+        await asyncio.sleep(delay)
+        return web.json_response({'success': True, 'output': 'done'})
+
+    app = web.Application()
+    app.router.add_get('/ping', ping)
+    app.router.add_post('/execute', execute)
+    runner = web.AppRunner(app)
+    loop.run_until_complete(runner.setup())
+    site = web.TCPSite(runner, '127.0.0.1', 0, backlog=4096)
+    loop.run_until_complete(site.start())
+    port = site._server.sockets[0].getsockname()[1]
+
+    thread = threading.Thread(target=loop.run_forever)
+    thread.daemon = True
+    thread.start()
+
+    return 'http://127.0.0.1:%s/execute' % port
+
+
+def run_threads(url, count, threads):
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_maxsize=threads)
+    session.mount('http://', adapter)
+
+    with futures.ThreadPoolExecutor(threads) as executor:
+        results = list(executor.map(
+            lambda i: utils.url_request(session, url, body={}),
+            range(count)
+        ))
+    assert all(success for success, _ in results)
+
+
+def run_dispatcher(url, count, threads):
+    async_dispatcher = dispatcher.AsyncDispatcher(max_executions=count)
+    async_dispatcher.start()
+    for i in range(count):
+        async_dispatcher.dispatch('execution_%s' % i, url, {})
+    async_dispatcher.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--count', type=int, default=2000)
+    parser.add_argument('--threads', type=int, default=64)
+    parser.add_argument('--delay', type=float, default=1)
+    args = parser.parse_args()
+
+    url = start_function_service(args.delay)
+    context.set_ctx(context.Context())
+
+    with mock.patch('qinling.engine.utils.finish_execution'):
+        for name, func in (('threads', run_threads),
+                           ('asyncio', run_dispatcher)):
+            start = time.time()
+            func(url, args.count, args.threads)
+            duration = time.time() - start
+            print('%-8s count=%d duration=%.2fs executions/s=%.1f' % (
+                name, args.count, duration, args.count / duration
+            ))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,275 @@
+# Copyright 2018 Catalyst IT Limited
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+"""Replay an execution arrival trace against a fake orchestrator.
+
+The executions of one function version are replayed in simulated time with
+the scaling of the per-execution load check used by default, and with the
+autoscaler periodic task (qinling.engine.autoscaler.Autoscaler). A new worker
+becomes available after --scale-delay seconds, every worker runs at most
+[engine]function_concurrency executions at the same time and the others
+wait. The execution latency percentiles and the number of workers used are
+printed for both.
+
+The printed latency is the time the executions wait for a worker.
+
+The trace is a text file with one execution per line, the arrival time in
+seconds and optionally the execution duration in seconds, e.g. exported from
+the created_at column of the executions table. Lines starting with # are
+ignored. A synthetic bursty trace is used if no trace file is given, it can
+be saved with --generate.
+
+Usage:
+    python tools/benchmark/autoscaler_simulation.py [--trace trace.txt] \
+        [--generate trace.txt] [--concurrency 3] [--scale-delay 2] \
+        [--interval 2] [--max-step 5]
+"""
+import argparse
+import collections
+import heapq
+import random
+
+from qinling.engine import autoscaler
+
+FUNCTION_ID = 'function'
+RUNTIME_ID = 'runtime'
+
+ARRIVAL = 0
+FINISH = 1
+READY = 2
+TICK = 3
+
+
+def load_trace(path, duration):
+    trace = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+
+            fields = line.split()
+            trace.append(
+                (float(fields[0]),
+                 float(fields[1]) if len(fields) > 1 else duration)
+            )
+
+    trace.sort()
+    start = trace[0][0]
+    return [(t - start, d) for t, d in trace]
+
+
+def generate_trace(duration, seed=1):
+    """Quiet, a sudden burst, a slow ramp down and quiet again."""
+    rand = random.Random(seed)
+    phases = [(60, 1), (60, 20), (60, 10), (60, 5), (120, 0.5)]
+
+    trace = []
+    now = 0.0
+    for length, rate in phases:
+        end = now + length
+        while True:
+            now += rand.expovariate(rate)
+            if now >= end:
+                now = end
+                break
+            trace.append((now, rand.expovariate(1.0 / duration)))
+
+    return trace
+
+
+class FakeOrchestrator(object):
+    """Workers of a function version, each runs a limited executions."""
+
+    def __init__(self, concurrency, scale_delay):
+        self.concurrency = concurrency
+        self.scale_delay = scale_delay
+        # Running executions of the available workers.
+        self.workers = {}
+        # Number of the workers being created.
+        self.pending = 0
+        self.queue = collections.deque()
+        self._next_id = 0
+        self._worker_time = 0.0
+        self._last_change = 0.0
+        self.max_workers = 0
+
+    @property
+    def count(self):
+        return len(self.workers) + self.pending
+
+    def _account(self, now):
+        self._worker_time += self.count * (now - self._last_change)
+        self._last_change = now
+        self.max_workers = max(self.max_workers, self.count)
+
+    def scaleup(self, events, now, count):
+        self._account(now)
+        self.pending += count
+        for _ in range(count):
+            heapq.heappush(events, (now + self.scale_delay, READY, None))
+
+    def scaledown(self, now, count):
+        self._account(now)
+        for name in [w for w, running in self.workers.items()
+                     if running == 0][:count]:
+            del self.workers[name]
+
+    def ready(self, now):
+        self._account(now)
+        self.pending -= 1
+        self.workers[self._next_id] = 0
+        self._next_id += 1
+
+    def dispatch(self, events, now, latencies):
+        while self.queue:
+            free = [w for w, running in self.workers.items()
+                    if running < self.concurrency]
+            if not free:
+                return
+
+            worker = min(free, key=lambda w: self.workers[w])
+            arrival, duration = self.queue.popleft()
+            self.workers[worker] += 1
+            latencies.append(now - arrival)
+            heapq.heappush(events, (now + duration, FINISH,
+                                    (worker, duration)))
+
+    def finish(self, worker):
+        if worker in self.workers:
+            self.workers[worker] -= 1
+
+    def mean_workers(self, now):
+        self._account(now)
+        return self._worker_time / now if now else 0
+
+
+class SimulatedAutoscaler(autoscaler.Autoscaler):
+    """Use the worker count of the fake orchestrator instead of etcd."""
+
+    def __init__(self, orchestrator, events, **kwargs):
+        self.orchestrator = orchestrator
+        self.events = events
+        self.now = 0.0
+        super(SimulatedAutoscaler, self).__init__(self, **kwargs)
+
+    def _scale(self, function_id, version, runtime_id, desired, idle):
+        self._apply(function_id, version, runtime_id,
+                    self.orchestrator.count, desired, idle)
+
+    # The engine methods used by the autoscaler.
+    def scaleup_function(self, ctx, function_id, version, runtime_id, count):
+        self.orchestrator.scaleup(self.events, self.now, count)
+
+    def scaledown_function(self, ctx, function_id, version, count):
+        self.orchestrator.scaledown(self.now, count)
+
+
+def simulate(trace, policy, concurrency, scale_delay, interval, idle_time,
+             max_step):
+    events = [(t, ARRIVAL, d) for t, d in trace]
+    heapq.heapify(events)
+    orchestrator = FakeOrchestrator(concurrency, scale_delay)
+    scaler = None
+    if policy == 'autoscaler':
+        scaler = SimulatedAutoscaler(orchestrator, events,
+                                     concurrency=concurrency,
+                                     max_step=max_step,
+                                     idle_time=idle_time)
+        heapq.heappush(events, (interval, TICK, None))
+
+    latencies = []
+    inflight = 0
+    remaining = len(trace)
+    now = 0.0
+
+    while remaining:
+        now, kind, data = heapq.heappop(events)
+
+        if kind == ARRIVAL:
+            inflight += 1
+            if scaler:
+                scaler.record_arrival(FUNCTION_ID, 0, RUNTIME_ID, now=now)
+
+            if orchestrator.count == 0:
+                # The first worker is created by the execution.
+                orchestrator.scaleup(events, now, 1)
+            elif scaler:
+                pass
+            elif ((inflight or 1) / float(orchestrator.count) >
+                  concurrency):
+                # The load check of every execution.
+                orchestrator.scaleup(events, now, 1)
+            orchestrator.queue.append((now, data))
+        elif kind == FINISH:
+            worker, duration = data
+            inflight -= 1
+            remaining -= 1
+            orchestrator.finish(worker)
+            if scaler:
+                scaler.record_finish(FUNCTION_ID, 0, duration)
+        elif kind == READY:
+            orchestrator.ready(now)
+        elif kind == TICK:
+            scaler.now = now
+            scaler.tick(now=now)
+            heapq.heappush(events, (now + interval, TICK, None))
+
+        orchestrator.dispatch(events, now, latencies)
+
+    latencies.sort()
+    return latencies, orchestrator.mean_workers(now), orchestrator.max_workers
+
+
+def percentile(values, p):
+    return values[min(len(values) - 1, int(len(values) * p / 100.0))]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--trace')
+    parser.add_argument('--generate',
+                        help='Save the synthetic trace to the file.')
+    parser.add_argument('--duration', type=float, default=1.0,
+                        help='Execution duration if not in the trace.')
+    parser.add_argument('--concurrency', type=int, default=3)
+    parser.add_argument('--scale-delay', type=float, default=2.0)
+    parser.add_argument('--interval', type=float, default=2.0)
+    parser.add_argument('--idle-time', type=float, default=120.0)
+    parser.add_argument('--max-step', type=int, default=5)
+    args = parser.parse_args()
+
+    if args.trace:
+        trace = load_trace(args.trace, args.duration)
+    else:
+        trace = generate_trace(args.duration)
+        if args.generate:
+            with open(args.generate, 'w') as f:
+                for t, d in trace:
+                    f.write('%.3f %.3f\n' % (t, d))
+
+    print('%d executions in %.0f seconds' % (len(trace), trace[-1][0]))
+    for policy in ('per_execution', 'autoscaler'):
+        latencies, mean_workers, max_workers = simulate(
+            trace, policy, args.concurrency, args.scale_delay,
+            args.interval, args.idle_time, args.max_step
+        )
+        print('%-14s wait p50=%.2fs p90=%.2fs p99=%.2fs max=%.2fs '
+              'mean_workers=%.1f max_workers=%d' % (
+                  policy, percentile(latencies, 50),
+                  percentile(latencies, 90), percentile(latencies, 99),
+                  latencies[-1], mean_workers, max_workers))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,222 @@
+# Copyright 2018 Catalyst IT Limited
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+"""Time concurrent load checks of one function against a fake etcd.
+
+--invocations threads run the load check of the engine for the same function
+version at the same time, then the execution for --duration seconds. etcd is
+replaced by an in-process stand-in adding --latency milliseconds to every
+request, its locks behave as the etcd3gw locks, i.e. they are not waited
+for. The running executions are counted in memory with the same latency.
+
+The load check of the engine, which only takes the worker lock when the
+workers need scaling up, is compared with taking the lock for every
+execution as before. The load check latency percentiles, the number of
+executions failed to get the lock, the number of lock attempts and the
+number of workers at the end are printed.
+
+Usage:
+    python tools/benchmark/load_check_contention.py [--invocations 200] \
+        [--latency 2] [--duration 0.5] [--workers 1]
+"""
+import argparse
+import threading
+import time
+import uuid
+
+import mock
+from oslo_config import cfg
+import tenacity
+
+from qinling import config
+from qinling.db import api as db_api
+from qinling.engine import default_engine
+from qinling import exceptions as exc
+from qinling.utils import etcd_util
+
+CONF = cfg.CONF
+FUNCTION_ID = 'function'
+RUNTIME_ID = 'runtime'
+
+
+class FakeLock(object):
+    def __init__(self, etcd, name):
+        self.etcd = etcd
+        self.name = name
+        self.uuid = str(uuid.uuid4())
+
+    def __enter__(self):
+        self.etcd.request()
+        self.etcd.request()
+        with self.etcd.lock_:
+            self.etcd.lock_attempts += 1
+            self.etcd.locks.setdefault(self.name, self.uuid)
+        return self
+
+    def __exit__(self, *args):
+        self.etcd.request()
+        with self.etcd.lock_:
+            if self.etcd.locks.get(self.name) == self.uuid:
+                del self.etcd.locks[self.name]
+
+    def is_acquired(self):
+        self.etcd.request()
+        return self.etcd.locks.get(self.name) == self.uuid
+
+
+class FakeEtcd(object):
+    """The etcd client methods used by the load check."""
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.lock_ = threading.Lock()
+        self.keys = {}
+        self.locks = {}
+        self.lock_attempts = 0
+
+    def request(self):
+        time.sleep(self.latency)
+
+    def lock(self, id):
+        return FakeLock(self, id)
+
+    def get_prefix(self, prefix):
+        self.request()
+        with self.lock_:
+            return [(v, {'key': k}) for k, v in self.keys.items()
+                    if k.startswith(prefix)]
+
+    def create(self, key, value):
+        self.request()
+        with self.lock_:
+            self.keys[key] = value
+
+
+class BenchmarkEngine(default_engine.DefaultEngine):
+    def __init__(self, etcd):
+        super(BenchmarkEngine, self).__init__(mock.Mock(), None)
+        self.etcd = etcd
+        self.running = 0
+        self._lock = threading.Lock()
+
+    def count_executions(self, **kwargs):
+        self.etcd.request()
+        return self.running
+
+    def scaleup_function(self, ctx, function_id, function_version,
+                         runtime_id, count=1):
+        for _ in range(count):
+            etcd_util.create_worker(function_id, str(uuid.uuid4()),
+                                    version=function_version)
+
+
+class AlwaysLockEngine(BenchmarkEngine):
+    """Take the worker lock for every execution, as before."""
+
+    @tenacity.retry(
+        wait=tenacity.wait_fixed(1),
+        stop=tenacity.stop_after_attempt(30),
+        reraise=True,
+        retry=tenacity.retry_if_exception_type(exc.EtcdLockException)
+    )
+    def function_load_check(self, function_id, version, runtime_id):
+        with etcd_util.get_worker_lock(function_id, version) as lock:
+            if not lock.is_acquired():
+                raise exc.EtcdLockException('Failed to get worker lock.')
+
+            workers = etcd_util.get_workers(function_id, version)
+            running_execs = self._count_running_executions(function_id,
+                                                           version)
+            if self._needs_scaleup(workers, running_execs):
+                return self.scaleup_function(None, function_id, version,
+                                             runtime_id, 1)
+
+
+def run(engine_cls, args):
+    etcd = FakeEtcd(args.latency / 1000.0)
+    engine = engine_cls(etcd)
+    for i in range(args.workers):
+        etcd.keys['%s_0/worker_%s' % (FUNCTION_ID, i)] = str(i)
+
+    barrier = threading.Event()
+    latencies = []
+    failures = []
+
+    def _invoke():
+        barrier.wait()
+        with engine._lock:
+            engine.running += 1
+
+        start = time.time()
+        try:
+            engine.function_load_check(FUNCTION_ID, 0, RUNTIME_ID)
+        except exc.EtcdLockException:
+            # The execution fails.
+            failures.append(start)
+        latency = time.time() - start
+
+        time.sleep(args.duration)
+        with engine._lock:
+            engine.running -= 1
+            latencies.append(latency)
+
+    threads = [threading.Thread(target=_invoke)
+               for _ in range(args.invocations)]
+    with mock.patch.object(etcd_util, 'CLIENT', etcd), \
+            mock.patch.object(db_api, 'count_executions',
+                              engine.count_executions):
+        for t in threads:
+            t.start()
+        start = time.time()
+        barrier.set()
+        for t in threads:
+            t.join()
+        duration = time.time() - start
+
+    latencies.sort()
+    workers = len([k for k in etcd.keys if '/worker_' in k])
+    return duration, latencies, len(failures), etcd.lock_attempts, workers
+
+
+def percentile(values, p):
+    return values[min(len(values) - 1, int(len(values) * p / 100.0))]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--invocations', type=int, default=200)
+    parser.add_argument('--latency', type=float, default=2,
+                        help='Latency of an etcd request in milliseconds.')
+    parser.add_argument('--duration', type=float, default=0.5,
+                        help='Execution duration in seconds.')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Number of workers at the beginning.')
+    args = parser.parse_args()
+
+    for group, options in config.list_opts():
+        CONF.register_opts(list(options), group)
+
+    print('%-12s %8s %8s %8s %8s %7s %6s %8s' % (
+        'load check', 'total', 'p50', 'p99', 'max', 'failed', 'locks',
+        'workers'))
+    for name, engine_cls in (('always lock', AlwaysLockEngine),
+                             ('fast path', BenchmarkEngine)):
+        duration, latencies, failed, locks, workers = run(engine_cls, args)
+        print('%-12s %7.2fs %7.3fs %7.3fs %7.3fs %7d %6d %8d' % (
+            name, duration, percentile(latencies, 50),
+            percentile(latencies, 99), latencies[-1], failed, locks,
+            workers))
+
+
+if __name__ == '__main__':
+    main()
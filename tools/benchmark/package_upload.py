@@ -0,0 +1,98 @@
+# Copyright 2018 Catalyst IT Limited
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+"""Measure the memory used to store function packages of several sizes.
+
+A ZIP package of every --sizes MB is written to a temporary file, as the
+uploaded package is spooled by the API, then stored by the file system
+storage:
+
+- read: the package is read into memory and the content is stored, as the
+  API did before.
+- stream: the file object is passed to the storage, which reads it in
+  chunks.
+
+The time and the peak memory allocated by Python during the store are
+printed. Requires Python 3 for tracemalloc.
+
+Usage:
+    python tools/benchmark/package_upload.py [--sizes 10 50 200]
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+import tracemalloc
+import zipfile
+
+from oslo_config import cfg
+
+from qinling import config
+from qinling.storage import file_system
+
+CONF = cfg.CONF
+
+
+def make_package(path, size):
+    with zipfile.ZipFile(path, 'w') as zf:
+        # Not compressible, like most packages with dependencies.
+        with zf.open('data.bin', 'w') as f:
+            for _ in range(size // (1024 * 1024)):
+                f.write(os.urandom(1024 * 1024))
+        zf.writestr('main.py', 'def main(**kwargs):\n    return "ok"\n')
+
+
+def store(storage, package_path, stream):
+    tracemalloc.start()
+    start = time.time()
+    with open(package_path, 'rb') as f:
+        data = f if stream else f.read()
+        storage.store('bench', 'function', data)
+    duration = time.time() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return duration, peak
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 50, 200],
+                        help='Package sizes in MB.')
+    args = parser.parse_args()
+
+    for group, options in config.list_opts():
+        CONF.register_opts(list(options), group)
+
+    work_dir = tempfile.mkdtemp()
+    CONF.set_override('file_system_dir', work_dir, 'storage')
+    package_path = os.path.join(work_dir, 'upload.zip')
+
+    try:
+        print('%-8s %-8s %8s %12s' % ('size', 'store', 'time', 'peak memory'))
+        for size in args.sizes:
+            make_package(package_path, size * 1024 * 1024)
+            for name, stream in (('read', False), ('stream', True)):
+                storage = file_system.FileSystemStorage(CONF)
+                duration, peak = store(storage, package_path, stream)
+                shutil.rmtree(os.path.join(work_dir, 'bench'))
+
+                print('%-8s %-8s %7.2fs %10.1fMB' % (
+                    '%sMB' % size, name, duration, peak / 1024.0 / 1024))
+    finally:
+        shutil.rmtree(work_dir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+# Copyright 2018 Catalyst IT Limited
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+"""Microbenchmark of passing the execution result in the python3 runtime.
+
+Compare multiprocessing.Manager().dict(), the pipe and the shared memory
+buffer for returning the execution result from the worker process, with
+result sizes of 1KB, 1MB and 50MB.
+
+Usage:
+    python tools/benchmark/result_channel.py [--count 20]
+"""
+import argparse
+import mmap
+from multiprocessing import Manager
+from multiprocessing import Pipe
+from multiprocessing import Process
+import os
+import sys
+import time
+
+sys.path.insert(
+    0,
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '../../runtimes',
+                 'python3')
+)
+import server  # noqa
+
+SIZES = [('1KB', 1024), ('1MB', 1024 * 1024), ('50MB', 50 * 1024 * 1024)]
+
+
+def _manager_child(conn, return_dict):
+    while True:
+        size = conn.recv()
+        if size is None:
+            break
+        return_dict['result'] = 'x' * size
+        return_dict['success'] = True
+        conn.send(True)
+
+
+def _channel_child(conn, buf):
+    while True:
+        size = conn.recv()
+        if size is None:
+            break
+        server._send_result(conn, buf, {'result': 'x' * size,
+                                        'success': True})
+
+
+def bench_manager(size, count):
+    manager = Manager()
+    return_dict = manager.dict()
+    conn, child_conn = Pipe()
+    p = Process(target=_manager_child, args=(child_conn, return_dict))
+    p.start()
+
+    durations = []
+    for _ in range(count):
+        start = time.time()
+        conn.send(size)
+        conn.recv()
+        result = return_dict.get('result')
+        success = return_dict['success']
+        durations.append(time.time() - start)
+        assert len(result) == size and success
+
+    conn.send(None)
+    p.join()
+    manager.shutdown()
+    return durations
+
+
+def bench_channel(size, count, buf):
+    conn, child_conn = Pipe()
+    p = Process(target=_channel_child, args=(child_conn, buf))
+    p.start()
+
+    durations = []
+    for _ in range(count):
+        start = time.time()
+        conn.send(size)
+        return_dict = server._recv_result(conn, buf)
+        durations.append(time.time() - start)
+        assert len(return_dict['result']) == size and return_dict['success']
+
+    conn.send(None)
+    p.join()
+    return durations
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--count', type=int, default=20)
+    args = parser.parse_args()
+
+    buf = mmap.mmap(-1, server.RESULT_BUFFER_SIZE)
+
+    print('%-6s %12s %12s %12s' % ('size', 'manager', 'pipe', 'buffer'))
+    for name, size in SIZES:
+        results = [
+            bench_manager(size, args.count),
+            bench_channel(size, args.count, None),
+            bench_channel(size, args.count, buf)
+        ]
+        print('%-6s %10.3fms %10.3fms %10.3fms' % (
+            (name,) + tuple(sum(d) / len(d) * 1000 for d in results)
+        ))
+
+    buf.close()
+
+
+if __name__ == '__main__':
+    main()
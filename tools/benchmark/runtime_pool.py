@@ -0,0 +1,136 @@
+# Copyright 2018 Catalyst IT Limited
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+"""Latency benchmark of the python3 runtime execution path.
+
+Compare the previous fork-per-execution path (a new Manager and a new Process
+for every execution) with the warm worker pool.
+
+Usage:
+    python tools/benchmark/runtime_pool.py [--count 200]
+"""
+import argparse
+from multiprocessing import Manager
+from multiprocessing import Process
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(
+    0,
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '../../runtimes',
+                 'python3')
+)
+import server  # noqa
+
+FUNCTION = """
+def main(name='qinling', **kwargs):
+    print('Hello, %s' % name)
+    return 'Hello, %s' % name
+"""
+
+
+def _legacy_invoke(execution_id, zip_file_dir, return_dict):
+    server._set_ulimit()
+    sys.stdout = open("%s.out" % execution_id, "w")
+    sys.path.insert(0, zip_file_dir)
+    module = __import__('main')
+    return_dict['result'] = module.main()
+    return_dict['success'] = True
+
+
+def legacy_execute(execution_id, zip_file_dir):
+    manager = Manager()
+    return_dict = manager.dict()
+    p = Process(target=_legacy_invoke,
+                args=(execution_id, zip_file_dir, return_dict))
+    p.start()
+    p.join(5)
+    result = return_dict.get('result')
+    manager.shutdown()
+    os.remove('%s.out' % execution_id)
+    return result
+
+
+def pool_execute(execution_id, zip_file_dir):
+    log_buffer = server.LogBuffer(execution_id, create=True)
+    pool = server.get_pool()
+    worker = pool.acquire()
+    try:
+        return_dict, _ = worker.run(
+            {
+                'execution_id': execution_id,
+                'zip_file_dir': zip_file_dir,
+                'module_name': 'main',
+                'method': 'main',
+                'arg': None,
+                'input': {},
+                'rlimit': {'cpu': 100, 'memory_size': 33554432},
+                'auth': {'auth_url': None, 'username': None,
+                         'password': None, 'trust_id': None}
+            },
+            5
+        )
+    finally:
+        pool.release(worker)
+        log_buffer.close(remove=True)
+    return return_dict['result']
+
+
+def measure(name, func, zip_file_dir, count):
+    durations = []
+    for i in range(count):
+        execution_id = '%s-%s' % (name, i)
+        start = time.time()
+        result = func(execution_id, zip_file_dir)
+        durations.append((time.time() - start) * 1000)
+        assert result == 'Hello, qinling', result
+
+    durations.sort()
+    print('%-8s count=%d mean=%.2fms p50=%.2fms p90=%.2fms p99=%.2fms' % (
+        name, count, sum(durations) / count,
+        durations[int(count * 0.5)], durations[int(count * 0.9)],
+        durations[min(int(count * 0.99), count - 1)]
+    ))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--count', type=int, default=200)
+    args = parser.parse_args()
+
+    # There is no cglimit service outside of the runtime pod.
+    server._cgroup_limit = lambda rlimit: True
+
+    work_dir = tempfile.mkdtemp()
+    package_dir = os.path.join(work_dir, 'package')
+    os.makedirs(package_dir)
+    with open(os.path.join(package_dir, 'main.py'), 'w') as f:
+        f.write(FUNCTION)
+
+    cwd = os.getcwd()
+    os.chdir(work_dir)
+    try:
+        measure('legacy', legacy_execute, package_dir, args.count)
+        server.get_pool().fill()
+        measure('pool', pool_execute, package_dir, args.count)
+    finally:
+        server.get_pool().shutdown()
+        os.chdir(cwd)
+        shutil.rmtree(work_dir)
+
+
+if __name__ == '__main__':
+    main()
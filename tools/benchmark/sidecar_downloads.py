@@ -0,0 +1,170 @@
+# Copyright 2018 Catalyst IT Limited
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+"""Time simultaneous first invocations of several functions on a worker.
+
+--functions packages of --size MB are served by a local HTTP server sending
+every response at --bandwidth MB/s. --invocations threads per function call
+the package download of the sidecar at the same time, as the first
+invocations of the functions do, then download the packages again as the
+next invocations do.
+
+The sidecar download, which only serializes the downloads of the same
+package, is compared with one lock for all the downloads as before. The
+total time and the latency percentiles of the first invocations, and the
+latency of the invocations after the download are printed.
+
+Usage:
+    python tools/benchmark/sidecar_downloads.py [--functions 8] \
+        [--invocations 4] [--size 10] [--bandwidth 20]
+"""
+import argparse
+import io
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import zipfile
+
+from oslo_concurrency import lockutils
+from six.moves import BaseHTTPServer
+from six.moves import socketserver
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', '..', 'runtimes', 'sidecar'))
+import sidecar  # noqa
+
+
+class ThreadingHTTPServer(socketserver.ThreadingMixIn,
+                          BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+
+def make_package(size):
+    data = io.BytesIO()
+    with zipfile.ZipFile(data, 'w') as zf:
+        zf.writestr('main.py', 'def main(**kwargs):\n    return "ok"\n')
+        # Not compressible, like most packages with dependencies.
+        zf.writestr('data.bin', os.urandom(size))
+    return data.getvalue()
+
+
+def start_server(package, bandwidth):
+    chunk_size = 65536
+    delay = chunk_size / bandwidth
+
+    class Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+        def do_GET(self):
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(package)))
+            self.end_headers()
+            for i in range(0, len(package), chunk_size):
+                self.wfile.write(package[i:i + chunk_size])
+                time.sleep(delay)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    return server
+
+
+def global_lock_download(url, zip_file, token=None, unzip=None):
+    """One lock for the downloads of all the packages, as before."""
+    with lockutils.lock('download_function', external=True,
+                        lock_path=sidecar.LOCK_PATH):
+        if os.path.isfile(zip_file):
+            return None
+
+        return sidecar._download(url, zip_file, token=token, unzip=unzip)
+
+
+def invoke_all(download, url, functions, invocations):
+    barrier = threading.Event()
+    latencies = []
+    errors = []
+
+    def _invoke(function):
+        barrier.wait()
+        start = time.time()
+        resp = download(
+            url, os.path.join(sidecar.PACKAGE_DIR, '%s.zip' % function),
+            unzip=True
+        )
+        if resp is not None:
+            errors.append(resp)
+        latencies.append(time.time() - start)
+
+    threads = [threading.Thread(target=_invoke, args=(f,))
+               for f in range(functions) for _ in range(invocations)]
+    for t in threads:
+        t.start()
+    start = time.time()
+    barrier.set()
+    for t in threads:
+        t.join()
+
+    latencies.sort()
+    return time.time() - start, latencies, len(errors)
+
+
+def percentile(values, p):
+    return values[min(len(values) - 1, int(len(values) * p / 100.0))]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--functions', type=int, default=8)
+    parser.add_argument('--invocations', type=int, default=4,
+                        help='Simultaneous invocations of every function.')
+    parser.add_argument('--size', type=float, default=10,
+                        help='Package size in MB.')
+    parser.add_argument('--bandwidth', type=float, default=20,
+                        help='Download speed of a package in MB/s.')
+    args = parser.parse_args()
+
+    package = make_package(int(args.size * 1024 * 1024))
+    server = start_server(package, args.bandwidth * 1024 * 1024)
+    url = 'http://127.0.0.1:%s/package' % server.server_address[1]
+
+    print('%-12s %8s %8s %8s %8s %7s %10s' % (
+        'download', 'total', 'p50', 'p99', 'max', 'failed', 'cached p99'))
+    for name, download in (('global lock', global_lock_download),
+                           ('per package', sidecar._download_package)):
+        work_dir = tempfile.mkdtemp()
+        sidecar.PACKAGE_DIR = os.path.join(work_dir, 'packages')
+        sidecar.LOCK_PATH = os.path.join(work_dir, 'lock')
+        os.makedirs(sidecar.PACKAGE_DIR)
+        try:
+            duration, latencies, failed = invoke_all(
+                download, url, args.functions, args.invocations)
+            _, cached, _ = invoke_all(
+                download, url, args.functions, args.invocations)
+        finally:
+            shutil.rmtree(work_dir)
+
+        print('%-12s %7.2fs %7.3fs %7.3fs %7.3fs %7d %9.4fs' % (
+            name, duration, percentile(latencies, 50),
+            percentile(latencies, 99), latencies[-1], failed,
+            percentile(cached, 99)))
+
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
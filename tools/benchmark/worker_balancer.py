@@ -0,0 +1,91 @@
+# Copyright 2018 Catalyst IT Limited
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+"""Simulated execution latency of the worker balance policies.
+
+Executions arrive randomly and are sent to the function workers chosen by
+qinling.engine.balancer.WorkerBalancer, every worker runs its executions one
+by one. One of the workers is stuck on slow executions, the latency
+percentiles of every policy are printed.
+
+Usage:
+    python tools/benchmark/worker_balancer.py [--workers 5] \
+        [--executions 20000] [--load 0.7] [--slowdown 20]
+"""
+import argparse
+import heapq
+import random
+
+from qinling.engine import balancer
+
+
+def percentile(values, p):
+    return values[min(len(values) - 1, int(len(values) * p / 100.0))]
+
+
+def simulate(policy, workers, executions, load, slowdown, seed):
+    rand = random.Random(seed)
+    # The balancer uses the random module.
+    random.seed(seed)
+
+    b = balancer.WorkerBalancer(policy)
+    urls = ['http://worker-%s:9090' % i for i in range(workers)]
+    durations = dict((url, 1.0) for url in urls)
+    durations[urls[0]] = slowdown
+    # Time when every worker finishes the executions it has received.
+    busy_until = dict((url, 0.0) for url in urls)
+
+    # The average duration of the executions is 1 on the normal workers.
+    arrival_rate = load * workers
+    now = 0.0
+    finishes = []
+    latencies = []
+
+    for _ in range(executions):
+        now += rand.expovariate(arrival_rate)
+
+        while finishes and finishes[0][0] <= now:
+            _, url = heapq.heappop(finishes)
+            b.release(url)
+
+        url = b.acquire(urls)
+        duration = rand.expovariate(1.0 / durations[url])
+        start = max(now, busy_until[url])
+        busy_until[url] = start + duration
+        heapq.heappush(finishes, (busy_until[url], url))
+        latencies.append(busy_until[url] - now)
+
+    return sorted(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--workers', type=int, default=5)
+    parser.add_argument('--executions', type=int, default=20000)
+    parser.add_argument('--load', type=float, default=0.7,
+                        help='Utilization of the normal workers.')
+    parser.add_argument('--slowdown', type=float, default=20,
+                        help='How many times slower the stuck worker is.')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    for policy in balancer.POLICIES:
+        latencies = simulate(policy, args.workers, args.executions,
+                             args.load, args.slowdown, args.seed)
+        print('%-18s p50=%.2f p90=%.2f p99=%.2f max=%.2f' % (
+            policy, percentile(latencies, 50), percentile(latencies, 90),
+            percentile(latencies, 99), latencies[-1]))
+
+
+if __name__ == '__main__':
+    main()